@@ -0,0 +1,200 @@
+"""Admission control for flight searches
+
+Every typed search goes through Admission.admit() before it may reach
+Smiles, which serves it in one of these modes:
+
+- FULL: a normal search.
+- CACHED: answered from the search cache only; a miss gets the fallback
+  link. Used when the message waited over QUEUE_DELAY_TARGET seconds before
+  its search started, once ADMISSION_SOFT_LIMIT searches are running, while
+  the p95 of recent full searches is over SEARCH_LATENCY_SLO, or while the
+  Smiles circuit is open.
+- SHED: the message waited over SHED_AFTER seconds, or
+  ADMISSION_MAX_SEARCHES are already running. The user gets the fallback
+  link right away instead of a reply minutes later.
+- QUOTA: the user already has USER_MAX_SEARCHES running or went over
+  USER_SEARCH_RATE per minute.
+- EXPIRED: the message is older than SEARCH_DEADLINE, so the user has
+  likely given up or retried. It is dropped without a reply.
+
+How long a message waited (in Telegram, the update loop or the handler
+queue) is the backlog signal every front-end shares: with updates handled
+inline only one search ever runs, so the running count alone never sees a
+spike.
+
+An admitted search carries its deadline in a context variable, which
+tracing.bind_context takes into the provider and fan-out threads. Rate
+budget waits, HTTP timeouts and provider timeouts are cut to what is left,
+so work stops once nobody is waiting for the answer. Cache-only mode is
+signalled the same way.
+"""
+import os
+import time
+import logging
+import threading
+import contextvars
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from metrics import ADMISSIONS, SEARCHES_ADMITTED
+from rate_budget import RateBudget
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_MAX_SEARCHES = int(os.getenv("ADMISSION_MAX_SEARCHES", "32"))
+ADMISSION_SOFT_LIMIT = int(os.getenv("ADMISSION_SOFT_LIMIT", "16"))
+USER_MAX_SEARCHES = int(os.getenv("USER_MAX_SEARCHES", "2"))
+USER_SEARCH_RATE = float(os.getenv("USER_SEARCH_RATE", "10"))
+USER_SEARCH_BURST = int(os.getenv("USER_SEARCH_BURST", "5"))
+SEARCH_DEADLINE = float(os.getenv("SEARCH_DEADLINE", "45"))
+QUEUE_DELAY_TARGET = float(os.getenv("QUEUE_DELAY_TARGET", "8"))
+SHED_AFTER = float(os.getenv("SHED_AFTER", "20"))
+SEARCH_LATENCY_SLO = float(os.getenv("SEARCH_LATENCY_SLO", "15"))
+
+# Full searches from the last SLO_WINDOW seconds count towards the p95; with
+# none left in the window the SLO is considered met again, so degraded mode ends
+SLO_WINDOW = 60
+SLO_MIN_SAMPLES = 5
+# Users whose rate bucket is remembered
+MAX_TRACKED_USERS = 10000
+
+FULL = "full"
+CACHED = "cached"
+SHED = "shed"
+QUOTA = "quota"
+EXPIRED = "expired"
+
+_deadline = contextvars.ContextVar("search_deadline", default=None)
+_cache_only = contextvars.ContextVar("search_cache_only", default=False)
+
+def search_deadline():
+    """time.monotonic() value the current search must finish by, inf outside one"""
+    deadline = _deadline.get()
+    return float("inf") if deadline is None else deadline
+
+def time_left(default):
+    """Seconds left before the current search's deadline, at most default"""
+    return min(default, search_deadline() - time.monotonic())
+
+def deadline_passed():
+    return search_deadline() <= time.monotonic()
+
+def cache_only():
+    """True while the current search may only be answered from the cache"""
+    return _cache_only.get()
+
+class Admission:
+    def __init__(self, max_searches=ADMISSION_MAX_SEARCHES, soft_limit=ADMISSION_SOFT_LIMIT,
+                 user_max=USER_MAX_SEARCHES, user_rate=USER_SEARCH_RATE, user_burst=USER_SEARCH_BURST,
+                 deadline=SEARCH_DEADLINE, delay_target=QUEUE_DELAY_TARGET, shed_after=SHED_AFTER,
+                 slo=SEARCH_LATENCY_SLO):
+        self.max_searches = max_searches
+        self.soft_limit = soft_limit
+        self.user_max = user_max
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.deadline = deadline
+        self.delay_target = delay_target
+        self.shed_after = shed_after
+        self.slo = slo
+        self._running = 0
+        self._running_by_user = {}
+        self._user_budgets = OrderedDict()
+        # (finished at, seconds) of recent full searches
+        self._latencies = deque()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def admit(self, user_id, sent_at=None):
+        """Decide how to serve a search and hold its slot for the with block
+
+        sent_at is the message's Unix time; the deadline counts from it, so
+        time spent waiting in Telegram or in the handler queue is included.
+        """
+        now = time.time()
+        sent_at = min(sent_at or now, now)
+        mode = self._reserve(user_id, now - sent_at)
+        ADMISSIONS.inc(mode=mode)
+        if mode not in (FULL, CACHED):
+            logger.info(f"Search for {user_id} not admitted: {mode}")
+            yield mode
+            return
+
+        SEARCHES_ADMITTED.inc()
+        deadline_token = _deadline.set(time.monotonic() + self.deadline - (now - sent_at))
+        cache_token = _cache_only.set(mode == CACHED)
+        started = time.monotonic()
+        try:
+            yield mode
+        finally:
+            _cache_only.reset(cache_token)
+            _deadline.reset(deadline_token)
+            SEARCHES_ADMITTED.dec()
+            self._release(user_id, mode, time.monotonic() - started)
+
+    def _reserve(self, user_id, age):
+        if age > self.deadline:
+            return EXPIRED
+
+        with self._lock:
+            if self._running_by_user.get(user_id, 0) >= self.user_max:
+                return QUOTA
+            if age > self.shed_after or self._running >= self.max_searches:
+                return SHED
+            if not self._user_budget(user_id).try_acquire():
+                return QUOTA
+
+            overloaded = age > self.delay_target or self._running >= self.soft_limit or self._slo_breached()
+            mode = CACHED if overloaded else FULL
+            self._running += 1
+            self._running_by_user[user_id] = self._running_by_user.get(user_id, 0) + 1
+
+        if mode == FULL and _smiles_degraded():
+            mode = CACHED
+        return mode
+
+    def _release(self, user_id, mode, elapsed):
+        with self._lock:
+            self._running -= 1
+            left = self._running_by_user.get(user_id, 1) - 1
+            if left:
+                self._running_by_user[user_id] = left
+            else:
+                self._running_by_user.pop(user_id, None)
+            if mode == FULL:
+                self._latencies.append((time.monotonic(), elapsed))
+
+    def _user_budget(self, user_id):
+        budget = self._user_budgets.get(user_id)
+        if budget is None:
+            budget = RateBudget(self.user_rate / 60, self.user_burst)
+            self._user_budgets[user_id] = budget
+            if len(self._user_budgets) > MAX_TRACKED_USERS:
+                self._user_budgets.popitem(last=False)
+        else:
+            self._user_budgets.move_to_end(user_id)
+        return budget
+
+    def _slo_breached(self):
+        """p95 of the full searches in the window is over the SLO; call with the lock held"""
+        cutoff = time.monotonic() - SLO_WINDOW
+        while self._latencies and self._latencies[0][0] < cutoff:
+            self._latencies.popleft()
+        if len(self._latencies) < SLO_MIN_SAMPLES:
+            return False
+        latencies = sorted(elapsed for _, elapsed in self._latencies)
+        return latencies[int(len(latencies) * 0.95)] > self.slo
+
+def _smiles_degraded():
+    from smiles_client import smiles_circuit
+    return smiles_circuit.degraded
+
+_admission = None
+_admission_lock = threading.Lock()
+
+def get_admission():
+    global _admission
+    if _admission is None:
+        with _admission_lock:
+            if _admission is None:
+                _admission = Admission()
+    return _admission
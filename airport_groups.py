@@ -0,0 +1,102 @@
+import os
+import re
+
+# Metro codes that cover more than one airport
+METRO_GROUPS = {
+    "BUE": ["EZE", "AEP"],
+    "SAO": ["GRU", "CGH", "VCP"],
+    "RIO": ["GIG", "SDU"],
+    "NYC": ["JFK", "EWR", "LGA"],
+    "WAS": ["IAD", "DCA", "BWI"],
+    "CHI": ["ORD", "MDW"],
+    "LON": ["LHR", "LGW", "STN", "LCY"],
+    "PAR": ["CDG", "ORY"],
+    "MIL": ["MXP", "LIN"],
+    "ROM": ["FCO", "CIA"],
+    "TYO": ["NRT", "HND"],
+}
+
+# Regions users can type instead of an airport code
+REGION_GROUPS = {
+    "EUROPA": ["MAD", "BCN", "LIS", "FCO", "CDG", "LHR", "FRA", "AMS"],
+    "EEUU": ["MIA", "JFK", "MCO", "LAX"],
+    "CARIBE": ["PUJ", "CUN", "AUA", "HAV"],
+    "BRASIL": ["GRU", "GIG", "FLN", "SSA"],
+    "SUDAMERICA": ["SCL", "LIM", "BOG", "MVD", "ASU"],
+}
+
+# Words accepted between origin and destination ("EZE → MAD")
+ROUTE_SEPARATORS = {"→", "->"}
+
+# Upper bound on origin/destination pairs searched for one query
+MAX_FANOUT_PAIRS = 12
+
+# AIRPORT_INDEX_STRICT=0 also accepts 3-letter codes missing from airports.tsv
+AIRPORT_INDEX_STRICT = os.getenv("AIRPORT_INDEX_STRICT", "1") != "0"
+
+_IATA_RE = re.compile(r"^[A-Z]{3}$")
+
+def expand_airports(token):
+    """Expand one metro code, region, IATA code or city name into a list of airports"""
+    from airport_index import get_airport_index
+
+    token = token.strip().upper()
+
+    if token in REGION_GROUPS:
+        return list(REGION_GROUPS[token])
+    if token in METRO_GROUPS:
+        return list(METRO_GROUPS[token])
+
+    index = get_airport_index()
+    if token in index:
+        return [token]
+
+    city_airports = index.airports_for_city(token)
+    if city_airports:
+        return city_airports
+
+    if not AIRPORT_INDEX_STRICT and _IATA_RE.match(token):
+        return [token]
+
+    return []
+
+def parse_airport_list(text):
+    """Parse "EZE,AEP", "BUE" or "EUROPA" into a de-duplicated airport list"""
+    airports = []
+
+    for token in text.split(","):
+        if not token.strip():
+            continue
+
+        expanded = expand_airports(token)
+        if not expanded:
+            return []
+
+        for code in expanded:
+            if code not in airports:
+                airports.append(code)
+
+    return airports
+
+def all_route_pairs(origenes, destinos):
+    """Every origin/destination pair, skipping same-airport routes, taking origins in turn
+
+    "BUE EUROPA" gives EZE→MAD, AEP→MAD, EZE→BCN, AEP→BCN, ... so a cap on
+    the number of pairs drops destinations for every origin alike instead of
+    a whole origin.
+    """
+    per_origin = [[(o, d) for d in destinos if o != d] for o in origenes]
+    return [
+        routes[i]
+        for i in range(max((len(routes) for routes in per_origin), default=0))
+        for routes in per_origin
+        if i < len(routes)
+    ]
+
+def build_route_pairs(origenes, destinos, limit=MAX_FANOUT_PAIRS):
+    """The pairs searched for a query, at most limit of them; see skipped_route_pairs()"""
+    return all_route_pairs(origenes, destinos)[:limit]
+
+def skipped_route_pairs(origenes, destinos, pairs):
+    """How many routes of the query build_route_pairs left out"""
+    return len(all_route_pairs(origenes, destinos)) - len(pairs)
@@ -0,0 +1,142 @@
+"""Bundled airport index: IATA validation, city lookup and suggestions
+
+The index is read from airports.tsv (IATA, city, country, aliases) the first
+time it is needed. Codes and normalized city names are dict keys, so
+validating a code or resolving "madrid" to MAD is a single lookup; prefix
+search bisects a sorted name list and only typo suggestions go through
+difflib.
+"""
+import os
+import bisect
+import difflib
+import threading
+import unicodedata
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+AIRPORTS_FILE = os.getenv(
+    "AIRPORTS_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "airports.tsv")
+)
+
+class Airport(NamedTuple):
+    iata: str
+    city: str
+    country: str
+    metro: Optional[str] = None
+
+    def label(self):
+        return f"{self.iata} ({self.city})"
+
+def normalize_name(text):
+    """Upper-case, drop accents and separators: "São Paulo" -> "SAOPAULO" """
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return "".join(c for c in text.upper() if c.isalnum())
+
+class AirportIndex:
+    def __init__(self, rows, metro_groups=None):
+        metro_of = {}
+        for metro, codes in (metro_groups or {}).items():
+            for code in codes:
+                metro_of[code] = metro
+
+        self._airports = {}
+        by_name = {}
+        for iata, city, country, aliases in rows:
+            self._airports[iata] = Airport(iata, city, country, metro_of.get(iata))
+            for name in [city] + aliases:
+                codes = by_name.setdefault(normalize_name(name), [])
+                if iata not in codes:
+                    codes.append(iata)
+
+        self._by_name = {name: tuple(codes) for name, codes in by_name.items()}
+        self._names = sorted(self._by_name)
+        self._codes = sorted(self._airports)
+
+    @classmethod
+    def load(cls, path=AIRPORTS_FILE):
+        from airport_groups import METRO_GROUPS
+
+        rows = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip() or line.startswith("#"):
+                    continue
+                fields = line.rstrip("\r\n").split("\t")
+                aliases = [a for a in fields[3].split(",") if a] if len(fields) > 3 else []
+                rows.append((fields[0], fields[1], fields[2], aliases))
+        return cls(rows, METRO_GROUPS)
+
+    def __contains__(self, code):
+        return code in self._airports
+
+    def __len__(self):
+        return len(self._airports)
+
+    def get(self, code):
+        return self._airports.get(code)
+
+    def airports_for_city(self, name):
+        """Airports serving a city or alias, exact match after normalizing"""
+        # Grammar tokens are already upper-case ASCII, skip the unicode pass for them
+        key = name if name.isascii() and name.isalnum() and name.isupper() else normalize_name(name)
+        return list(self._by_name.get(key, ()))
+
+    def search_prefix(self, prefix, limit=10):
+        """Airports whose code or city name starts with prefix"""
+        key = normalize_name(prefix)
+        if not key:
+            return []
+
+        found = []
+        if len(key) <= 3:
+            start = bisect.bisect_left(self._codes, key)
+            for code in self._codes[start:]:
+                if not code.startswith(key) or len(found) >= limit:
+                    break
+                found.append(code)
+
+        start = bisect.bisect_left(self._names, key)
+        for name in self._names[start:]:
+            if not name.startswith(key) or len(found) >= limit:
+                break
+            for code in self._by_name[name]:
+                if code not in found:
+                    found.append(code)
+
+        return [self._airports[code] for code in found[:limit]]
+
+    @lru_cache(maxsize=1024)
+    def suggest(self, token, limit=3):
+        """Likely airports for a mistyped code or city name"""
+        key = normalize_name(token)
+        if not key:
+            return ()
+
+        found = []
+        if len(key) == 3:
+            # One wrong letter first, typos near the end of the code before those at the start
+            for position in (2, 1, 0):
+                for code in self._codes:
+                    if code[position] != key[position] and sum(a != b for a, b in zip(code, key)) == 1:
+                        found.append(code)
+            # Swapped letters ("JKF")
+            found.extend(code for code in self._codes if code != key and sorted(code) == sorted(key))
+        for name in difflib.get_close_matches(key, self._names, n=limit, cutoff=0.75):
+            for code in self._by_name[name]:
+                if code not in found:
+                    found.append(code)
+
+        return tuple(self._airports[code] for code in found[:limit])
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_airport_index():
+    """The process-wide airport index, loaded on first use"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = AirportIndex.load()
+    return _index
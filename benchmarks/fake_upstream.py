@@ -0,0 +1,233 @@
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+AIRLINES = ["LATAM", "GOL", "Azul", "Aerolíneas Argentinas", "Iberia", "Air Europa", "TAP"]
+
+_TELEGRAM_PATH = re.compile(r"^/bot[^/]+/(\w+)$")
+
+class FakeUpstream:
+    """Local stand-in for smiles.com.ar and api.telegram.org
+
+    One threaded HTTP server answers the Smiles login walk and search endpoints
+    and the Telegram getMe/getUpdates/sendMessage/editMessageText methods, with
+    configurable latency, error rate and payload size.
+    """
+    def __init__(self, host="127.0.0.1", port=0, smiles_latency=0.2, telegram_latency=0.0,
+                 error_rate=0.0, flights_per_search=20, long_poll=1.0, seed=0):
+        self.smiles_latency = smiles_latency
+        self.telegram_latency = telegram_latency
+        self.error_rate = error_rate
+        self.flights_per_search = flights_per_search
+        self.long_poll = long_poll
+        self.calls = Counter()
+        self.on_send = None
+        self.on_inline_answer = None
+        self.on_edit = None
+        # Inline keyboards of sent or edited messages, by message_id
+        self.markups = {}
+        self._random = random.Random(seed)
+        self._updates = []
+        self._next_update_id = 1
+        self._next_message_id = 1
+        self._cond = threading.Condition()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self):
+        """Environment variables that point the bot modules at this server"""
+        return {
+            "TELEGRAM_BOT_TOKEN": "bench-token",
+            "TELEGRAM_API_URL": self.url,
+            "SMILES_WEB_URL": self.url,
+            "SMILES_API_URL": self.url,
+            "SMILES_AUTH_URL": self.url,
+            "SMILES_SEARCH_URL": f"{self.url}/v1/airlines/search",
+            "SMILES_MOBILE_URL": f"{self.url}/v1/flights/search",
+            "ELPS_SEARCH_URL": f"{self.url}/api/search",
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-upstream", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def push_update(self, chat_id, text):
+        """Queue a user message for the bot's next getUpdates call"""
+        return self._push("message", lambda update_id: {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": f"user{chat_id}"},
+            "text": text
+        })
+
+    def push_inline_query(self, user_id, query):
+        """Queue an inline query ("@bot <query>") typed by user_id"""
+        return self._push("inline_query", lambda update_id: {
+            "id": f"iq{update_id}",
+            "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+            "query": query,
+            "offset": ""
+        })
+
+    def push_callback_query(self, user_id, message_id, data):
+        """Queue a press on an inline keyboard button of message_id"""
+        return self._push("callback_query", lambda update_id: {
+            "id": f"cb{update_id}",
+            "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+            "message": {"message_id": message_id, "chat": {"id": user_id, "type": "private"}},
+            "data": data
+        })
+
+    def _push(self, kind, build):
+        with self._cond:
+            update_id = self._next_update_id
+            self._next_update_id += 1
+            self._updates.append({"update_id": update_id, kind: build(update_id)})
+            self._cond.notify_all()
+        return update_id
+
+    def _get_updates(self, offset, timeout):
+        deadline = time.monotonic() + min(timeout, self.long_poll)
+        with self._cond:
+            # Updates below the offset are acknowledged and can be forgotten
+            self._updates = [u for u in self._updates if u["update_id"] >= offset]
+            while not self._updates:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+                self._updates = [u for u in self._updates if u["update_id"] >= offset]
+            return list(self._updates[:100])
+
+    def _search_payload(self, params):
+        departure = params.get("departureDate", ["2025-06-01"])[0]
+        flights = []
+        for i in range(self.flights_per_search):
+            flights.append({
+                "airline": {"name": self._random.choice(AIRLINES)},
+                "flight": {"departure": {"date": departure, "time": f"{(6 + i) % 24:02d}:00"}},
+                "price": {
+                    "miles": self._random.randrange(20000, 150000, 500),
+                    "taxes": {"amount": round(self._random.uniform(5000, 90000), 2)}
+                },
+                "availability": self._random.randint(1, 9)
+            })
+        return {"flights": flights}
+
+    def _make_handler(self):
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _body(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                return self.rfile.read(length) if length else b""
+
+            def _reply(self, status, payload, content_type="application/json"):
+                body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _params(self, raw_body):
+                params = parse_qs(urlparse(self.path).query)
+                if raw_body:
+                    try:
+                        params.update({k: [v] for k, v in json.loads(raw_body).items()})
+                    except (ValueError, AttributeError):
+                        params.update(parse_qs(raw_body.decode()))
+                return params
+
+            def _telegram(self, method, params):
+                upstream.calls[f"telegram.{method}"] += 1
+                if upstream.telegram_latency:
+                    time.sleep(upstream.telegram_latency)
+
+                if method == "getUpdates":
+                    offset = int(params.get("offset", [0])[0])
+                    timeout = float(params.get("timeout", [0])[0])
+                    return self._reply(200, {"ok": True, "result": upstream._get_updates(offset, timeout)})
+
+                if method == "getMe":
+                    return self._reply(200, {"ok": True, "result": {"id": 1, "is_bot": True, "username": "FakeBot"}})
+
+                if method == "sendMessage":
+                    with upstream._cond:
+                        message_id = upstream._next_message_id
+                        upstream._next_message_id += 1
+                    if "reply_markup" in params:
+                        upstream.markups[message_id] = params["reply_markup"][0]
+                    if upstream.on_send:
+                        upstream.on_send(int(params["chat_id"][0]), params.get("text", [""])[0])
+                    return self._reply(200, {"ok": True, "result": {"message_id": message_id}})
+
+                if method == "editMessageText":
+                    message_id = int(params["message_id"][0])
+                    upstream.markups[message_id] = params.get("reply_markup", [None])[0]
+                    if upstream.on_edit:
+                        upstream.on_edit(int(params["chat_id"][0]), message_id, params.get("text", [""])[0])
+
+                if method == "answerInlineQuery" and upstream.on_inline_answer:
+                    upstream.on_inline_answer(params["inline_query_id"][0], params.get("results", [[]])[0])
+
+                return self._reply(200, {"ok": True, "result": True})
+
+            def _route(self, raw_body):
+                path = urlparse(self.path).path
+                params = self._params(raw_body)
+
+                match = _TELEGRAM_PATH.match(path)
+                if match:
+                    return self._telegram(match.group(1), params)
+
+                if path == "/v1/airlines/search":
+                    upstream.calls["smiles.search"] += 1
+                    time.sleep(upstream.smiles_latency)
+                    if upstream._random.random() < upstream.error_rate:
+                        return self._reply(500, {"error": "upstream error"})
+                    return self._reply(200, upstream._search_payload(params))
+
+                if path in ("/login", "/api/auth/login"):
+                    upstream.calls[f"smiles.{path.strip('/').replace('/', '.')}"] += 1
+                    if self.command == "GET":
+                        return self._reply(200, b'<form><input name="_token" value="bench-csrf"></form>', "text/html")
+                    return self._reply(200, {"success": True, "token": "bench"})
+
+                if path == "/emission":
+                    upstream.calls["smiles.emission"] += 1
+                    page = b'<script>var cfg = {"access_token": "bench-access", "x-api-key": "bench-key"};</script>'
+                    return self._reply(200, page, "text/html")
+
+                upstream.calls[f"unknown.{path}"] += 1
+                return self._reply(404, {"error": "not found"})
+
+            def do_GET(self):
+                self._route(b"")
+
+            def do_POST(self):
+                self._route(self._body())
+
+        return Handler
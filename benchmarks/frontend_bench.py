@@ -0,0 +1,86 @@
+"""Front-end benchmark: the same load and import checks for every bot entry point
+
+Both entry points are thin front-ends over bot_core, so they should answer
+the same traffic with the same latency and the same upstream calls. Each
+front-end is load tested in a fresh interpreter (module singletons and
+signal handlers would leak between runs in one process) and its import time
+measured; the run fails when a front-end leaves queries unanswered, searches
+Smiles more often than the others, has a p95 more than --max-ratio times the
+best one, or goes over the optional absolute budgets.
+
+Usage:
+    python -m benchmarks.frontend_bench --users 10 --queries 3
+    python -m benchmarks.frontend_bench --max-p95-ms 3000 --max-import-ms 300
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.startup_time import measure_import
+
+FRONTENDS = ["main", "simple_working_bot"]
+
+def load_report(bot, args):
+    """load_test report of one front-end, run in its own interpreter"""
+    command = [
+        sys.executable, "-m", "benchmarks.load_test", "--json", "--bot", bot,
+        "--users", str(args.users), "--queries", str(args.queries),
+        "--smiles-latency", str(args.smiles_latency), "--seed", str(args.seed),
+    ]
+    output = subprocess.check_output(command, cwd=ROOT, stderr=subprocess.DEVNULL, timeout=args.timeout)
+    # The bots print their banner on stdout, the report is the last line
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the bot front-ends under the same load")
+    parser.add_argument("--bots", nargs="+", default=FRONTENDS, choices=FRONTENDS)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=3)
+    parser.add_argument("--smiles-latency", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--import-runs", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--max-ratio", type=float, default=1.5, help="fail if a p95 is this many times the best one")
+    parser.add_argument("--max-p95-ms", type=float, default=None)
+    parser.add_argument("--max-import-ms", type=float, default=None)
+    args = parser.parse_args(argv)
+
+    results = {}
+    for bot in args.bots:
+        report = load_report(bot, args)
+        report["import_s"] = measure_import(bot, args.import_runs)
+        results[bot] = report
+
+    print(f"{'front-end':<20} {'answered':>9} {'p50':>8} {'p95':>8} {'replies/s':>10} {'searches':>9} {'import':>8}")
+    for bot, r in results.items():
+        print(
+            f"{bot:<20} {r['answered']:>4}/{r['queries']:<4} {r['p50_s'] * 1000:>6.0f}ms {r['p95_s'] * 1000:>6.0f}ms "
+            f"{r['throughput_rps']:>10.2f} {r['upstream_calls'].get('smiles.search', 0):>9} {r['import_s'] * 1000:>6.0f}ms"
+        )
+
+    failures = []
+    best_p95 = min(r["p95_s"] for r in results.values())
+    fewest_searches = min(r["upstream_calls"].get("smiles.search", 0) for r in results.values())
+    for bot, r in results.items():
+        if r["answered"] < r["queries"]:
+            failures.append(f"{bot} answered {r['answered']} of {r['queries']} queries")
+        if best_p95 and r["p95_s"] > best_p95 * args.max_ratio:
+            failures.append(f"{bot} p95 {r['p95_s'] * 1000:.0f}ms is over {args.max_ratio:g}x the best {best_p95 * 1000:.0f}ms")
+        if r["upstream_calls"].get("smiles.search", 0) > fewest_searches:
+            failures.append(f"{bot} made {r['upstream_calls']['smiles.search']} Smiles searches, another front-end needed {fewest_searches}")
+        if args.max_p95_ms is not None and r["p95_s"] * 1000 > args.max_p95_ms:
+            failures.append(f"{bot} p95 {r['p95_s'] * 1000:.0f}ms, budget {args.max_p95_ms:.0f}ms")
+        if args.max_import_ms is not None and r["import_s"] * 1000 > args.max_import_ms:
+            failures.append(f"{bot} import {r['import_s'] * 1000:.0f}ms, budget {args.max_import_ms:.0f}ms")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""End-to-end load benchmark against a local fake Smiles/Telegram server
+
+Usage:
+    python -m benchmarks.load_test --bot main --users 50 --queries 5
+    python -m benchmarks.load_test --bot simple_working_bot --smiles-latency 0.5 --error-rate 0.1
+    python -m benchmarks.load_test --bot multiworker --workers 4
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_upstream import FakeUpstream
+
+ROUTES = [
+    ("EZE", "MAD"), ("EZE", "MIA"), ("GRU", "JFK"), ("EZE", "BCN"),
+    ("AEP", "SCL"), ("EZE", "FCO"), ("GRU", "LIS"), ("SCL", "MIA"),
+]
+MONTHS = ["2025-06", "2025-07", "2025-08", "2025-09"]
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+def start_bot(module_name, workers=2):
+    """Import a bot entry point and run its main loop on a daemon thread"""
+    module = importlib.import_module(module_name)
+
+    if module_name == "multiworker":
+        db_path = os.path.join(tempfile.mkdtemp(prefix="bench-"), "bot_state.db")
+        target = lambda: module.main(["--workers", str(workers), "--db", db_path])
+    elif asyncio.iscoroutinefunction(module.main):
+        target = lambda: asyncio.run(module.main())
+    else:
+        target = module.main
+
+    thread = threading.Thread(target=target, name=f"bot-{module_name}", daemon=True)
+    thread.start()
+    return module
+
+def run(bot="main", users=20, queries=5, smiles_latency=0.2, telegram_latency=0.0,
+        error_rate=0.0, flights=20, reply_timeout=60.0, seed=0, workers=2):
+    """Drive simulated users through a bot entry point and return a report dict"""
+    upstream = FakeUpstream(
+        smiles_latency=smiles_latency, telegram_latency=telegram_latency,
+        error_rate=error_rate, flights_per_search=flights, seed=seed
+    ).start()
+    os.environ.update(upstream.env())
+    # Fresh journal, the fake server numbers updates from 1 on every run
+    bench_dir = tempfile.mkdtemp(prefix="bench-")
+    os.environ["UPDATE_JOURNAL_DB"] = os.path.join(bench_dir, "updates.db")
+    os.environ["SMILES_TOKEN_FILE"] = os.path.join(bench_dir, "smiles_tokens.json")
+    # Nor results, chat state or demand counts left on disk by an earlier run
+    os.environ["SEARCH_DISK_CACHE"] = os.path.join(bench_dir, "search_cache.db")
+    os.environ["CHAT_STATE_DB"] = os.path.join(bench_dir, "chat_state.db")
+    os.environ["DEMAND_FILE"] = os.path.join(bench_dir, "demand.json")
+
+    replies = {}
+    lock = threading.Lock()
+
+    def on_send(chat_id, text):
+        # Progress messages ("Buscando vuelos...") are not the answer
+        if "Buscando vuelos" in text:
+            return
+        with lock:
+            waiter = replies.get(chat_id)
+        if waiter:
+            waiter.set()
+
+    upstream.on_send = on_send
+
+    tracemalloc.start()
+    start_bot(bot, workers)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    latencies = []
+    timeouts = 0
+    rng = random.Random(seed)
+
+    def user(chat_id):
+        nonlocal timeouts
+        for _ in range(queries):
+            origen, destino = rng.choice(ROUTES)
+            text = f"{origen} {destino} {rng.choice(MONTHS)}"
+            event = threading.Event()
+            with lock:
+                replies[chat_id] = event
+
+            started = time.monotonic()
+            upstream.push_update(chat_id, text)
+            if event.wait(reply_timeout):
+                with lock:
+                    latencies.append(time.monotonic() - started)
+            else:
+                with lock:
+                    timeouts += 1
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=user, args=(1000 + i,)) for i in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    upstream.stop()
+
+    return {
+        "bot": bot,
+        "users": users,
+        "queries": users * queries,
+        "answered": len(latencies),
+        "timeouts": timeouts,
+        "elapsed_s": elapsed,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_s": percentile(latencies, 50),
+        "p95_s": percentile(latencies, 95),
+        "p99_s": percentile(latencies, 99),
+        "upstream_calls": dict(upstream.calls),
+        "tracemalloc_peak_mb": peak / 1e6,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+    }
+
+def print_report(report):
+    print(f"Bot:          {report['bot']}")
+    print(f"Users:        {report['users']}  queries: {report['queries']}  answered: {report['answered']}  timeouts: {report['timeouts']}")
+    print(f"Elapsed:      {report['elapsed_s']:.2f}s  throughput: {report['throughput_rps']:.2f} replies/s")
+    print(f"Latency:      p50 {report['p50_s'] * 1000:.0f}ms  p95 {report['p95_s'] * 1000:.0f}ms  p99 {report['p99_s'] * 1000:.0f}ms")
+    print(f"Memory:       tracemalloc peak {report['tracemalloc_peak_mb']:.1f}MB  max RSS {report['max_rss_mb']:.1f}MB")
+    print("Upstream calls:")
+    for name, count in sorted(report["upstream_calls"].items()):
+        print(f"  {name:<32} {count}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test a bot entry point against local fake upstreams")
+    parser.add_argument("--bot", default="main", choices=["main", "simple_working_bot", "multiworker"])
+    parser.add_argument("--workers", type=int, default=2, help="worker processes for --bot multiworker")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=5, help="queries per simulated user")
+    parser.add_argument("--smiles-latency", type=float, default=0.2)
+    parser.add_argument("--telegram-latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--flights", type=int, default=20, help="flights per search response")
+    parser.add_argument("--reply-timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print the report as one JSON line")
+    args = parser.parse_args(argv)
+
+    report = run(
+        bot=args.bot, users=args.users, queries=args.queries,
+        smiles_latency=args.smiles_latency, telegram_latency=args.telegram_latency,
+        error_rate=args.error_rate, flights=args.flights,
+        reply_timeout=args.reply_timeout, seed=args.seed, workers=args.workers
+    )
+    if args.json:
+        print(json.dumps(report))
+    else:
+        print_report(report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Throughput benchmark for the flight query grammar
+
+Compares parse_query with the memo cache, without it, and the token loop
+handle_flight_search used before the grammar existed.
+
+Usage:
+    python -m benchmarks.parser_bench --iterations 200000
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from airport_groups import ROUTE_SEPARATORS, parse_airport_list
+from query_grammar import QueryError, _parse_normalized, parse_query
+
+CORPUS = [
+    "EZE MAD 2025-06",
+    "eze mad 2025-06-15",
+    "EZE → MIA 2025-07-01 2025-07-15 EXEC",
+    "BUE EUROPA 2025-06-10..2025-06-14 M7-14 2P",
+    "EZE,AEP MIA 2025-08 M5 M10 FLEX",
+    "GRU JFK 2025-09-20 EJECUTIVA PAX3",
+    "EZA MAD 2025-06",
+    "hola",
+]
+
+def legacy_parse(text):
+    """The pre-grammar parsing loop, kept here as the baseline"""
+    partes = [p for p in text.strip().upper().split() if p not in ROUTE_SEPARATORS]
+    if len(partes) < 3:
+        return None
+    origenes = parse_airport_list(partes[0])
+    destinos = parse_airport_list(partes[1])
+    if not origenes or not destinos:
+        return None
+    clase, min_dias, max_dias, fecha_regreso = "ECO", 7, 14, None
+    for parte in partes[3:]:
+        if parte in ["ECO", "EXEC"]:
+            clase = parte
+        elif re.match(r"\d{4}-\d{2}-\d{2}", parte):
+            fecha_regreso = parte
+        elif parte.startswith("M") and parte[1:].isdigit():
+            if min_dias == 7:
+                min_dias = int(parte[1:])
+            else:
+                max_dias = int(parte[1:])
+    return origenes, destinos, partes[2], fecha_regreso, clase, min_dias, max_dias
+
+def grammar_uncached(text):
+    try:
+        return _parse_normalized(" ".join(text.upper().split()))
+    except QueryError:
+        return None
+
+def grammar_cached(text):
+    try:
+        return parse_query(text)
+    except QueryError:
+        return None
+
+def bench(func, iterations):
+    started = time.perf_counter()
+    for i in range(iterations):
+        func(CORPUS[i % len(CORPUS)])
+    return iterations / (time.perf_counter() - started)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark flight query parsing")
+    parser.add_argument("--iterations", type=int, default=100000)
+    args = parser.parse_args(argv)
+
+    for name, func in (("legacy loop", legacy_parse), ("grammar", grammar_uncached), ("grammar+memo", grammar_cached)):
+        rate = bench(func, args.iterations)
+        print(f"{name:<14} {rate:>12,.0f} parses/s  {1e6 / rate:6.2f}us/parse")
+
+if __name__ == "__main__":
+    main()
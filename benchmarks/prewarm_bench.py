@@ -0,0 +1,107 @@
+"""Pre-warm benchmark: cache hit rate of the most searched routes
+
+Replays Zipf-distributed searches over --routes routes against the fake
+upstream with a short cache TTL, once with the pre-warmer off and once with
+it running, and reports the hit rate of the --head most popular routes, the
+overall hit rate (both after a first TTL of warm-up) and the upstream calls
+each run made.
+
+Usage:
+    python -m benchmarks.prewarm_bench --seconds 40 --ttl 4
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_upstream import FakeUpstream
+
+AIRPORTS = ["EZE", "GRU", "SCL", "MAD", "MIA", "JFK", "BCN", "FCO", "LIS", "LIM", "BOG", "CUN"]
+
+def make_routes(count, rng):
+    routes = [(o, d) for o in AIRPORTS for d in AIRPORTS if o != d]
+    rng.shuffle(routes)
+    return routes[:count]
+
+def replay(routes, head, seconds, gap, prewarmer=None, warmup=0.0, seed=3):
+    """Search Zipf-picked routes for seconds; returns (head hits, head total, hits, total) after warmup"""
+    import smiles_client
+
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(routes))]
+    stats = [0, 0, 0, 0]
+    started = time.monotonic()
+    deadline = started + seconds
+    next_round = started
+
+    while time.monotonic() < deadline:
+        index = rng.choices(range(len(routes)), weights)[0]
+        origen, destino = routes[index]
+        key = smiles_client.search_cache_key(origen, destino, "2099-06")
+        hit = smiles_client.search_cache.get(key) is not None
+        smiles_client.search_flights_cached(origen, destino, "2099-06")
+
+        # The first searches of every route miss either way, count the steady state
+        if time.monotonic() - started >= warmup:
+            stats[2] += hit
+            stats[3] += 1
+            if index < head:
+                stats[0] += hit
+                stats[1] += 1
+
+        # The bench drives the rounds itself instead of waiting on the thread's interval
+        if prewarmer and time.monotonic() >= next_round:
+            prewarmer.run_once()
+            next_round = time.monotonic() + prewarmer.interval
+        time.sleep(gap)
+    return stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark cache pre-warming")
+    parser.add_argument("--routes", type=int, default=40)
+    parser.add_argument("--head", type=int, default=3)
+    parser.add_argument("--seconds", type=float, default=40)
+    parser.add_argument("--ttl", type=float, default=4)
+    parser.add_argument("--gap", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    upstream = FakeUpstream(smiles_latency=0.02).start()
+    os.environ.update(upstream.env())
+    os.environ["SMILES_TOKEN_FILE"] = os.path.join(tempfile.mkdtemp(), "tokens.json")
+    os.environ["DEMAND_FILE"] = os.path.join(tempfile.mkdtemp(), "demand.json")
+    os.environ.setdefault("SMILES_RATE_PER_SEC", "50")
+    os.environ.setdefault("SMILES_RATE_BURST", "50")
+    os.environ.setdefault("SMILES_BACKGROUND_RATE_PER_SEC", "5")
+    os.environ.setdefault("SMILES_BACKGROUND_RATE_BURST", "10")
+
+    import prewarm
+    import smiles_client
+    from prewarm import Prewarmer, SpaceSaving
+    from search_cache import SearchCache
+
+    routes = make_routes(args.routes, random.Random(1))
+    print(f"{args.routes} routes, Zipf traffic, cache TTL {args.ttl:g}s, {args.seconds:g}s per run")
+
+    for name in ("off", "on"):
+        smiles_client.search_cache = SearchCache(ttl=args.ttl, name="bench")
+        tracker = SpaceSaving()
+        prewarm._tracker = tracker
+        prewarmer = Prewarmer(tracker, interval=args.ttl / 4, top_n=args.head * 2, margin=args.ttl / 2) if name == "on" else None
+
+        calls = upstream.calls["smiles.search"]
+        head_hits, head_total, hits, total = replay(routes, args.head, args.seconds, args.gap, prewarmer, args.ttl)
+        print(
+            f"pre-warm {name:<3}  head hit rate {head_hits / max(head_total, 1):6.1%}  "
+            f"overall {hits / max(total, 1):6.1%}  upstream searches {upstream.calls['smiles.search'] - calls}"
+        )
+
+    upstream.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Rendering benchmark: reply formatting for large result sets
+
+Compares the rendering module, ranking by miles and by effective cost, with
+the += formatter main.py used before it, on searches returning --results
+flights, and checks that a range search
+listing every result splits into parts Telegram accepts.
+
+Usage:
+    python -m benchmarks.render_bench --results 1000 --iterations 200
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rendering import TELEGRAM_MESSAGE_LIMIT, render_flights, split_message
+from scoring import DEFAULT_FX_RATES, DEFAULT_PROFILE, FxTable, Scorer
+
+AIRLINES = ["LATAM", "GOL", "Aerolíneas Argentinas", "Iberia & Air Europa", "<Azul>"]
+
+def make_flights(count, seed=7):
+    rng = random.Random(seed)
+    return [
+        {
+            "airline": {"name": rng.choice(AIRLINES)},
+            "flight": {"departure": {"date": f"2025-06-{rng.randint(10, 16)}", "time": f"{rng.randint(0, 23):02d}:30"}},
+            "price": {"miles": rng.randint(20, 200) * 1000, "taxes": {"amount": rng.randint(50, 400)}},
+        }
+        for _ in range(count)
+    ]
+
+def legacy_format(flights, origen, destino, clase):
+    """The += formatter kept here as the baseline"""
+    sorted_flights = sorted(flights, key=lambda x: int(x.get("price", {}).get("miles", 999999)))
+
+    texto = f"✈️ <b>Vuelos Smiles Auténticos</b>\n"
+    texto += f"📍 {origen} → {destino} ({clase})\n"
+    texto += "─" * 40 + "\n\n"
+
+    best_deal = sorted_flights[0] if sorted_flights else None
+    for i, flight in enumerate(sorted_flights[:5], 1):
+        airline_name = flight.get("airline", {}).get("name", "Aerolínea no especificada")
+        departure = flight.get("flight", {}).get("departure", {})
+        fecha = departure.get("date", "Fecha no disponible")
+        hora = departure.get("time", "")
+        millas = flight.get("price", {}).get("miles", "N/A")
+        taxes = flight.get("price", {}).get("taxes", {}).get("amount", "N/A")
+
+        if flight == best_deal:
+            texto += f"🏆 <b>MEJOR OFERTA</b>\n"
+        texto += f"{i}. 🗓 <b>{fecha}"
+        if hora:
+            texto += f" a las {hora}"
+        texto += f"</b>\n"
+        texto += f"   ✈️ {airline_name}\n"
+        texto += f"   💰 <b>{millas:,} millas"
+        if taxes and taxes != "N/A":
+            texto += f" + ARS {taxes} tasas</b>\n"
+        else:
+            texto += "</b>\n"
+        if i < len(sorted_flights[:5]):
+            texto += "\n"
+
+    miles_list = [int(f.get("price", {}).get("miles")) for f in flights if f.get("price", {}).get("miles")]
+    texto += f"\n📊 <b>Resumen:</b>\n"
+    texto += f"• Vuelos encontrados: {len(flights)}\n"
+    texto += f"• Mejor precio: {best_deal.get('price', {}).get('miles', 'N/A'):,} millas\n"
+    if len(miles_list) >= 2 and max(miles_list) > min(miles_list):
+        texto += f"• Ahorro máximo: {max(miles_list) - min(miles_list):,} millas\n"
+    texto += f"\n✅ <b>Datos obtenidos directamente de Smiles</b>"
+    return texto
+
+def bench(func, flights, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func(flights, "EZE", "MAD", "ECO")
+    return (time.perf_counter() - started) / iterations
+
+def check_split(flights):
+    """Render every flight of a range search and split it; returns the part count"""
+    lines = [legacy_format([flight], "EZE", "MAD", "ECO") for flight in flights]
+    parts = split_message("\n\n".join(lines))
+    for part in parts:
+        units = len(part.encode("utf-16-le")) // 2
+        assert units <= TELEGRAM_MESSAGE_LIMIT, f"part of {units} units"
+        assert part.count("<b>") == part.count("</b>"), "tag split across parts"
+    return len(parts)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark reply rendering")
+    parser.add_argument("--results", type=int, default=1000)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    flights = make_flights(args.results)
+    legacy = bench(legacy_format, flights, args.iterations)
+    rendered = bench(render_flights, flights, args.iterations)
+    scorer = Scorer(DEFAULT_PROFILE, FxTable(DEFAULT_FX_RATES))
+    scored = bench(lambda *a: render_flights(*a, scorer=scorer), flights, args.iterations)
+
+    print(f"{args.results} results, {args.iterations} renders each")
+    print(f"{'legacy +=':<14} {legacy * 1e3:8.3f}ms/render")
+    print(f"{'rendering':<14} {rendered * 1e3:8.3f}ms/render  ({legacy / rendered:.1f}x)")
+    print(f"{'by cost':<14} {scored * 1e3:8.3f}ms/render  ({legacy / scored:.1f}x)")
+    print(f"Full listing split into {check_split(flights)} messages of at most {TELEGRAM_MESSAGE_LIMIT} chars")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Round-trip pairing benchmark: heap pairing against the full cross product
+
+Builds a month of outbound and return legs (--per-day flights each day) and
+times cheapest_round_trips with and without stay/airline constraints, checking
+the answer against brute force.
+
+Usage:
+    python -m benchmarks.round_trip_bench --per-day 40
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from round_trip import cheapest_round_trips
+
+AIRLINES = ["LATAM", "GOL", "Azul", "Iberia", "Air Europa"]
+
+def make_legs(origen, destino, per_day, rng):
+    return [
+        {
+            "_origen": origen,
+            "_destino": destino,
+            "airline": {"name": rng.choice(AIRLINES)},
+            "flight": {"departure": {"date": f"2025-06-{day:02d}", "time": "10:00"}},
+            "price": {"miles": rng.randrange(20000, 150000, 500), "taxes": {"amount": 100.0}},
+        }
+        for day in range(1, 31) for _ in range(per_day)
+    ]
+
+def brute_force(outbound, inbound, k, min_dias=None, max_dias=None, same_airline=False):
+    """Every valid combination, sorted; the baseline the heap must match"""
+    totals = []
+    for out in outbound:
+        out_day = date.fromisoformat(out["flight"]["departure"]["date"])
+        for back in inbound:
+            stay = (date.fromisoformat(back["flight"]["departure"]["date"]) - out_day).days
+            if stay < (min_dias or 0) or (max_dias is not None and stay > max_dias):
+                continue
+            if same_airline and out["airline"] != back["airline"]:
+                continue
+            totals.append(out["price"]["miles"] + back["price"]["miles"])
+    return sorted(totals)[:k]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark round-trip pairing")
+    parser.add_argument("--per-day", type=int, default=40)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(1)
+    outbound = make_legs("EZE", "MAD", args.per_day, rng)
+    inbound = make_legs("MAD", "EZE", args.per_day, rng)
+    print(f"{len(outbound)} outbound x {len(inbound)} return legs")
+
+    cases = [
+        ("any stay", {}),
+        ("M7-14", {"min_dias": 7, "max_dias": 14}),
+        ("M7-14 MISMA", {"min_dias": 7, "max_dias": 14, "same_airline": True}),
+    ]
+    for name, options in cases:
+        started = time.perf_counter()
+        trips = cheapest_round_trips(outbound, inbound, args.k, **options)
+        heap_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        expected = brute_force(outbound, inbound, args.k, **options)
+        brute_s = time.perf_counter() - started
+
+        match = "ok" if [t.miles for t in trips] == expected else "MISMATCH"
+        print(f"{name:<14} heap {heap_s * 1e3:8.1f}ms  cross product {brute_s * 1e3:8.1f}ms  {match}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Startup benchmark: import time and restart-to-first-reply
+
+Import time is measured in fresh interpreters. Restart-to-first-reply spawns
+the bot as a subprocess with a search already waiting in getUpdates (what a
+container restart looks like), times the acknowledgement and the result, then
+stops it with SIGTERM. The first restart starts without saved Smiles tokens,
+the following ones reuse the tokens saved at shutdown.
+
+Usage:
+    python -m benchmarks.startup_time --bot main --restarts 3
+    python -m benchmarks.startup_time --bot simple_working_bot --max-import-ms 300 --max-reply-ms 1000
+"""
+import argparse
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.fake_upstream import FakeUpstream
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+
+def measure_import(module, runs=5):
+    """Median seconds to import module in a fresh interpreter"""
+    # Importing opens the search disk cache; keep it out of the working tree
+    state_dir = tempfile.mkdtemp(prefix="bench-import-")
+    env = dict(os.environ, SEARCH_DISK_CACHE=os.path.join(state_dir, "search_cache.db"),
+               CHAT_STATE_DB=os.path.join(state_dir, "chat_state.db"))
+    samples = []
+    for _ in range(runs):
+        output = subprocess.check_output(
+            [sys.executable, "-c", IMPORT_SNIPPET.format(module=module)], cwd=ROOT, env=env
+        )
+        samples.append(float(output.decode().strip().splitlines()[-1]))
+    return statistics.median(samples)
+
+def measure_restart(bot, upstream, env, query, replies=2, timeout=30.0):
+    """Seconds from process spawn to the first reply and to the last expected reply"""
+    sent = []
+    done = threading.Event()
+
+    def on_send(chat_id, text):
+        sent.append(time.monotonic())
+        if len(sent) >= replies:
+            done.set()
+
+    upstream.on_send = on_send
+    upstream.push_update(4242, query)
+
+    started = time.monotonic()
+    process = subprocess.Popen(
+        [sys.executable, f"{bot}.py"], cwd=ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        done.wait(timeout)
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        upstream.on_send = None
+
+    if len(sent) < replies:
+        return None, None
+    return sent[0] - started, sent[replies - 1] - started
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure bot import time and restart-to-first-reply")
+    parser.add_argument("--bot", default="main", choices=["main", "simple_working_bot"])
+    parser.add_argument("--restarts", type=int, default=3)
+    parser.add_argument("--import-runs", type=int, default=5)
+    parser.add_argument("--query", default="EZE MIA 2025-07-15")
+    parser.add_argument("--smiles-latency", type=float, default=0.2)
+    parser.add_argument("--max-import-ms", type=float, default=None, help="fail if the median import is slower")
+    parser.add_argument("--max-reply-ms", type=float, default=None, help="fail if a warm restart replies slower")
+    args = parser.parse_args(argv)
+
+    import_s = measure_import(args.bot, args.import_runs)
+    print(f"Import {args.bot}: median {import_s * 1000:.0f}ms over {args.import_runs} runs")
+
+    upstream = FakeUpstream(smiles_latency=args.smiles_latency, long_poll=1.0).start()
+    state_dir = tempfile.mkdtemp(prefix="bench-startup-")
+    env = dict(os.environ, **upstream.env())
+    env.update({
+        "UPDATE_JOURNAL_DB": os.path.join(state_dir, "updates.db"),
+        "SMILES_TOKEN_FILE": os.path.join(state_dir, "smiles_tokens.json"),
+        "SEARCH_DISK_CACHE": os.path.join(state_dir, "search_cache.db"),
+        "CHAT_STATE_DB": os.path.join(state_dir, "chat_state.db"),
+        "DEMAND_FILE": os.path.join(state_dir, "demand.json"),
+        "METRICS_PORT": "0",
+    })
+
+    warm_results = []
+    failed = False
+    try:
+        for i in range(args.restarts):
+            first, last = measure_restart(args.bot, upstream, env, args.query)
+            label = "cold" if i == 0 else "warm"
+            if first is None:
+                print(f"Restart {i + 1} ({label}): no reply")
+                failed = True
+                continue
+            print(f"Restart {i + 1} ({label}): first reply {first * 1000:.0f}ms  result {last * 1000:.0f}ms")
+            if i > 0:
+                warm_results.append(last)
+    finally:
+        upstream.stop()
+
+    if args.max_import_ms is not None and import_s * 1000 > args.max_import_ms:
+        print(f"FAIL: import took {import_s * 1000:.0f}ms, budget {args.max_import_ms:.0f}ms")
+        failed = True
+    if args.max_reply_ms is not None and any(s * 1000 > args.max_reply_ms for s in warm_results):
+        print(f"FAIL: a warm restart took more than {args.max_reply_ms:.0f}ms to reply")
+        failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,353 @@
+"""Update handling and the polling loop shared by every bot front-end
+
+main.py and simple_working_bot.py used to carry their own Telegram client,
+Smiles search, 401 handling and formatters; now each is a Frontend (its
+name, welcome and help texts and update journal) handed to run(), and
+everything else lives here, in telegram_api and in flight_search. Caching,
+pooling and concurrency changes therefore apply to both entry points, and
+to the multiworker processes, which call handle_update() directly.
+
+Handlers are plain functions taking the TelegramBot and block on the
+search. By default the update loop runs them one after the other, answering
+inline queries and button presses of a batch before the searches. A
+threaded front-end hands them to a chat_executor.ChatExecutor instead:
+several chats are served at once, each chat's updates still in order.
+"""
+import time
+import logging
+from typing import NamedTuple
+from metrics import QUEUE_DEPTH, start_metrics_server
+from tracing import span, start_trace
+from telegram_api import TelegramBot
+
+logger = logging.getLogger(__name__)
+
+SEARCHING_TEXT = "🔎 Buscando vuelos, por favor espera..."
+QUOTA_TEXT = "⏳ Estás buscando muy seguido. Esperá unos segundos y usá /again para repetir la búsqueda."
+SHED_TEXT = "🚦 Hay muchas búsquedas en curso. Podés usar /again en un rato o buscar directo en Smiles:\n\n"
+
+class Frontend(NamedTuple):
+    """What differs between the bot entry points"""
+    name: str
+    welcome: str
+    help: str
+    # update_journal file, one per entry point so both can run side by side
+    journal: str
+    poll_timeout: int = 30
+    # Run handlers on a ChatExecutor instead of inline in the update loop
+    threaded: bool = False
+
+# Seconds to wait for a handler to finish when a poll only returned updates already being handled
+BUSY_POLL_WAIT = 0.5
+
+def handle_inline_query(bot, inline_query):
+    """Answer "@bot ORIGEN DESTINO FECHA" from cached results only"""
+    from inline_search import get_inline_search
+
+    try:
+        user_id = inline_query.get("from", {}).get("id")
+        results, cache_time, is_personal = get_inline_search().answer(user_id, inline_query.get("query", ""))
+        bot.answer_inline_query(inline_query["id"], results, cache_time, is_personal)
+    except Exception as e:
+        logger.error(f"Error handling inline query: {e}")
+
+def handle_callback_query(bot, callback_query):
+    """Re-render a result page from its stored set when a result button is pressed"""
+    from result_cursors import handle_result_callback, is_result_callback
+
+    try:
+        data = callback_query.get("data", "")
+        if not is_result_callback(data):
+            bot.answer_callback_query(callback_query["id"])
+            return
+
+        # Cost profiles belong to the chat, as for the /costo command and the search that ranked the reply
+        message = callback_query.get("message")
+        chat_id = message["chat"]["id"] if message else None
+        toast, reply = handle_result_callback(chat_id, data)
+        # Answer first, the spinner on the button stops while the edit goes out
+        bot.answer_callback_query(callback_query["id"], toast)
+        if reply and message:
+            bot.edit_message_text(message["chat"]["id"], message["message_id"], reply.text, reply.reply_markup)
+    except Exception as e:
+        logger.error(f"Error handling callback query: {e}")
+
+def handle_message(bot, message, frontend):
+    """Handle commands and flight searches"""
+    try:
+        chat_id = message.get("chat", {}).get("id")
+        text = message.get("text", "").strip()
+        if not chat_id or not text:
+            return
+        # Who the search quota is charged to, and when its deadline started
+        sender = message.get("from", {}).get("id", chat_id)
+        sent_at = message.get("date")
+
+        if not text.startswith("/"):
+            with span("handle_flight_search"):
+                handle_flight_search(bot, chat_id, text, sender, sent_at)
+            return
+
+        command, _, addressee = text.split(maxsplit=1)[0].partition("@")
+        command = command.lower()
+        # "/start@OtherBot" in a group is for another bot
+        if addressee and not is_own_name(bot, addressee):
+            return
+        if command == "/start":
+            bot.send_message(chat_id, frontend.welcome)
+        elif command == "/help":
+            bot.send_message(chat_id, frontend.help)
+        elif command == "/costo":
+            from scoring import handle_cost_command
+            bot.send_message(chat_id, handle_cost_command(chat_id, text))
+        elif command == "/profile":
+            handle_profile_command(bot, chat_id, text)
+        else:
+            from chat_state import handle_state_command, is_state_command
+
+            # Commands meant for other bots in a group get no answer
+            if not is_state_command(text):
+                return
+            reply, query = handle_state_command(chat_id, text)
+            if reply:
+                bot.send_message(chat_id, reply)
+            if query:
+                with span("handle_flight_search"):
+                    run_flight_query(bot, chat_id, query, sender, sent_at)
+    except Exception as e:
+        logger.error(f"Error handling message: {e}")
+
+def is_own_name(bot, name):
+    """Whether a command's @name is this bot; assumed so while getMe has not answered"""
+    username = bot.username
+    return username is None or name.lower() == username.lower()
+
+def handle_profile_command(bot, chat_id, text):
+    from profiler import is_admin, parse_profile_seconds, start_background_profile
+
+    # Admin only, other users just get no answer
+    if not is_admin(chat_id):
+        return
+    seconds = parse_profile_seconds(text)
+    bot.send_message(chat_id, f"🔬 Perfilando el bot durante {seconds:.0f}s...")
+    start_background_profile(seconds, lambda report: bot.send_message(chat_id, report))
+
+def handle_flight_search(bot, chat_id, text, sender=None, sent_at=None):
+    """Parse a typed search with the chat's preferences and run it"""
+    from query_grammar import QueryError, parse_query
+    from chat_state import get_chat_state_store
+
+    try:
+        query = parse_query(text, get_chat_state_store().get(chat_id).prefs)
+    except QueryError as e:
+        bot.send_message(chat_id, str(e))
+        return
+    run_flight_query(bot, chat_id, query, sender, sent_at)
+
+def run_flight_query(bot, chat_id, query, sender=None, sent_at=None):
+    """Search a parsed query and reply, remembering it for /again and /next
+
+    Admission control decides first whether the search runs in full, from
+    the cache only, or not at all (see admission.py).
+    """
+    from scoring import scorer_for
+    from chat_state import get_chat_state_store
+    from result_cursors import PagedReply
+    from flight_search import buscar_vuelos_fallback, search_query
+    from admission import EXPIRED, QUOTA, SHED, get_admission
+
+    get_chat_state_store().remember_query(chat_id, query)
+
+    with get_admission().admit(sender or chat_id, sent_at) as mode:
+        if mode == EXPIRED:
+            return
+        if mode == QUOTA:
+            bot.send_message(chat_id, QUOTA_TEXT)
+            return
+        if mode == SHED:
+            fallback = buscar_vuelos_fallback(
+                query.origenes[0], query.destinos[0], query.fecha_salida, query.fecha_regreso, query.clase
+            )
+            bot.send_message(chat_id, SHED_TEXT + fallback)
+            return
+
+        bot.send_message(chat_id, SEARCHING_TEXT)
+
+        # One search, a fan-out over several airports or dates, or a round trip
+        resultado = search_query(query, scorer_for(chat_id))
+    if isinstance(resultado, PagedReply):
+        bot.send_message(chat_id, resultado.text, reply_markup=resultado.reply_markup)
+    else:
+        bot.send_message(chat_id, resultado)
+
+def handle_update(bot, update, frontend, **trace):
+    """Dispatch one Telegram update to its handler"""
+    if "message" in update:
+        with start_trace("update", update_id=update.get("update_id"), **trace):
+            handle_message(bot, update["message"], frontend)
+    elif "inline_query" in update:
+        with start_trace("inline_query", update_id=update.get("update_id"), **trace):
+            handle_inline_query(bot, update["inline_query"])
+    elif "callback_query" in update:
+        with start_trace("callback_query", update_id=update.get("update_id"), **trace):
+            handle_callback_query(bot, update["callback_query"])
+
+def chat_key(update):
+    """Updates with the same key are handled one at a time, in order"""
+    if "message" in update:
+        return update["message"].get("chat", {}).get("id")
+    if "callback_query" in update:
+        callback = update["callback_query"]
+        return callback.get("message", {}).get("chat", {}).get("id") or callback.get("from", {}).get("id")
+    if "inline_query" in update:
+        return f"inline:{update['inline_query'].get('from', {}).get('id')}"
+    return None
+
+def register_shutdown_hooks(lifecycle, journal=None):
+    """Flush tokens, chat state, demand counts and the disk cache, stop the worker pools and close pooled connections when the bot shuts down"""
+    from smiles_auth import save_smiles_tokens
+    from chat_state import flush_chat_state
+    from disk_cache import flush_disk_cache
+    from http_pool import close_http_pool
+    from prewarm import stop_prewarmer
+
+    def stop_worker_pools():
+        # Imported here so registering the hook does not slow down startup
+        from orchestrator import shutdown_orchestrator
+        from inline_search import shutdown_inline_search
+        import parse_executor
+        shutdown_inline_search()
+        shutdown_orchestrator()
+        parse_executor.shutdown()
+
+    lifecycle.on_shutdown(save_smiles_tokens)
+    lifecycle.on_shutdown(stop_prewarmer)
+    lifecycle.on_shutdown(stop_worker_pools)
+    if journal is not None:
+        lifecycle.on_shutdown(journal.close)
+    lifecycle.on_shutdown(flush_chat_state)
+    lifecycle.on_shutdown(flush_disk_cache)
+    lifecycle.on_shutdown(close_http_pool)
+
+def run(frontend, token):
+    """Poll Telegram and handle updates until the process is asked to stop"""
+    import startup
+    from lifecycle import ShutdownRequested, lifecycle
+    from update_journal import open_update_journal
+    from prewarm import start_prewarmer
+    from profiler import install_signal_handler
+    from chat_executor import HANDLER_WORKERS, ChatExecutor
+
+    bot = TelegramBot(token, frontend.poll_timeout)
+    journal = open_update_journal(frontend.journal)
+    bot.offset = journal.safe_offset()
+    executor = None
+    if frontend.threaded and HANDLER_WORKERS > 0:
+        executor = ChatExecutor()
+        # Handlers that finished while draining moved the safe offset on
+        lifecycle.on_shutdown(lambda: setattr(bot, "offset", journal.safe_offset()))
+        lifecycle.on_shutdown(executor.shutdown)
+
+    register_shutdown_hooks(lifecycle, journal)
+    lifecycle.on_shutdown(bot.confirm_offset)
+    lifecycle.install_signal_handlers()
+
+    start_metrics_server()
+    install_signal_handler()
+
+    startup.mark_ready(frontend.name)
+    startup.warm_up()
+    start_prewarmer()
+
+    try:
+        if executor is not None:
+            logger.info(f"Handling updates on {executor.workers} threads")
+            poll_threaded(bot, journal, executor, frontend, lifecycle)
+        else:
+            poll_inline(bot, journal, frontend, lifecycle)
+
+    except (KeyboardInterrupt, ShutdownRequested):
+        print("\n🛑 Bot detenido")
+    except Exception as e:
+        logger.error(f"Error en bot: {e}")
+    finally:
+        lifecycle.shutdown()
+
+def poll_inline(bot, journal, frontend, lifecycle):
+    """Handle each batch in the update loop's thread"""
+    while not lifecycle.stopping.is_set():
+        updates = bot.get_updates()
+        if updates is None:
+            # Back off after a failed poll; long polling already waits when there is nothing new
+            time.sleep(1)
+            continue
+
+        QUEUE_DEPTH.set(len(updates))
+        # Inline queries and button presses are answered from memory, before slow searches
+        updates = sorted(updates, key=lambda u: "inline_query" not in u and "callback_query" not in u)
+        # Handled out of order, so the offset must not pass an update still waiting in the batch
+        waiting = sorted(u["update_id"] for u in updates)
+
+        for update in updates:
+            # Leave the rest of the batch unacked, Telegram redelivers it to the next instance
+            if lifecycle.stopping.is_set():
+                break
+
+            QUEUE_DEPTH.dec()
+
+            with lifecycle.track():
+                waiting.remove(update["update_id"])
+
+                # Skip updates already handled before a restart
+                if not journal.begin(update["update_id"]):
+                    continue
+
+                handle_update(bot, update, frontend)
+
+                # Only move the offset past updates whose handler finished
+                journal.ack(update["update_id"])
+                bot.offset = min([journal.safe_offset()] + waiting[:1])
+
+        if updates:
+            journal.prune()
+
+def poll_threaded(bot, journal, executor, frontend, lifecycle):
+    """Hand each update to the chat executor; blocks while its backlog is full"""
+    while not lifecycle.stopping.is_set():
+        updates = bot.get_updates()
+        if updates is None:
+            time.sleep(1)
+            continue
+
+        QUEUE_DEPTH.set(len(updates))
+        # The offset stays at the oldest unfinished update, so it and every later one
+        # (running or already done) come back on each poll
+        fresh = [u for u in updates if not executor.is_pending(u["update_id"])]
+
+        # Inline queries and button presses first, they are answered from memory
+        fresh.sort(key=lambda u: "inline_query" not in u and "callback_query" not in u)
+        # Begin the whole batch first: an update left unsubmitted at shutdown stays
+        # in progress, so the offset can never move past it
+        batch = [u for u in fresh if journal.begin(u["update_id"])]
+
+        for update in batch:
+            def handle(update=update):
+                with lifecycle.track():
+                    if lifecycle.stopping.is_set():
+                        return
+                    handle_update(bot, update, frontend)
+                    journal.ack(update["update_id"])
+
+            # Waiting for a slot is the backpressure; re-check for a shutdown every second
+            while not executor.submit(chat_key(update), update["update_id"], handle, timeout=1):
+                if lifecycle.stopping.is_set():
+                    break
+            if lifecycle.stopping.is_set():
+                break
+
+        bot.offset = journal.safe_offset()
+        if batch:
+            journal.prune()
+        elif updates:
+            # Nothing new, only updates behind one still running: wait for it instead of polling again at once
+            executor.wait_for_finish(BUSY_POLL_WAIT)
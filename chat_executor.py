@@ -0,0 +1,93 @@
+"""Threaded update handling without asyncio
+
+A ChatExecutor runs update handlers on a bounded ThreadPoolExecutor of
+HANDLER_WORKERS threads, so one slow search no longer holds every other
+chat behind it. Updates of the same chat still run one at a time and in
+order: while a chat has a handler running its next updates wait in a
+per-chat queue and are handed to the pool as the previous one finishes.
+
+At most HANDLER_BACKLOG updates may be queued or running. Past that,
+submit() blocks, the update loop stops fetching, and Telegram keeps the
+rest until a handler frees a slot; that is the backpressure, the bot never
+holds an unbounded backlog in memory.
+"""
+import os
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from metrics import HANDLER_WAITS, HANDLERS_BUSY
+
+logger = logging.getLogger(__name__)
+
+HANDLER_WORKERS = int(os.getenv("HANDLER_WORKERS", "8"))
+HANDLER_BACKLOG = int(os.getenv("HANDLER_BACKLOG", "64"))
+
+class ChatExecutor:
+    def __init__(self, workers=HANDLER_WORKERS, backlog=HANDLER_BACKLOG):
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="handler")
+        self._slots = threading.BoundedSemaphore(max(backlog, workers))
+        # chat key -> handlers waiting behind the one running; present while the chat has one running
+        self._chats = {}
+        # Update ids submitted and not finished yet
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._finished = threading.Condition(self._lock)
+
+    def is_pending(self, update_id):
+        with self._lock:
+            return update_id in self._pending
+
+    def submit(self, key, update_id, handler, timeout=None):
+        """Run handler() after the chat's earlier updates; waits for a free slot, False if none came in time"""
+        if not self._slots.acquire(blocking=False):
+            HANDLER_WAITS.inc()
+            if not self._slots.acquire(timeout=timeout):
+                return False
+
+        HANDLERS_BUSY.inc()
+        task = (update_id, handler)
+        with self._lock:
+            self._pending.add(update_id)
+            waiting = self._chats.get(key)
+            if waiting is not None:
+                waiting.append(task)
+                return True
+            self._chats[key] = deque()
+        self._executor.submit(self._run, key, task)
+        return True
+
+    def _run(self, key, task):
+        update_id, handler = task
+        try:
+            handler()
+        except Exception as e:
+            logger.error(f"Handler for update {update_id} failed: {e}")
+        finally:
+            self._slots.release()
+            HANDLERS_BUSY.dec()
+            with self._lock:
+                self._pending.discard(update_id)
+                waiting = self._chats[key]
+                next_task = waiting.popleft() if waiting else None
+                if next_task is None:
+                    del self._chats[key]
+                self._finished.notify_all()
+
+        # Back through the pool rather than looping here, so a busy chat cannot keep a thread to itself
+        if next_task is not None:
+            try:
+                self._executor.submit(self._run, key, next_task)
+            except RuntimeError:
+                # Shut down meanwhile; the update stays unacked and is redelivered
+                pass
+
+    def wait_for_finish(self, timeout):
+        """Block until some handler finishes or timeout seconds pass"""
+        with self._finished:
+            self._finished.wait(timeout)
+
+    def shutdown(self):
+        """Stop starting handlers; running ones finish, queued ones are dropped"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,310 @@
+"""Per-chat state: saved preferences, the last query and saved routes
+
+Every message reads its chat's state, so lookups stay in process: states live
+in an LRU of CHAT_STATE_CACHE_SIZE chats and changes are written behind, a
+background thread flushing the dirty chats to SQLite every
+CHAT_STATE_FLUSH_INTERVAL seconds in one transaction (and once more on
+shutdown). States are immutable NamedTuples, a change replaces the whole
+entry, so readers never see a half-updated chat.
+
+Queries are kept as FlightQuery values, already parsed and validated, which
+is what lets /again and /next rerun them without going through the grammar,
+and hands the search cache the same normalized keys a typed query would.
+
+With SHARED_STATE_DB set (multi-worker mode) any worker may handle a chat,
+so the state lives in the shared database with no process-local copy: reads
+go to SQLite and changes are written through.
+"""
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+from query_grammar import FlightQuery, QueryError, describe_options, parse_options
+
+logger = logging.getLogger(__name__)
+
+CHAT_STATE_DB = os.getenv("CHAT_STATE_DB", "chat_state.db")
+CHAT_STATE_CACHE_SIZE = int(os.getenv("CHAT_STATE_CACHE_SIZE", "10000"))
+CHAT_STATE_FLUSH_INTERVAL = float(os.getenv("CHAT_STATE_FLUSH_INTERVAL", "2"))
+
+MAX_SAVED_ROUTES = 10
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_state (
+    chat_id INTEGER PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+class ChatState(NamedTuple):
+    """Everything remembered about one chat"""
+    # query_grammar.parse_options() tuple, applied as defaults when parsing
+    prefs: tuple = ()
+    last_query: Optional[FlightQuery] = None
+    saved: tuple = ()
+    # scoring.ScoringProfile fields, None for the default profile
+    scoring: Optional[dict] = None
+
+    def to_json(self):
+        return json.dumps({
+            "prefs": self.prefs,
+            "last_query": _query_to_json(self.last_query),
+            "saved": [_query_to_json(q) for q in self.saved],
+            "scoring": self.scoring,
+        })
+
+    @classmethod
+    def from_json(cls, text):
+        data = json.loads(text)
+        return cls(
+            prefs=tuple((name, tuple(value) if isinstance(value, list) else value) for name, value in data["prefs"]),
+            last_query=_query_from_json(data.get("last_query")),
+            saved=tuple(_query_from_json(q) for q in data.get("saved", ())),
+            scoring=data.get("scoring"),
+        )
+
+EMPTY_STATE = ChatState()
+
+def _query_to_json(query):
+    if query is None:
+        return None
+    fields = query._asdict()
+    fields["flags"] = sorted(query.flags)
+    return fields
+
+def _query_from_json(fields):
+    if fields is None:
+        return None
+    return FlightQuery(**{
+        **fields,
+        "origenes": tuple(fields["origenes"]),
+        "destinos": tuple(fields["destinos"]),
+        "flags": frozenset(fields["flags"]),
+    })
+
+class ChatStateStore:
+    def __init__(self, path=CHAT_STATE_DB, capacity=CHAT_STATE_CACHE_SIZE, flush_interval=CHAT_STATE_FLUSH_INTERVAL):
+        self.path = path
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self._states = OrderedDict()
+        # Changed states not yet on disk; checked before SQLite so an evicted chat never reads stale
+        self._dirty = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._local = threading.local()
+        self._stop = threading.Event()
+        self._flusher = None
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        """One connection per thread, reopened after a fork"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, chat_id):
+        """The chat's state, EMPTY_STATE for a chat never seen"""
+        with self._lock:
+            state = self._states.get(chat_id)
+            if state is not None:
+                self._states.move_to_end(chat_id)
+                return state
+            state = self._dirty.get(chat_id)
+
+        if state is None:
+            state = self._load(chat_id)
+        if self.capacity:
+            self._remember(chat_id, state)
+        return state
+
+    def _load(self, chat_id):
+        try:
+            row = self._conn().execute("SELECT data FROM chat_state WHERE chat_id = ?", (chat_id,)).fetchone()
+            return ChatState.from_json(row[0]) if row else EMPTY_STATE
+        except Exception as e:
+            logger.error(f"Could not load state of chat {chat_id}: {e}")
+            return EMPTY_STATE
+
+    def _remember(self, chat_id, state):
+        with self._lock:
+            self._states[chat_id] = state
+            self._states.move_to_end(chat_id)
+            while len(self._states) > self.capacity:
+                self._states.popitem(last=False)
+
+    def update(self, chat_id, **changes):
+        """Replace fields of the chat's state; returns the new state"""
+        state = self.get(chat_id)._replace(**changes)
+        if not self.capacity:
+            try:
+                self._write([(chat_id, state)])
+            except Exception:
+                pass
+            return state
+
+        self._remember(chat_id, state)
+        with self._lock:
+            self._dirty[chat_id] = state
+        self._start_flusher()
+        return state
+
+    def remember_query(self, chat_id, query):
+        if self.get(chat_id).last_query != query:
+            self.update(chat_id, last_query=query)
+
+    def save_route(self, chat_id, query):
+        """Add a query to the chat's saved routes; False when it was already saved"""
+        saved = self.get(chat_id).saved
+        if query in saved:
+            return False
+        self.update(chat_id, saved=(saved + (query,))[-MAX_SAVED_ROUTES:])
+        return True
+
+    def _start_flusher(self):
+        if self._flusher is None:
+            with self._flush_lock:
+                if self._flusher is None:
+                    self._flusher = threading.Thread(target=self._flush_loop, name="chat-state-flush", daemon=True)
+                    self._flusher.start()
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Write every dirty chat to SQLite in one transaction"""
+        with self._flush_lock:
+            with self._lock:
+                dirty, self._dirty = self._dirty, {}
+            if not dirty:
+                return 0
+            try:
+                self._write(dirty.items())
+            except Exception:
+                # Keep them for the next flush, unless the chat changed again meanwhile
+                with self._lock:
+                    for chat_id, state in dirty.items():
+                        self._dirty.setdefault(chat_id, state)
+                return 0
+            return len(dirty)
+
+    def _write(self, states):
+        now = time.time()
+        conn = self._conn()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "INSERT OR REPLACE INTO chat_state (chat_id, data, updated_at) VALUES (?, ?, ?)",
+                [(chat_id, state.to_json(), now) for chat_id, state in states]
+            )
+            conn.execute("COMMIT")
+        except Exception as e:
+            logger.error(f"Could not save chat state to {self.path}: {e}")
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+    def close(self):
+        """Stop the flusher and write what is left"""
+        self._stop.set()
+        written = self.flush()
+        if written:
+            logger.info(f"Saved state of {written} chats")
+
+COMMANDS = ("/again", "/next", "/prefs", "/guardar", "/rutas")
+
+PREFS_HELP = """⚙️ <b>Preferencias</b>
+Se aplican a cada búsqueda, lo que escribas en el mensaje tiene prioridad.
+
+<code>/prefs EXEC 2P M7-14 FLEX</code> - guardar clase, pasajeros, estadía y opciones
+<code>/prefs reset</code> - volver a los valores por defecto
+
+🔁 <code>/again</code> - repetir la última búsqueda
+⏭ <code>/next</code> - la última búsqueda, un mes después
+⭐ <code>/guardar</code> - guardar la última búsqueda como ruta
+📋 <code>/rutas</code> - ver tus rutas, <code>/rutas 2</code> para buscar la segunda"""
+
+NO_LAST_QUERY = "🤷 Todavía no hiciste ninguna búsqueda. Escribe una, por ejemplo <code>EZE MAD 2025-06</code>"
+
+def _command(token):
+    """"/Again@FlightBot" -> "/again": in groups Telegram appends the bot's name"""
+    return token.split("@")[0].lower()
+
+def is_state_command(text):
+    return _command(text.split(maxsplit=1)[0]) in COMMANDS
+
+def handle_state_command(chat_id, text):
+    """Handle a chat state command; returns (reply, FlightQuery to search or None)"""
+    store = get_chat_state_store()
+    state = store.get(chat_id)
+    command, *args = text.split()
+    command = _command(command)
+
+    if command in ("/again", "/next"):
+        if state.last_query is None:
+            return NO_LAST_QUERY, None
+        if command == "/again":
+            return None, state.last_query
+        return None, state.last_query.next_month()
+
+    if command == "/prefs":
+        if not args:
+            return f"{PREFS_HELP}\n\n<b>Tus preferencias:</b>\n{describe_options(state.prefs)}", None
+        if args[0].lower() == "reset":
+            store.update(chat_id, prefs=())
+            return f"✅ Preferencias borradas\n{describe_options(())}", None
+        try:
+            prefs = parse_options(" ".join(args))
+        except QueryError as e:
+            return str(e), None
+        store.update(chat_id, prefs=prefs)
+        return f"✅ Preferencias guardadas\n{describe_options(prefs)}", None
+
+    if command == "/guardar":
+        if state.last_query is None:
+            return NO_LAST_QUERY, None
+        if not store.save_route(chat_id, state.last_query):
+            return "⭐ Esa ruta ya estaba guardada", None
+        return f"⭐ Ruta guardada: <code>{state.last_query.to_text()}</code>", None
+
+    # /rutas [N]
+    if not state.saved:
+        return "📋 No tienes rutas guardadas. Usa /guardar después de una búsqueda", None
+    if args:
+        if not args[0].isdigit() or not 1 <= int(args[0]) <= len(state.saved):
+            return f"❌ Elige una ruta del 1 al {len(state.saved)}", None
+        return None, state.saved[int(args[0]) - 1]
+    lines = [f"{i}. <code>{query.to_text()}</code>" for i, query in enumerate(state.saved, 1)]
+    return "📋 <b>Tus rutas</b>\n" + "\n".join(lines) + "\n\nBusca una con <code>/rutas N</code>", None
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_chat_state_store():
+    """The process-wide ChatStateStore, opened on first use"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                shared = os.getenv("SHARED_STATE_DB")
+                if shared:
+                    _store = ChatStateStore(shared, capacity=0)
+                else:
+                    _store = ChatStateStore()
+    return _store
+
+def flush_chat_state():
+    """Shutdown hook: write pending chat state, if the store was ever opened"""
+    if _store is not None:
+        _store.close()
@@ -0,0 +1,170 @@
+"""Compressed on-disk tier under the in-memory search cache
+
+Search results are stored in SQLite as zlib-compressed JSON blobs (a
+month-wide result set shrinks roughly tenfold) with a wall-clock expiry, so
+they survive restarts: after a restart a search the previous process made is
+answered from disk without calling Smiles, and startup.warm_up() loads the
+most recently used entries back into memory.
+
+The tier is bounded by SEARCH_DISK_CACHE_MB. Every PURGE_EVERY writes, and on
+shutdown, expired rows are deleted and the least recently used ones are
+evicted until the blobs fit. Reads only note the key in memory; the access
+times are written with the next purge, so a disk hit costs one SELECT.
+SEARCH_DISK_CACHE="" turns the tier off.
+"""
+import os
+import json
+import time
+import zlib
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+SEARCH_DISK_CACHE = os.getenv("SEARCH_DISK_CACHE", "search_cache.db")
+SEARCH_DISK_CACHE_MB = float(os.getenv("SEARCH_DISK_CACHE_MB", "256"))
+SEARCH_DISK_CACHE_LEVEL = int(os.getenv("SEARCH_DISK_CACHE_LEVEL", "6"))
+
+# Writes between two purges of expired and over-budget entries
+PURGE_EVERY = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at);
+"""
+
+class DiskCache:
+    def __init__(self, path=SEARCH_DISK_CACHE, max_bytes=SEARCH_DISK_CACHE_MB * 1024 * 1024, level=SEARCH_DISK_CACHE_LEVEL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.level = level
+        self._local = threading.local()
+        # key -> last read time, written with the next purge
+        self._touched = {}
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        """One connection per thread, reopened after a fork"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        """(value, seconds left) for a live entry, None when missing or expired"""
+        now = time.time()
+        try:
+            row = self._conn().execute(
+                "SELECT value, expires_at FROM entries WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            if row is None:
+                return None
+            value = json.loads(zlib.decompress(row[0]))
+        except Exception as e:
+            logger.warning(f"Could not read search cache entry from {self.path}: {e}")
+            return None
+
+        with self._lock:
+            self._touched[key] = now
+        return value, row[1] - now
+
+    def set(self, key, value, ttl):
+        blob = zlib.compress(json.dumps(value, separators=(",", ":")).encode("utf-8"), self.level)
+        now = time.time()
+        try:
+            self._conn().execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, blob, len(blob), now + ttl, now)
+            )
+        except Exception as e:
+            logger.warning(f"Could not write search cache entry to {self.path}: {e}")
+            return
+
+        with self._lock:
+            self._writes += 1
+            purge = self._writes % PURGE_EVERY == 0
+        if purge:
+            self.purge()
+
+    def recent(self, limit):
+        """The most recently used live entries, newest first, as (key, value, seconds left)"""
+        now = time.time()
+        try:
+            rows = self._conn().execute(
+                "SELECT key, value, expires_at FROM entries WHERE expires_at > ? ORDER BY accessed_at DESC LIMIT ?",
+                (now, limit)
+            ).fetchall()
+        except Exception as e:
+            logger.warning(f"Could not read search cache entries from {self.path}: {e}")
+            return []
+
+        entries = []
+        for key, blob, expires_at in rows:
+            try:
+                entries.append((key, json.loads(zlib.decompress(blob)), expires_at - now))
+            except Exception as e:
+                logger.warning(f"Skipping unreadable search cache entry {key}: {e}")
+        return entries
+
+    def purge(self):
+        """Record read times, drop expired entries and evict the least recently used over the size limit"""
+        with self._lock:
+            touched, self._touched = self._touched, {}
+
+        conn = self._conn()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("UPDATE entries SET accessed_at = ? WHERE key = ?", [(t, k) for k, t in touched.items()])
+            conn.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            evicted = 0
+            if total > self.max_bytes:
+                for key, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed_at").fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    total -= size
+                    evicted += 1
+            conn.execute("COMMIT")
+        except Exception as e:
+            logger.warning(f"Could not purge search cache {self.path}: {e}")
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            return 0
+        if evicted:
+            logger.info(f"Evicted {evicted} search cache entries to stay under {self.max_bytes / 1024 / 1024:g}MB")
+        return evicted
+
+_disk_cache = None
+_disk_cache_lock = threading.Lock()
+
+def get_disk_cache():
+    """The process-wide DiskCache, None when SEARCH_DISK_CACHE is empty or the file cannot be opened"""
+    global _disk_cache
+    if _disk_cache is None and SEARCH_DISK_CACHE:
+        with _disk_cache_lock:
+            if _disk_cache is None:
+                try:
+                    _disk_cache = DiskCache()
+                except Exception as e:
+                    logger.error(f"Search disk cache disabled, could not open {SEARCH_DISK_CACHE}: {e}")
+                    return None
+    return _disk_cache
+
+def flush_disk_cache():
+    """Shutdown hook: write pending read times and trim the file"""
+    if _disk_cache is not None:
+        _disk_cache.purge()
@@ -0,0 +1,60 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from smiles_client import search_flights_cached
+from tracing import bind_context, span
+
+logger = logging.getLogger(__name__)
+
+# Concurrent sub-searches per fan-out query
+MAX_WORKERS = 4
+
+def search_route_pairs(pairs, fecha_salida, fecha_regreso=None, clase="ECO", max_workers=MAX_WORKERS,
+                       fechas=None, adults=1, flexible=False):
+    """Search every (origin, destination) pair concurrently and merge the flights
+
+    With fechas, every pair is searched on each of those departure dates.
+    Returns the merged flights sorted by miles and the list of pairs that failed.
+    Each flight is a shallow copy tagged with "_origen" and "_destino".
+    """
+    jobs = [(origen, destino, fecha) for origen, destino in pairs for fecha in (fechas or [fecha_salida])]
+    return search_jobs(jobs, fecha_regreso, clase, max_workers, adults, flexible)
+
+def search_jobs(jobs, fecha_regreso=None, clase="ECO", max_workers=MAX_WORKERS, adults=1, flexible=False):
+    """Run (origen, destino, fecha) searches concurrently; same result shape as search_route_pairs"""
+    merged = []
+    failed = []
+    if not jobs:
+        return merged, failed
+
+    def search_job(job):
+        origen, destino, fecha = job
+        with span("fanout.pair", route=f"{origen}-{destino}", fecha=fecha):
+            return search_flights_cached(origen, destino, fecha, fecha_regreso, clase, adults=adults, flexible=flexible)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(jobs)))) as executor:
+        futures = [(job, executor.submit(bind_context(search_job), job)) for job in jobs]
+
+        for (origen, destino, fecha), future in futures:
+            try:
+                flights = future.result()
+            except Exception as e:
+                logger.warning(f"Sub-search {origen} → {destino} on {fecha} failed: {str(e)}")
+                if (origen, destino) not in failed:
+                    failed.append((origen, destino))
+                continue
+
+            for flight in flights:
+                tagged = dict(flight)
+                tagged["_origen"] = origen
+                tagged["_destino"] = destino
+                merged.append(tagged)
+
+    merged.sort(key=_miles)
+    return merged, failed
+
+def _miles(flight):
+    """Sort value of a flight; a missing or unreadable price sorts last instead of failing the merge"""
+    try:
+        return int(flight.get("price", {}).get("miles", 999999))
+    except (TypeError, ValueError):
+        return 999999
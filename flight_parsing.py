@@ -0,0 +1,253 @@
+import logging
+import re
+import json
+from metrics import STAGE_LATENCY, timed
+
+logger = logging.getLogger(__name__)
+
+@timed(STAGE_LATENCY, stage="parse_html")
+def parse_flights_from_html(html_content):
+    """Parse flights from a Smiles HTML page without any network fallback"""
+    
+    flights = []
+    
+    try:
+        from bs4 import BeautifulSoup
+        
+        # Method 1: Try to find JSON data embedded in the page
+        json_patterns = [
+            r'window\.__INITIAL_STATE__\s*=\s*({.*?});',
+            r'window\.__APP_STATE__\s*=\s*({.*?});',
+            r'window\.searchResults\s*=\s*({.*?});',
+            r'"results":\s*(\[.*?\])',
+            r'"flights":\s*(\[.*?\])'
+        ]
+        
+        for pattern in json_patterns:
+            matches = re.findall(pattern, html_content, re.DOTALL)
+            for match in matches:
+                try:
+                    if match.startswith('['):
+                        flight_data = json.loads(match)
+                    else:
+                        data = json.loads(match)
+                        flight_data = data.get('results', data.get('flights', []))
+                    
+                    if flight_data and len(flight_data) > 0:
+                        flights.extend(parse_json_flights(flight_data))
+                        if flights:
+                            return flights[:5]
+                except:
+                    continue
+        
+        # Method 2: Advanced HTML parsing
+        soup = BeautifulSoup(html_content, 'html.parser')
+        
+        # Look for flight cards or containers
+        flight_containers = soup.find_all(['div', 'article', 'section'], 
+                                        class_=re.compile(r'flight|result|card|offer', re.I))
+        
+        for container in flight_containers[:5]:
+            flight = extract_flight_from_container(container)
+            if flight and flight.get('miles'):
+                flights.append(flight)
+        
+        if flights:
+            return flights
+        
+        # Method 3: Regex patterns for specific data
+        return extract_with_regex_patterns(html_content)
+        
+    except Exception as e:
+        logger.error(f"Error parsing flights from HTML: {str(e)}")
+        return []
+
+@timed(STAGE_LATENCY, stage="parse")
+def parse_json_flights(flight_data):
+    """Parse flight data from JSON"""
+    flights = []
+    
+    try:
+        if isinstance(flight_data, list):
+            for item in flight_data:
+                flight = parse_single_flight(item)
+                if flight:
+                    flights.append(flight)
+        elif isinstance(flight_data, dict) and 'flights' in flight_data:
+            for item in flight_data['flights']:
+                flight = parse_single_flight(item)
+                if flight:
+                    flights.append(flight)
+    except:
+        pass
+    
+    return flights
+
+def parse_single_flight(flight_item):
+    """Parse a single flight from various JSON structures"""
+    try:
+        flight = {}
+        
+        # Handle different JSON structures
+        if 'price' in flight_item:
+            price = flight_item['price']
+            flight['miles'] = price.get('miles', price.get('points', 'N/A'))
+            flight['taxes'] = price.get('taxes', {}).get('amount', price.get('tax', 'N/A'))
+        
+        if 'flight' in flight_item:
+            flight_info = flight_item['flight']
+            departure = flight_info.get('departure', {})
+            flight['date'] = departure.get('date', flight_info.get('date', 'N/A'))
+            flight['time'] = departure.get('time', 'N/A')
+        
+        if 'airline' in flight_item:
+            airline = flight_item['airline']
+            flight['airline'] = airline.get('name', airline if isinstance(airline, str) else 'N/A')
+        
+        # Direct access patterns
+        flight['miles'] = flight.get('miles') or flight_item.get('miles', flight_item.get('points', 'N/A'))
+        flight['taxes'] = flight.get('taxes') or flight_item.get('taxes', flight_item.get('tax', 'N/A'))
+        flight['date'] = flight.get('date') or flight_item.get('date', flight_item.get('departureDate', 'N/A'))
+        flight['airline'] = flight.get('airline') or flight_item.get('airline', 'Smiles')
+        
+        if flight.get('miles') and flight['miles'] != 'N/A':
+            return flight
+    except:
+        pass
+    
+    return None
+
+def extract_flight_from_container(container):
+    """Extract flight data from HTML container"""
+    try:
+        flight = {}
+        
+        # Look for miles/points
+        miles_selectors = [
+            '[class*="mile"]', '[class*="point"]', '[class*="price"]',
+            'span:contains("miles")', 'div:contains("miles")'
+        ]
+        
+        for selector in miles_selectors:
+            try:
+                element = container.select_one(selector)
+                if element:
+                    text = element.get_text().strip()
+                    miles_match = re.search(r'[\d,]+', text.replace(',', ''))
+                    if miles_match:
+                        flight['miles'] = miles_match.group()
+                        break
+            except:
+                continue
+        
+        # Look for taxes
+        tax_selectors = [
+            '[class*="tax"]', '[class*="fee"]', 'span:contains("$")', 'div:contains("$")'
+        ]
+        
+        for selector in tax_selectors:
+            try:
+                element = container.select_one(selector)
+                if element:
+                    text = element.get_text().strip()
+                    tax_match = re.search(r'\$?[\d,]+\.?\d*', text)
+                    if tax_match:
+                        flight['taxes'] = tax_match.group().replace('$', '')
+                        break
+            except:
+                continue
+        
+        # Look for date
+        date_selectors = [
+            '[class*="date"]', '[class*="departure"]', 'time'
+        ]
+        
+        for selector in date_selectors:
+            try:
+                element = container.select_one(selector)
+                if element:
+                    text = element.get_text().strip()
+                    date_match = re.search(r'\d{4}-\d{2}-\d{2}|\d{2}/\d{2}/\d{4}', text)
+                    if date_match:
+                        flight['date'] = date_match.group()
+                        break
+            except:
+                continue
+        
+        # Look for airline
+        airline_selectors = [
+            '[class*="airline"]', '[class*="carrier"]', 'img[alt]'
+        ]
+        
+        for selector in airline_selectors:
+            try:
+                element = container.select_one(selector)
+                if element:
+                    if element.name == 'img':
+                        flight['airline'] = element.get('alt', 'Smiles')
+                    else:
+                        flight['airline'] = element.get_text().strip()
+                    break
+            except:
+                continue
+        
+        if flight.get('miles'):
+            return flight
+            
+    except:
+        pass
+    
+    return None
+
+def extract_with_regex_patterns(html_content):
+    """Extract flights using comprehensive regex patterns"""
+    flights = []
+    
+    try:
+        # Multiple regex patterns for different data formats
+        patterns = [
+            {
+                'miles': r'"miles":\s*"?(\d+)"?',
+                'taxes': r'"taxes":\s*"?([0-9.]+)"?',
+                'date': r'"date":\s*"([0-9-]+)"',
+                'airline': r'"airline":\s*"([^"]+)"'
+            },
+            {
+                'miles': r'miles["\']?\s*:\s*["\']?(\d+)',
+                'taxes': r'tax[es]*["\']?\s*:\s*["\']?([0-9.]+)',
+                'date': r'date["\']?\s*:\s*["\']?([0-9-]+)',
+                'airline': r'airline["\']?\s*:\s*["\']?([^"\']+)'
+            },
+            {
+                'miles': r'(\d+)\s*miles',
+                'taxes': r'\$([0-9.]+)',
+                'date': r'(\d{4}-\d{2}-\d{2})',
+                'airline': r'(?:GOL|LATAM|Azul|Avianca|Copa|TAP)'
+            }
+        ]
+        
+        for pattern_set in patterns:
+            miles_matches = re.findall(pattern_set['miles'], html_content, re.I)
+            taxes_matches = re.findall(pattern_set['taxes'], html_content, re.I)
+            date_matches = re.findall(pattern_set['date'], html_content, re.I)
+            airline_matches = re.findall(pattern_set['airline'], html_content, re.I)
+            
+            max_flights = min(len(miles_matches), 5)
+            
+            if max_flights > 0:
+                for i in range(max_flights):
+                    flight = {
+                        "date": date_matches[i] if i < len(date_matches) else "N/A",
+                        "miles": miles_matches[i] if i < len(miles_matches) else "N/A",
+                        "taxes": taxes_matches[i] if i < len(taxes_matches) else "N/A",
+                        "airline": airline_matches[i] if i < len(airline_matches) else "Smiles"
+                    }
+                    flights.append(flight)
+                
+                if flights:
+                    return flights
+    
+    except Exception as e:
+        logger.error(f"Error in regex extraction: {str(e)}")
+    
+    return flights
@@ -0,0 +1,167 @@
+"""Flight search for every bot front-end: one parsed query in, one reply out
+
+search_query() runs a query_grammar.FlightQuery the way its shape asks for:
+a single route goes through the provider orchestrator, several airports or a
+date range fan out over the Smiles cache, and a return date pairs one-way
+legs into round trips. Every path ends in a reply text or a
+result_cursors.PagedReply, and falls back to the Smiles link when the
+upstream could not answer, so front-ends only have to send what comes back.
+"""
+import os
+import logging
+from metrics import FALLBACKS, IN_FLIGHT_SEARCHES, SEARCH_LATENCY, STAGE_LATENCY, timed
+from tracing import span, traced
+from rendering import providers_footer, render_fallback, render_multi_route, render_records, render_round_trips
+
+logger = logging.getLogger(__name__)
+
+# Provider orchestration mode: "hedged", "parallel" or "sequential"
+SEARCH_MODE = os.getenv("SEARCH_MODE", "hedged")
+
+def buscar_vuelos_smiles(origen, destino, fecha_salida, fecha_regreso=None, min_dias=7, max_dias=14, clase="ECO", pasajeros=1, flexible=False, scorer=None):
+    """Search for Smiles flights across every configured provider"""
+    
+    from orchestrator import NoProviderSucceeded, get_orchestrator
+    from providers import SearchQuery
+    
+    # Convert date format for Smiles API
+    if len(fecha_salida) == 7:  # YYYY-MM format
+        fecha_salida = fecha_salida + "-01"
+    
+    if fecha_regreso and len(fecha_regreso) == 7:
+        fecha_regreso = fecha_regreso + "-01"
+    
+    try:
+        query = SearchQuery(origen, destino, fecha_salida, fecha_regreso, clase, pasajeros, flexible)
+        with IN_FLIGHT_SEARCHES.track(), SEARCH_LATENCY.time(provider="all"), span("search", route=f"{origen}-{destino}", mode=SEARCH_MODE):
+            records = get_orchestrator().search(query, mode=SEARCH_MODE)
+    except NoProviderSucceeded as e:
+        logger.error(f"All providers failed: {str(e)}")
+        return buscar_vuelos_fallback(origen, destino, fecha_salida, fecha_regreso, clase)
+    except Exception as e:
+        logger.error(f"Direct Smiles search failed: {str(e)}")
+        return f"❌ Error al buscar vuelos: {str(e)}"
+    
+    if not records:
+        return f"🔍 No se encontraron vuelos disponibles para {origen} → {destino} en {fecha_salida}"
+    
+    return format_flight_records(records, origen, destino, clase, scorer)
+
+def search_query(query, scorer=None):
+    """Run a parsed FlightQuery as one search or as a fan-out, ranked by the scorer's cost when given"""
+    flexible = "FLEX" in query.flags
+    
+    if query.is_round_trip():
+        return buscar_vuelos_ida_vuelta(
+            query.origenes, query.destinos, query.departure_dates(), query.fecha_regreso,
+            query.min_dias, query.max_dias, query.clase, query.pasajeros, flexible, "MISMA" in query.flags, scorer
+        )
+    
+    if query.is_single_search():
+        return buscar_vuelos_smiles(
+            query.origenes[0], query.destinos[0], query.fecha_salida, query.fecha_regreso,
+            query.min_dias, query.max_dias, query.clase, query.pasajeros, flexible, scorer
+        )
+    
+    fechas = query.departure_dates() if query.fecha_hasta else None
+    return buscar_vuelos_multi(
+        query.origenes, query.destinos, query.fecha_salida, query.fecha_regreso, query.clase,
+        fechas=fechas, pasajeros=query.pasajeros, flexible=flexible, scorer=scorer
+    )
+
+def buscar_vuelos_ida_vuelta(origenes, destinos, fechas, fecha_regreso=None, min_dias=None, max_dias=None, clase="ECO",
+                             pasajeros=1, flexible=False, misma_aerolinea=False, scorer=None):
+    """Search outbound and return legs one way and show the cheapest combinations"""
+    
+    from airport_groups import build_route_pairs, skipped_route_pairs
+    from round_trip import search_round_trips
+    
+    pairs = build_route_pairs(origenes, destinos)
+    if not pairs:
+        return "❌ No hay rutas válidas para buscar."
+    
+    try:
+        with IN_FLIGHT_SEARCHES.track(), SEARCH_LATENCY.time(provider="round_trip"), span("search.round_trip", pairs=len(pairs)):
+            trips, pairs, failed = search_round_trips(
+                pairs, fechas, fecha_regreso, min_dias, max_dias, clase,
+                adults=pasajeros, flexible=flexible, same_airline=misma_aerolinea,
+                cost=scorer.flight_cost if scorer else None
+            )
+    except Exception as e:
+        logger.error(f"Round-trip search failed: {str(e)}")
+        return buscar_vuelos_fallback(pairs[0][0], pairs[0][1], fechas[0], fecha_regreso, clase)
+    
+    if not trips:
+        if len(failed) >= 2 * len(pairs):
+            return buscar_vuelos_fallback(pairs[0][0], pairs[0][1], fechas[0], fecha_regreso, clase)
+        return f"🔍 No se encontraron combinaciones de ida y vuelta para {len(pairs)} rutas desde {fechas[0]}"
+    
+    skipped = skipped_route_pairs(origenes, destinos, pairs)
+    return format_round_trip_results(trips, pairs, failed, clase, scorer, skipped)
+
+def buscar_vuelos_multi(origenes, destinos, fecha_salida, fecha_regreso=None, clase="ECO", fechas=None, pasajeros=1, flexible=False, scorer=None):
+    """Search every origin/destination pair and merge them into one ranked answer"""
+    
+    from airport_groups import MAX_FANOUT_PAIRS, build_route_pairs, skipped_route_pairs
+    from fanout_search import search_route_pairs
+    
+    # A date range multiplies the sub-searches, keep the total under the fan-out cap
+    limit = max(1, MAX_FANOUT_PAIRS // len(fechas)) if fechas else MAX_FANOUT_PAIRS
+    pairs = build_route_pairs(origenes, destinos, limit)
+    if not pairs:
+        return "❌ No hay rutas válidas para buscar."
+    
+    if len(fecha_salida) == 7:  # YYYY-MM format
+        fecha_salida = fecha_salida + "-01"
+    
+    if fecha_regreso and len(fecha_regreso) == 7:
+        fecha_regreso = fecha_regreso + "-01"
+    
+    try:
+        with IN_FLIGHT_SEARCHES.track(), SEARCH_LATENCY.time(provider="fanout"), span("search.fanout", pairs=len(pairs)):
+            flights, failed = search_route_pairs(
+                pairs, fecha_salida, fecha_regreso, clase, fechas=fechas, adults=pasajeros, flexible=flexible
+            )
+    except Exception as e:
+        logger.error(f"Fan-out search failed: {str(e)}")
+        return buscar_vuelos_fallback(pairs[0][0], pairs[0][1], fecha_salida, fecha_regreso, clase)
+    
+    if not flights:
+        if len(failed) == len(pairs):
+            return buscar_vuelos_fallback(pairs[0][0], pairs[0][1], fecha_salida, fecha_regreso, clase)
+        return f"🔍 No se encontraron vuelos disponibles para {len(pairs)} rutas en {fecha_salida}"
+    
+    skipped = skipped_route_pairs(origenes, destinos, pairs)
+    return format_multi_route_results(flights, pairs, failed, clase, scorer, skipped)
+
+@timed(STAGE_LATENCY, stage="format")
+@traced("format")
+def format_flight_records(records, origen, destino, clase, scorer=None):
+    """Format normalized provider records, already sorted by miles, keeping the whole set for the result buttons"""
+    from result_cursors import paged_reply
+    
+    text = render_records(records, origen, destino, clase, scorer)
+    return paged_reply(text, records, f"{origen} → {destino}", clase, providers_footer(records), scorer)
+
+@timed(STAGE_LATENCY, stage="format")
+@traced("format")
+def format_multi_route_results(flights, pairs, failed, clase, scorer=None, skipped=0):
+    """Format merged results from a multi-route search, keeping the whole set for the result buttons"""
+    from result_cursors import paged_reply, records_from_flights
+    
+    text = render_multi_route(flights, pairs, failed, clase, scorer, skipped)
+    route = f"{','.join(dict.fromkeys(o for o, _ in pairs))} → {','.join(dict.fromkeys(d for _, d in pairs))}"
+    return paged_reply(text, records_from_flights(flights), route, clase, scorer=scorer)
+
+@timed(STAGE_LATENCY, stage="format")
+@traced("format")
+def format_round_trip_results(trips, pairs, failed, clase, scorer=None, skipped=0):
+    """Format the cheapest outbound + return combinations"""
+    return render_round_trips(trips, pairs, failed, clase, scorer, skipped)
+
+@traced("fallback")
+def buscar_vuelos_fallback(origen, destino, fecha_salida, fecha_regreso, clase):
+    """Fallback search method when authentication fails"""
+    
+    FALLBACKS.inc()
+    return render_fallback(origen, destino, fecha_salida, fecha_regreso, clase)
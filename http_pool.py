@@ -0,0 +1,91 @@
+"""Pool of requests.Session objects shared by every thread
+
+requests.Session is not safe to use from two threads at once, but opening
+a new connection per call pays a TCP (and TLS) handshake every time. A
+SessionPool lends each caller an idle session for the duration of one
+request, so handler, provider and fan-out threads reuse kept-alive
+connections without ever sharing a session. At most HTTP_POOL_SIZE
+sessions are created; once they are all lent out, callers wait for one to
+come back, which also caps how many upstream requests run at once.
+
+Pooled sessions never store cookies, so a request behaves exactly like a
+bare requests.get/post whichever session it lands on.
+"""
+import os
+import queue
+import threading
+import requests
+from contextlib import contextmanager
+from http.cookiejar import DefaultCookiePolicy
+from metrics import HTTP_POOL_WAITS
+
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+
+def new_session():
+    """A session that keeps connections alive but no cookies"""
+    session = requests.Session()
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    return session
+
+class SessionPool:
+    def __init__(self, size=HTTP_POOL_SIZE, name="http"):
+        self.size = size
+        self.name = name
+        # Last returned first, its connections are the most likely still open
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def session(self):
+        """Borrow a session for one request"""
+        session = self._borrow()
+        try:
+            yield session
+        finally:
+            self._idle.put(session)
+
+    def _borrow(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                return new_session()
+        HTTP_POOL_WAITS.inc(pool=self.name)
+        return self._idle.get()
+
+    def get(self, url, **kwargs):
+        with self.session() as session:
+            return session.get(url, **kwargs)
+
+    def post(self, url, **kwargs):
+        with self.session() as session:
+            return session.post(url, **kwargs)
+
+    def close(self):
+        """Close the idle sessions and their connections"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_http_pool():
+    """The process-wide pool for upstream (Smiles, elps.ar) requests"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = SessionPool(name="upstream")
+    return _pool
+
+def close_http_pool():
+    """Shutdown hook: close pooled connections"""
+    if _pool is not None:
+        _pool.close()
@@ -0,0 +1,213 @@
+"""Inline mode: "@bot EZE MAD 2025-06" answered from the cache only
+
+Telegram gives an inline query only a few seconds, so answers never wait on
+Smiles: cached flights are returned right away, and a miss answers with a
+"searching" placeholder while a background refresh fills the cache for the
+next keystroke. Refreshes are debounced per user (only the query the user
+stopped typing on is searched) and run on a small bounded pool, so typing
+does not turn into one upstream search per character.
+"""
+import os
+import html
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from metrics import INLINE_QUERIES, INLINE_REFRESHES
+
+logger = logging.getLogger(__name__)
+
+INLINE_DEBOUNCE = float(os.getenv("INLINE_DEBOUNCE", "0.8"))
+INLINE_REFRESH_WORKERS = int(os.getenv("INLINE_REFRESH_WORKERS", "2"))
+
+# Sub-searches one inline query may look up or refresh
+MAX_INLINE_SEARCHES = 6
+# Refreshes queued or running at once; later misses are not refreshed
+MAX_PENDING_REFRESHES = 20
+MAX_RESULTS = 5
+
+# Seconds Telegram may reuse an answer: long for cached flights, short for placeholders
+HIT_CACHE_TIME = 60
+MISS_CACHE_TIME = 2
+
+class InlineSearch:
+    def __init__(self, debounce=INLINE_DEBOUNCE, workers=INLINE_REFRESH_WORKERS):
+        self.debounce = debounce
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="inline-refresh")
+        self._timers = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def answer(self, user_id, text):
+        """Results for an inline query: (results, cache_time, is_personal)"""
+        from query_grammar import QueryError, parse_query
+
+        text = text.strip()
+        if not text:
+            INLINE_QUERIES.inc(result="empty")
+            return [], MISS_CACHE_TIME, False
+
+        try:
+            query = parse_query(text)
+        except QueryError as e:
+            INLINE_QUERIES.inc(result="invalid")
+            return self._completions(text, str(e)), HIT_CACHE_TIME, False
+
+        searches = self._searches(query)
+        flights, missing = self._cached(query, searches)
+
+        if missing:
+            self._schedule_refresh(user_id, query, missing)
+
+        if not flights:
+            INLINE_QUERIES.inc(result="miss")
+            return [self._placeholder(query)], MISS_CACHE_TIME, True
+
+        INLINE_QUERIES.inc(result="hit" if not missing else "partial")
+        return self._flight_results(query, flights), HIT_CACHE_TIME if not missing else MISS_CACHE_TIME, bool(missing)
+
+    def _searches(self, query):
+        return [
+            (origen, destino, fecha)
+            for origen, destino in query.route_pairs()
+            for fecha in query.departure_dates()
+        ][:MAX_INLINE_SEARCHES]
+
+    def _cached(self, query, searches):
+        from smiles_client import cached_flights
+
+        flights = []
+        missing = []
+        flexible = "FLEX" in query.flags
+        for origen, destino, fecha in searches:
+            found = cached_flights(origen, destino, fecha, query.fecha_regreso, query.clase, query.pasajeros, flexible)
+            if found is None:
+                missing.append((origen, destino, fecha))
+                continue
+            flights.extend((origen, destino, flight) for flight in found)
+
+        flights.sort(key=lambda item: _miles(item[2]))
+        return flights, missing
+
+    def _schedule_refresh(self, user_id, query, missing):
+        """Refresh once the user stops typing; a newer query replaces the pending one"""
+        timer = threading.Timer(self.debounce, self._refresh, args=(user_id, query, missing))
+        timer.daemon = True
+        with self._lock:
+            previous = self._timers.get(user_id)
+            if previous:
+                previous.cancel()
+            self._timers[user_id] = timer
+        timer.start()
+
+    def _refresh(self, user_id, query, missing):
+        from smiles_client import search_flights_cached
+
+        with self._lock:
+            if self._timers.get(user_id) is threading.current_thread():
+                del self._timers[user_id]
+
+        flexible = "FLEX" in query.flags
+        for origen, destino, fecha in missing:
+            key = (origen, destino, fecha, query.fecha_regreso, query.clase, query.pasajeros, flexible)
+            with self._lock:
+                if key in self._refreshing or len(self._refreshing) >= MAX_PENDING_REFRESHES:
+                    continue
+                self._refreshing.add(key)
+
+            INLINE_REFRESHES.inc()
+            self._executor.submit(self._run_refresh, search_flights_cached, key)
+
+    def _run_refresh(self, search, key):
+        origen, destino, fecha, fecha_regreso, clase, adults, flexible = key
+        try:
+            search(origen, destino, fecha, fecha_regreso, clase, adults=adults, flexible=flexible)
+        except Exception as e:
+            logger.warning(f"Inline refresh {origen} → {destino} failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _completions(self, text, error):
+        """Airport completions for the word being typed, or the parse error"""
+        from airport_index import get_airport_index
+
+        word = text.split()[-1] if text.split() else ""
+        results = []
+        if word.isalpha():
+            prefix = " ".join(text.split()[:-1])
+            for airport in get_airport_index().search_prefix(word, limit=MAX_RESULTS):
+                completed = f"{prefix} {airport.iata}".strip()
+                results.append(_article(
+                    f"airport-{airport.iata}", f"{airport.iata} · {airport.city}", f"Completar: {completed}",
+                    f"<code>{html.escape(completed)}</code>"
+                ))
+        if not results:
+            results.append(_article("help", "Formato: ORIGEN DESTINO FECHA", error.splitlines()[0], error))
+        return results
+
+    def _placeholder(self, query):
+        route = f"{','.join(query.origenes)} → {','.join(query.destinos)}"
+        return _article(
+            "pending", f"🔄 Buscando {route}...", "Seguí escribiendo o volvé a intentar en unos segundos",
+            f"🔎 Buscando vuelos {html.escape(route)} en {query.fecha_salida}..."
+        )
+
+    def _flight_results(self, query, flights):
+        results = []
+        for i, (origen, destino, flight) in enumerate(flights[:MAX_RESULTS]):
+            departure = flight.get("flight", {}).get("departure", {})
+            airline = flight.get("airline", {})
+            airline = airline.get("name", "Aerolínea") if isinstance(airline, dict) else str(airline)
+            miles = flight.get("price", {}).get("miles", "N/A")
+            taxes = flight.get("price", {}).get("taxes", {}).get("amount")
+            miles_text = f"{miles:,}" if isinstance(miles, int) else str(miles)
+            fecha = f"{departure.get('date', '')} {departure.get('time', '')}".strip()
+
+            message = (
+                f"✈️ <b>{origen} → {destino}</b> ({query.clase})\n"
+                f"🗓 {html.escape(fecha)}\n"
+                f"✈️ {html.escape(airline)}\n"
+                f"💰 <b>{miles_text} millas</b>" + (f" + ARS {taxes} tasas" if taxes else "")
+            )
+            results.append(_article(
+                f"{origen}{destino}{i}", f"{origen} → {destino} · {miles_text} millas",
+                f"{fecha} · {airline}", message
+            ))
+        return results
+
+    def shutdown(self):
+        with self._lock:
+            for timer in self._timers.values():
+                timer.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+def _miles(flight):
+    try:
+        return int(flight.get("price", {}).get("miles", 999999))
+    except (TypeError, ValueError):
+        return 999999
+
+def _article(result_id, title, description, message_text):
+    return {
+        "type": "article",
+        "id": result_id[:64],
+        "title": title,
+        "description": description,
+        "input_message_content": {"message_text": message_text, "parse_mode": "HTML"},
+    }
+
+_inline_search = None
+_inline_search_lock = threading.Lock()
+
+def get_inline_search():
+    """Get the process-wide inline search handler"""
+    global _inline_search
+    if _inline_search is None:
+        with _inline_search_lock:
+            if _inline_search is None:
+                _inline_search = InlineSearch()
+    return _inline_search
+
+def shutdown_inline_search():
+    if _inline_search is not None:
+        _inline_search.shutdown()
@@ -0,0 +1,113 @@
+"""Process lifecycle: SIGTERM handling, draining and shutdown hooks
+
+On the first SIGTERM/SIGINT the bot stops fetching new updates, lets the
+update in progress finish and runs the registered shutdown hooks (flush
+caches and tokens, confirm the update offset). Updates that were fetched
+but not handled are never acked, so Telegram redelivers them to the next
+instance. If draining takes longer than SHUTDOWN_GRACE seconds the process
+exits anyway; a second signal exits immediately.
+"""
+import os
+import signal
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+SHUTDOWN_GRACE = float(os.getenv("SHUTDOWN_GRACE", "25"))
+
+class ShutdownRequested(Exception):
+    """Raised from the signal handler when nothing is in flight, to break out of a long poll"""
+
+class Lifecycle:
+    def __init__(self, grace=SHUTDOWN_GRACE):
+        self.grace = grace
+        self.stopping = threading.Event()
+        self._hooks = []
+        self._in_flight = 0
+        self._idle = threading.Condition()
+        self._hooks_ran = False
+
+    def install_signal_handlers(self):
+        """Handle SIGTERM and SIGINT; only possible from the main thread"""
+        if threading.current_thread() is not threading.main_thread():
+            return False
+
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, self._on_signal)
+        return True
+
+    def _on_signal(self, signum, frame):
+        if self.stopping.is_set():
+            logger.warning("Second shutdown signal, exiting now")
+            os._exit(1)
+
+        logger.info(f"Received signal {signum}, draining in-flight work...")
+        self.request_stop()
+
+        # Idle: interrupt the blocking getUpdates call instead of waiting out the long poll
+        if self._in_flight == 0:
+            raise ShutdownRequested()
+
+    def request_stop(self):
+        """Stop accepting work and arm the grace-period watchdog"""
+        if self.stopping.is_set():
+            return
+        self.stopping.set()
+
+        watchdog = threading.Timer(self.grace, self._force_exit)
+        watchdog.daemon = True
+        watchdog.start()
+
+    def _force_exit(self):
+        logger.error(f"Shutdown took longer than {self.grace:.0f}s, exiting with work still in flight")
+        self.run_shutdown_hooks()
+        os._exit(1)
+
+    @contextmanager
+    def track(self):
+        """Count a unit of in-flight work (an update, a queued send)"""
+        with self._idle:
+            self._in_flight += 1
+        try:
+            yield
+        finally:
+            with self._idle:
+                self._in_flight -= 1
+                if self._in_flight == 0:
+                    self._idle.notify_all()
+
+    def in_flight(self):
+        return self._in_flight
+
+    def drain(self, timeout=None):
+        """Wait until no tracked work is running; True if it drained in time"""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._in_flight == 0, timeout=timeout if timeout is not None else self.grace)
+
+    def on_shutdown(self, hook):
+        """Register a callable to run once at shutdown, in registration order"""
+        self._hooks.append(hook)
+        return hook
+
+    def run_shutdown_hooks(self):
+        if self._hooks_ran:
+            return
+        self._hooks_ran = True
+
+        for hook in self._hooks:
+            try:
+                hook()
+            except Exception as e:
+                logger.error(f"Shutdown hook {getattr(hook, '__name__', hook)} failed: {e}")
+
+    def shutdown(self):
+        """Drain in-flight work, then run the shutdown hooks"""
+        self.request_stop()
+        if not self.drain():
+            logger.warning(f"{self._in_flight} tasks still running after {self.grace:.0f}s")
+        self.run_shutdown_hooks()
+        logger.info("Shutdown complete")
+
+lifecycle = Lifecycle()
@@ -0,0 +1,233 @@
+import os
+import time
+import bisect
+import threading
+import logging
+from functools import wraps
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    body = ",".join(f'{name}="{str(value)}"' for name, value in pairs)
+    return "{" + body + "}"
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    @contextmanager
+    def track(self, **labels):
+        """Increment while the block runs"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket counts (not cumulative) plus the +Inf slot, sum and count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = [(key, (list(s[0]), s[1], s[2])) for key, s in self._values.items()]
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', le))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = MetricsRegistry()
+
+SEARCH_LATENCY = REGISTRY.register(Histogram(
+    "smiles_search_latency_seconds", "Flight search latency per provider", ["provider"]))
+STAGE_LATENCY = REGISTRY.register(Histogram(
+    "smiles_stage_latency_seconds", "Latency per pipeline stage (auth, http, parse, format, send)", ["stage"]))
+CACHE_HITS = REGISTRY.register(Counter(
+    "smiles_cache_hits_total", "Search cache hits", ["cache"]))
+CACHE_MISSES = REGISTRY.register(Counter(
+    "smiles_cache_misses_total", "Search cache misses", ["cache"]))
+DISK_CACHE_HITS = REGISTRY.register(Counter(
+    "smiles_disk_cache_hits_total", "Search cache memory misses answered from the on-disk tier", ["cache"]))
+NEGATIVE_CACHE_HITS = REGISTRY.register(Counter(
+    "smiles_negative_cache_hits_total", "Searches answered from a cached empty result or failure", ["cache", "kind"]))
+UPSTREAM_DEGRADED = REGISTRY.register(Gauge(
+    "smiles_upstream_degraded", "1 while an upstream is failing fast after repeated failures", ["upstream"]))
+COALESCED_REQUESTS = REGISTRY.register(Counter(
+    "smiles_coalesced_requests_total", "Searches that waited on an identical in-flight search", ["cache"]))
+TOKEN_REFRESHES = REGISTRY.register(Counter(
+    "smiles_token_refreshes_total", "Token refreshes triggered by a 401 from Smiles"))
+INLINE_QUERIES = REGISTRY.register(Counter(
+    "bot_inline_queries_total", "Inline queries answered, by outcome", ["result"]))
+INLINE_REFRESHES = REGISTRY.register(Counter(
+    "bot_inline_refreshes_total", "Background searches started for inline cache misses"))
+PREWARM_REFRESHES = REGISTRY.register(Counter(
+    "smiles_prewarm_refreshes_total", "Background refreshes of popular searches, by outcome", ["result"]))
+FALLBACKS = REGISTRY.register(Counter(
+    "smiles_fallbacks_total", "Searches answered with the fallback link"))
+HTTP_POOL_WAITS = REGISTRY.register(Counter(
+    "http_pool_waits_total", "Requests that waited for a pooled HTTP session", ["pool"]))
+HANDLER_WAITS = REGISTRY.register(Counter(
+    "bot_handler_waits_total", "Times the update loop waited for a free handler slot"))
+HANDLERS_BUSY = REGISTRY.register(Gauge(
+    "bot_handlers_busy", "Updates queued or running in the handler pool"))
+ADMISSIONS = REGISTRY.register(Counter(
+    "bot_search_admissions_total", "Flight searches by admission decision", ["mode"]))
+SEARCHES_ADMITTED = REGISTRY.register(Gauge(
+    "bot_searches_admitted", "Flight searches admitted and still running"))
+IN_FLIGHT_SEARCHES = REGISTRY.register(Gauge(
+    "smiles_in_flight_searches", "Searches currently running"))
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "bot_update_queue_depth", "Telegram updates fetched but not yet handled"))
+STARTUP_SECONDS = REGISTRY.register(Gauge(
+    "bot_startup_seconds", "Seconds from process start until the bot polled for updates"))
+
+def timed(histogram, **labels):
+    """Decorator that observes the call duration in histogram"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started, **labels)
+        return wrapper
+    return decorator
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        body = REGISTRY.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+_server = None
+
+def start_metrics_server(port=None, host="127.0.0.1"):
+    """Serve /metrics on a background thread; METRICS_PORT=0 disables it"""
+    global _server
+    if _server is not None:
+        return _server
+
+    port = int(port if port is not None else os.getenv("METRICS_PORT", "9108"))
+    if not port:
+        return None
+
+    try:
+        _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        logger.warning(f"Metrics endpoint not started on {host}:{port}: {e}")
+        return None
+
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+    logger.info(f"Metrics available at http://{host}:{port}/metrics")
+    return _server
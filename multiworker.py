@@ -0,0 +1,146 @@
+"""Run the bot as one ingestion process plus N worker processes
+
+The ingestion process long-polls Telegram and pushes every update onto a
+durable SQLite queue; workers claim updates from it and run the normal
+bot_core handlers with the chosen front-end's texts. The queue, the search cache, the Smiles
+tokens and the Smiles rate budget all live in the same SQLite file, so every
+worker shares one Smiles session and one request budget.
+
+Metrics are per process: the ingestion process serves /metrics on
+METRICS_PORT (9108) and worker i on METRICS_PORT + 1 + i, so searches done
+by the workers are scraped too. METRICS_PORT=0 turns them all off.
+
+Usage:
+    python multiworker.py --workers 4 --bot main --db bot_state.db
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import importlib
+import multiprocessing
+
+logger = logging.getLogger(__name__)
+
+def ingest(db_path):
+    """Pull updates from Telegram into the work queue"""
+    from telegram_api import TelegramBot
+    from settings import TELEGRAM_BOT_TOKEN
+    from work_queue import WorkQueue
+    from metrics import QUEUE_DEPTH, start_metrics_server
+    import startup
+    from lifecycle import lifecycle
+
+    queue = WorkQueue(db_path)
+    bot = TelegramBot(TELEGRAM_BOT_TOKEN)
+    # Resume after what is already queued
+    bot.offset = queue.last_update_id() + 1
+    start_metrics_server()
+    startup.mark_ready("ingest")
+
+    last_purge = time.monotonic()
+    while not lifecycle.stopping.is_set():
+        updates = bot.get_updates()
+        if updates is None:
+            time.sleep(1)
+            continue
+        for update in updates:
+            # Only advance the offset once the update is stored durably
+            queue.push(update)
+            bot.offset = max(bot.offset, update.get("update_id", 0) + 1)
+
+        QUEUE_DEPTH.set(queue.depth())
+
+        if time.monotonic() - last_purge > 600:
+            queue.purge_done()
+            last_purge = time.monotonic()
+
+def work(worker_id, db_path, bot_module, metrics_port=0):
+    """Claim updates from the queue and handle them with the front-end's texts"""
+    from work_queue import WorkQueue
+    from settings import TELEGRAM_BOT_TOKEN
+    from telegram_api import TelegramBot
+    from bot_core import handle_update
+    from metrics import start_metrics_server
+    from lifecycle import ShutdownRequested, lifecycle
+    from smiles_auth import save_smiles_tokens
+
+    frontend = importlib.import_module(bot_module).FRONTEND
+    bot = TelegramBot(TELEGRAM_BOT_TOKEN)
+    queue = WorkQueue(db_path)
+
+    lifecycle.on_shutdown(save_smiles_tokens)
+    lifecycle.install_signal_handlers()
+    if metrics_port:
+        start_metrics_server(metrics_port)
+
+    import startup
+    startup.warm_up()
+
+    logger.info(f"Worker {worker_id} started ({bot_module})")
+    try:
+        while not lifecycle.stopping.is_set():
+            # Claim inside track() so a signal never lands between claiming and handling
+            with lifecycle.track():
+                update = queue.claim(worker_id)
+                if update is not None:
+                    try:
+                        handle_update(bot, update, frontend, worker=worker_id)
+                        queue.ack(update["update_id"])
+                    except Exception as e:
+                        logger.error(f"Worker {worker_id} failed on update {update['update_id']}: {e}")
+                        queue.release(update["update_id"])
+
+            if update is None:
+                time.sleep(0.05)
+    except (KeyboardInterrupt, ShutdownRequested):
+        pass
+    finally:
+        lifecycle.shutdown()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the flight bot with several worker processes")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--bot", default="main", choices=["main", "simple_working_bot"])
+    parser.add_argument("--db", default=os.getenv("SHARED_STATE_DB", "bot_state.db"))
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+
+    # Must be set before any bot module is imported so caches and budgets go through the store
+    os.environ["SHARED_STATE_DB"] = os.path.abspath(args.db)
+    # The ingestion process takes the base port, each worker the next ones
+    metrics_port = int(os.getenv("METRICS_PORT", "9108"))
+
+    workers = []
+    for i in range(args.workers):
+        process = multiprocessing.Process(
+            target=work, args=(f"worker-{i}", os.environ["SHARED_STATE_DB"], args.bot, metrics_port + 1 + i if metrics_port else 0),
+            name=f"worker-{i}", daemon=True
+        )
+        process.start()
+        workers.append(process)
+
+    print(f"🤖 Bot multi-proceso iniciado con {args.workers} workers ({args.bot})")
+    print("🔄 Presiona Ctrl+C para detener")
+
+    from lifecycle import ShutdownRequested, lifecycle
+    lifecycle.install_signal_handlers()
+
+    try:
+        ingest(os.environ["SHARED_STATE_DB"])
+    except (KeyboardInterrupt, ShutdownRequested):
+        print("\n🛑 Bot detenido")
+    finally:
+        # SIGTERM lets each worker finish its current update; unclaimed ones stay queued
+        for process in workers:
+            process.terminate()
+        deadline = time.monotonic() + lifecycle.grace
+        for process in workers:
+            process.join(timeout=max(0.1, deadline - time.monotonic()))
+            if process.is_alive():
+                process.kill()
+
+if __name__ == "__main__":
+    sys.exit(main())
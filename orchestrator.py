@@ -0,0 +1,271 @@
+import os
+import time
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, TimeoutError as FuturesTimeout
+from providers import default_providers
+from metrics import SEARCH_LATENCY
+from search_cache import ERROR_CACHE_TTL, NEGATIVE_CACHE_TTL, NegativeCache, UpstreamCircuit
+from tracing import bind_context, span
+from admission import cache_only, deadline_passed, search_deadline
+from rate_budget import smiles_budget
+
+logger = logging.getLogger(__name__)
+
+class NoProviderSucceeded(Exception):
+    """Raised when every provider failed or timed out"""
+
+class ProviderStats:
+    """Moving-average latency and success rate for one provider"""
+    def __init__(self, alpha=0.2):
+        self.alpha = alpha
+        self.latency = None
+        self.success_rate = 1.0
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def record(self, elapsed, ok):
+        with self._lock:
+            self.calls += 1
+            if self.latency is None:
+                self.latency = elapsed
+            else:
+                self.latency += self.alpha * (elapsed - self.latency)
+            self.success_rate += self.alpha * ((1.0 if ok else 0.0) - self.success_rate)
+
+    def healthy(self):
+        return self.success_rate >= 0.5
+
+    def expected_latency(self, default):
+        return self.latency if self.latency is not None else default
+
+class SearchOrchestrator:
+    """Runs flight providers in parallel, hedged or as a fallback chain"""
+    def __init__(self, providers=None, max_workers=8, hedge_delay=2.0):
+        self.providers = providers if providers is not None else default_providers()
+        self.hedge_delay = hedge_delay
+        self.stats = {p.name: ProviderStats() for p in self.providers}
+        # Queries no provider answered, or answered empty, recently; and whether all of them keep failing
+        self.negative = NegativeCache("providers")
+        self.circuit = UpstreamCircuit("providers")
+        # Shared pool so abandoned slow providers never block the caller
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="provider")
+
+    def shutdown(self):
+        """Stop the provider pool without waiting for abandoned slow calls"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def ranked_providers(self):
+        """Available providers, healthy and fastest first; unmeasured ones keep their declared order"""
+        available = [p for p in self.providers if p.available()]
+        return sorted(
+            available,
+            key=lambda p: (not self.stats[p.name].healthy(), self.stats[p.name].expected_latency(float("inf")))
+        )
+
+    def _call(self, provider, query):
+        """Run one provider and record its outcome; the only place stats are recorded"""
+        started = time.monotonic()
+        try:
+            with span(f"provider.{provider.name}") as provider_span:
+                records = provider.search(query)
+                if provider_span:
+                    provider_span.set(flights=len(records))
+        except Exception as e:
+            logger.warning(f"Provider {provider.name} failed: {str(e)}")
+            # Cut short by the user's deadline, that says nothing about the provider
+            if not deadline_passed():
+                self.stats[provider.name].record(time.monotonic() - started, False)
+            raise
+        finally:
+            SEARCH_LATENCY.observe(time.monotonic() - started, provider=provider.name)
+        elapsed = time.monotonic() - started
+        # An answer after the provider's timeout was already given up on by the search
+        self.stats[provider.name].record(elapsed, elapsed <= provider.timeout)
+        return records
+
+    def _submit(self, provider, query):
+        future = self._executor.submit(bind_context(self._call), provider, query)
+        return future, min(time.monotonic() + provider.timeout, search_deadline())
+
+    def search(self, query, mode="hedged"):
+        """Search with the given mode: "parallel", "hedged" or "sequential"
+
+        Empty answers and total failures are remembered briefly, and while
+        every provider keeps failing new queries fail fast, so callers get
+        to their fallback without waiting out the provider timeouts.
+        """
+        if self.negative.check(query):
+            return []
+        providers = self.ranked_providers()
+        if not providers:
+            raise NoProviderSucceeded("No flight providers available")
+        if cache_only():
+            return self._search_cached(providers, query)
+        if not self.circuit.allow():
+            raise NoProviderSucceeded("Flight providers are degraded, not searching")
+
+        try:
+            if mode == "parallel":
+                records = self._search_parallel(providers, query)
+            elif mode == "sequential":
+                records = self._search_sequential(providers, query)
+            else:
+                records = self._search_hedged(providers, query)
+        except NoProviderSucceeded as e:
+            # Cut short by the user's deadline, that says nothing about the providers
+            if not deadline_passed():
+                self.circuit.failure()
+                self.negative.remember(query, ERROR_CACHE_TTL, e)
+            raise
+
+        self.circuit.success()
+        if not records:
+            self.negative.remember(query, NEGATIVE_CACHE_TTL)
+        return records
+
+    def _search_cached(self, providers, query):
+        """Ask only the cache-backed providers, in this thread; a cache miss counts as a failure"""
+        records = []
+        succeeded = False
+        for provider in providers:
+            if not provider.cached:
+                continue
+            try:
+                records.extend(provider.search(query))
+                succeeded = True
+            except Exception as e:
+                logger.info(f"Provider {provider.name} has no cached answer: {e}")
+        if not succeeded:
+            raise NoProviderSucceeded("No cached answer while shedding load")
+        return merge_records(records)
+
+    def _search_parallel(self, providers, query):
+        """Call every provider at once and merge what comes back before the timeouts"""
+        pending = {}
+        for provider in providers:
+            future, deadline = self._submit(provider, query)
+            pending[future] = (provider, deadline)
+
+        results = []
+        succeeded = False
+        while pending:
+            now = time.monotonic()
+            # Stats for these are recorded by _call once they finish
+            for future in [f for f, (_, deadline) in pending.items() if deadline <= now]:
+                logger.warning(f"Provider {pending[future][0].name} timed out")
+                del pending[future]
+            if not pending:
+                break
+
+            next_deadline = min(deadline for _, deadline in pending.values())
+            done, _ = wait(list(pending), timeout=max(0, next_deadline - now), return_when=FIRST_COMPLETED)
+            for future in done:
+                del pending[future]
+                if future.exception() is None:
+                    succeeded = True
+                    results.extend(future.result())
+
+        if not succeeded:
+            raise NoProviderSucceeded("All flight providers failed")
+        return merge_records(results)
+
+    def _search_hedged(self, providers, query):
+        """Start the preferred provider, add the next one every hedge_delay; first non-empty answer wins"""
+        pending = {}
+        remaining = list(providers)
+        empty_answer = False
+        next_launch = time.monotonic()
+
+        while remaining or pending:
+            now = time.monotonic()
+            if remaining and pending and now >= next_launch and smiles_budget.waiting:
+                # The running provider is queued on the Smiles rate budget, not slow upstream:
+                # a hedge would only compete with it for the same tokens
+                next_launch = now + self.hedge_delay
+            if remaining and (now >= next_launch or not pending):
+                provider = remaining.pop(0)
+                future, deadline = self._submit(provider, query)
+                pending[future] = (provider, deadline)
+                next_launch = now + self.hedge_delay
+
+            # Stats for these are recorded by _call once they finish
+            for future in [f for f, (_, deadline) in pending.items() if deadline <= now]:
+                logger.warning(f"Provider {pending[future][0].name} timed out")
+                del pending[future]
+            if not pending:
+                continue
+
+            wake_at = min(deadline for _, deadline in pending.values())
+            if remaining:
+                wake_at = min(wake_at, next_launch)
+            done, _ = wait(list(pending), timeout=max(0, wake_at - time.monotonic()), return_when=FIRST_COMPLETED)
+
+            for future in done:
+                del pending[future]
+                if future.exception() is not None:
+                    continue
+                records = future.result()
+                if records:
+                    return merge_records(records)
+                empty_answer = True
+
+        if empty_answer:
+            return []
+        raise NoProviderSucceeded("All flight providers failed")
+
+    def _search_sequential(self, providers, query):
+        """Try providers one after another, like the original fallback chain"""
+        empty_answer = False
+        for provider in providers:
+            future, deadline = self._submit(provider, query)
+            try:
+                # The provider's timeout, cut to the user's deadline like the other modes
+                records = future.result(timeout=max(0, deadline - time.monotonic()))
+            except FuturesTimeout:
+                logger.warning(f"Provider {provider.name} timed out")
+                # Still queued behind other searches: never start it
+                future.cancel()
+                if deadline_passed():
+                    break
+                continue
+            except Exception:
+                continue
+            if records:
+                return merge_records(records)
+            empty_answer = True
+
+        if empty_answer:
+            return []
+        raise NoProviderSucceeded("All flight providers failed")
+
+def merge_records(records):
+    """Drop duplicate flights reported by several providers and sort by miles"""
+    seen = set()
+    merged = []
+    for record in records:
+        key = record.dedupe_key()
+        if key in seen:
+            continue
+        seen.add(key)
+        merged.append(record)
+
+    merged.sort(key=lambda r: r.miles if r.miles is not None else 999999)
+    return merged
+
+_orchestrator = None
+_orchestrator_lock = threading.Lock()
+
+def get_orchestrator():
+    """Get the process-wide search orchestrator"""
+    global _orchestrator
+    if _orchestrator is None:
+        with _orchestrator_lock:
+            if _orchestrator is None:
+                _orchestrator = SearchOrchestrator(hedge_delay=float(os.getenv("SEARCH_HEDGE_DELAY", "2.0")))
+    return _orchestrator
+
+def shutdown_orchestrator():
+    """Shut down the process-wide orchestrator if one was created"""
+    if _orchestrator is not None:
+        _orchestrator.shutdown()
@@ -0,0 +1,122 @@
+"""Executor for CPU-bound parsing of search responses and HTML pages
+
+Payloads of at least PARSE_PROCESS_CUTOFF bytes go to a process pool so big
+pages parse on other cores; smaller ones use a thread pool where the pickling
+round-trip would cost more than the parse. Workers receive the raw bytes and
+send back compact flight dicts only.
+
+The process pool is created lazily, from a handler thread, when the bot
+already runs many threads and holds open SQLite handles. Forking then could
+copy a lock another thread held and deadlock the child, so workers start
+from a fork server (or spawn where there is none) instead.
+"""
+import os
+import json
+import asyncio
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from metrics import STAGE_LATENCY
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+PARSE_PROCESS_WORKERS = int(os.getenv("PARSE_PROCESS_WORKERS", str(os.cpu_count() or 1)))
+PARSE_THREAD_WORKERS = int(os.getenv("PARSE_THREAD_WORKERS", "4"))
+PARSE_PROCESS_CUTOFF = int(os.getenv("PARSE_PROCESS_CUTOFF", str(256 * 1024)))
+PARSE_START_METHOD = os.getenv(
+    "PARSE_START_METHOD", "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+_process_pool = None
+_thread_pool = None
+_pool_lock = threading.Lock()
+
+def _pick(source, *keys):
+    return {k: source[k] for k in keys if source.get(k) is not None}
+
+def compact_smiles_flight(flight):
+    """Keep only the fields the formatters and providers read; missing fields stay missing"""
+    airline = flight.get("airline", {})
+    departure = flight.get("flight", {}).get("departure", {})
+    price = flight.get("price", {})
+
+    compact = {
+        "airline": _pick(airline, "name") if isinstance(airline, dict) else airline,
+        "flight": {"departure": _pick(departure, "date", "time")},
+        "price": _pick(price, "miles"),
+    }
+    if isinstance(price.get("taxes"), dict):
+        compact["price"]["taxes"] = _pick(price["taxes"], "amount")
+    if flight.get("availability"):
+        compact["availability"] = flight["availability"]
+    return compact
+
+def decode_search_bytes(raw):
+    """Decode a Smiles search response body into compact flights"""
+    data = json.loads(raw)
+    return [compact_smiles_flight(f) for f in data.get("flights") or []]
+
+def parse_html_bytes(raw, encoding="utf-8"):
+    """Parse an emission page into flight dicts"""
+    from flight_parsing import parse_flights_from_html
+    return parse_flights_from_html(raw.decode(encoding, errors="replace"))
+
+def _get_pool(use_processes):
+    global _process_pool, _thread_pool
+    with _pool_lock:
+        if use_processes:
+            if _process_pool is None:
+                _process_pool = ProcessPoolExecutor(
+                    max_workers=PARSE_PROCESS_WORKERS, mp_context=multiprocessing.get_context(PARSE_START_METHOD)
+                )
+            return _process_pool
+        if _thread_pool is None:
+            _thread_pool = ThreadPoolExecutor(max_workers=PARSE_THREAD_WORKERS, thread_name_prefix="parse")
+        return _thread_pool
+
+def _reset_process_pool():
+    global _process_pool
+    with _pool_lock:
+        _process_pool = None
+
+def submit(func, raw, *args):
+    """Submit a parse function to the pool matching the payload size"""
+    use_processes = PARSE_PROCESS_WORKERS > 0 and len(raw) >= PARSE_PROCESS_CUTOFF
+    try:
+        return _get_pool(use_processes).submit(func, raw, *args)
+    except BrokenProcessPool:
+        logger.warning("Parse process pool broken, recreating it")
+        _reset_process_pool()
+        return _get_pool(use_processes).submit(func, raw, *args)
+
+def run(func, raw, *args):
+    """Parse through the executor and wait for the result"""
+    with STAGE_LATENCY.time(stage="parse"), span("parse", func=func.__name__, size=len(raw)):
+        try:
+            return submit(func, raw, *args).result()
+        except BrokenProcessPool:
+            _reset_process_pool()
+            return func(raw, *args)
+
+async def run_async(func, raw, *args):
+    """Parse through the executor without blocking the event loop"""
+    return await asyncio.wrap_future(submit(func, raw, *args))
+
+def decode_search_response(raw):
+    return run(decode_search_bytes, raw)
+
+def parse_html(raw, encoding="utf-8"):
+    return run(parse_html_bytes, raw, encoding)
+
+def shutdown():
+    """Stop both pools, letting queued parses finish"""
+    global _process_pool, _thread_pool
+    with _pool_lock:
+        for pool in (_process_pool, _thread_pool):
+            if pool is not None:
+                pool.shutdown(wait=True)
+        _process_pool = None
+        _thread_pool = None
@@ -0,0 +1,232 @@
+"""Demand tracking and cache pre-warming for the most searched routes
+
+Every search that goes through smiles_client.search_flights_cached is
+counted in a Space-Saving sketch (Metwally et al.): DEMAND_CAPACITY counters
+are enough to find the heavy hitters of any stream, a new key taking over the
+smallest counter, so memory stays fixed however many routes users try. The
+keys are the normalized search cache keys, so EZE MAD 2025-06 typed by hand,
+from /again or from a round trip all count as the same search. Counts are
+halved every DEMAND_HALF_LIFE seconds so the ranking follows current traffic,
+and the sketch is saved to DEMAND_FILE on shutdown so a restart does not
+start cold.
+
+The pre-warmer wakes every PREWARM_INTERVAL seconds and, when no user search
+is running, refreshes the top PREWARM_TOP_N keys whose cached result is
+missing or expires within PREWARM_MARGIN seconds. Each refresh takes a token
+from the background rate budget first, so pre-warming never eats into the
+budget user searches wait on. PREWARM=0 turns it off.
+
+The departure date rule is checked by its doctests:
+    python -m doctest prewarm.py
+"""
+import os
+import json
+import time
+import logging
+import threading
+from datetime import date
+from metrics import IN_FLIGHT_SEARCHES, PREWARM_REFRESHES
+
+logger = logging.getLogger(__name__)
+
+PREWARM = os.getenv("PREWARM", "1") != "0"
+PREWARM_INTERVAL = float(os.getenv("PREWARM_INTERVAL", "30"))
+PREWARM_TOP_N = int(os.getenv("PREWARM_TOP_N", "10"))
+PREWARM_MARGIN = float(os.getenv("PREWARM_MARGIN", "120"))
+DEMAND_CAPACITY = int(os.getenv("DEMAND_CAPACITY", "256"))
+DEMAND_HALF_LIFE = float(os.getenv("DEMAND_HALF_LIFE", str(6 * 3600)))
+DEMAND_FILE = os.getenv("DEMAND_FILE", "demand.json")
+
+# Searches seen fewer times than this are not worth an upstream call
+MIN_PREWARM_COUNT = 2
+
+class SpaceSaving:
+    """Approximate top-k counts over a stream in capacity counters"""
+
+    def __init__(self, capacity=DEMAND_CAPACITY):
+        self.capacity = capacity
+        # key -> [count, overestimate inherited from the counter it replaced]
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def add(self, key, weight=1.0):
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is not None:
+                counter[0] += weight
+                return
+            if len(self._counters) < self.capacity:
+                self._counters[key] = [weight, 0.0]
+                return
+            # Replace the smallest counter; its count becomes the newcomer's error bound
+            smallest = min(self._counters, key=lambda k: self._counters[k][0])
+            floor = self._counters.pop(smallest)[0]
+            self._counters[key] = [floor + weight, floor]
+
+    def top(self, n):
+        """The n keys with the highest counts, as (key, count, error)"""
+        with self._lock:
+            items = [(key, count, error) for key, (count, error) in self._counters.items()]
+        items.sort(key=lambda item: item[1], reverse=True)
+        return items[:n]
+
+    def decay(self, factor=0.5):
+        """Scale every count down, forgetting keys that fall under one search"""
+        with self._lock:
+            for key in list(self._counters):
+                counter = self._counters[key]
+                counter[0] *= factor
+                counter[1] *= factor
+                if counter[0] < 1:
+                    del self._counters[key]
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), count, error] for key, (count, error) in self._counters.items()]
+
+    def restore(self, items):
+        with self._lock:
+            for key, count, error in items[:self.capacity]:
+                self._counters[tuple(key)] = [count, error]
+
+class Prewarmer:
+    def __init__(self, tracker, interval=PREWARM_INTERVAL, top_n=PREWARM_TOP_N, margin=PREWARM_MARGIN,
+                 half_life=DEMAND_HALF_LIFE):
+        self.tracker = tracker
+        self.interval = interval
+        self.top_n = top_n
+        self.margin = margin
+        self.half_life = half_life
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="prewarm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        last_decay = time.monotonic()
+        while not self._stop.wait(self.interval):
+            if time.monotonic() - last_decay >= self.half_life:
+                self.tracker.decay()
+                last_decay = time.monotonic()
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.warning(f"Pre-warm round failed: {e}")
+
+    def due(self):
+        """Top keys worth refreshing now: future dates, missing or close to expiring"""
+        from smiles_client import search_cache
+
+        today = date.today()
+        keys = []
+        for key, count, _ in self.tracker.top(self.top_n):
+            if count < MIN_PREWARM_COUNT or departed(key[2], today):
+                continue
+            if search_cache.ttl_left(key) < self.margin:
+                keys.append(key)
+        return keys
+
+    def run_once(self):
+        """Refresh the due keys while it stays quiet and the background budget allows; returns how many"""
+        from rate_budget import background_budget
+        from smiles_client import search_cache, search_flights
+
+        refreshed = 0
+        for key in self.due():
+            if self._stop.is_set() or IN_FLIGHT_SEARCHES.value() > 0:
+                PREWARM_REFRESHES.inc(result="busy")
+                break
+            if not background_budget.try_acquire():
+                PREWARM_REFRESHES.inc(result="budget")
+                break
+
+            origen, destino, fecha_salida, fecha_regreso, clase, adults, flexible = key
+            try:
+                search_cache.refresh(
+                    key, lambda: search_flights(origen, destino, fecha_salida, fecha_regreso, clase, adults=adults, flexible=flexible)
+                )
+                PREWARM_REFRESHES.inc(result="ok")
+                refreshed += 1
+            except Exception as e:
+                PREWARM_REFRESHES.inc(result="error")
+                logger.warning(f"Pre-warm {origen} → {destino} {fecha_salida} failed: {e}")
+        if refreshed:
+            logger.info(f"Pre-warmed {refreshed} popular searches")
+        return refreshed
+
+def departed(fecha, today):
+    """Whether a cache key's departure date is over
+
+    Month searches are stored from their first day, so a "-01" date stays
+    current for the whole month; any other date only until its day ends.
+
+    >>> departed("2025-06-01", date(2025, 6, 20)), departed("2025-06-01", date(2025, 7, 1))
+    (False, True)
+    >>> departed("2025-06-15", date(2025, 6, 15)), departed("2025-06-15", date(2025, 6, 16))
+    (False, True)
+    """
+    if fecha.endswith("-01"):
+        return fecha[:7] < today.isoformat()[:7]
+    return fecha < today.isoformat()
+
+def load_demand(tracker, path=DEMAND_FILE):
+    try:
+        with open(path, encoding="utf-8") as f:
+            tracker.restore(json.load(f))
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable demand file {path}: {e}")
+
+def save_demand(tracker=None, path=DEMAND_FILE):
+    tracker = tracker or _tracker
+    if tracker is None:
+        return
+    try:
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(tracker.snapshot(), f)
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.warning(f"Could not save demand to {path}: {e}")
+
+_tracker = None
+_prewarmer = None
+_lock = threading.Lock()
+
+def get_demand_tracker():
+    """The process-wide demand sketch, restored from DEMAND_FILE on first use"""
+    global _tracker
+    if _tracker is None:
+        with _lock:
+            if _tracker is None:
+                tracker = SpaceSaving()
+                load_demand(tracker)
+                _tracker = tracker
+    return _tracker
+
+def record_demand(key):
+    get_demand_tracker().add(key)
+
+def start_prewarmer():
+    """Start the background pre-warmer once per process, unless PREWARM=0"""
+    global _prewarmer
+    if not PREWARM:
+        return None
+    tracker = get_demand_tracker()
+    with _lock:
+        if _prewarmer is None:
+            _prewarmer = Prewarmer(tracker).start()
+    return _prewarmer
+
+def stop_prewarmer():
+    """Shutdown hook: stop refreshing and keep the demand counts for the next start"""
+    if _prewarmer is not None:
+        _prewarmer.stop()
+    save_demand()
@@ -0,0 +1,147 @@
+"""In-process sampling profiler for the live bot
+
+A background thread samples every thread's stack with sys._current_frames()
+at a fixed interval, so the event loop and the worker pools are covered
+without attaching an external profiler. Output is in collapsed-stack format
+("frame;frame;frame count"), ready for flamegraph.pl or speedscope.
+"""
+import os
+import sys
+import time
+import signal
+import logging
+import threading
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.01"))
+PROFILE_SECONDS = float(os.getenv("PROFILE_SECONDS", "30"))
+MAX_PROFILE_SECONDS = 300
+
+# Chat IDs allowed to run /profile, e.g. ADMIN_CHAT_IDS="12345,67890"
+ADMIN_CHAT_IDS = {int(x) for x in os.getenv("ADMIN_CHAT_IDS", "").split(",") if x.strip()}
+
+_running = threading.Lock()
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class SamplingProfiler:
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+
+    def sample(self):
+        """Record the current stack of every thread except the profiler itself"""
+        own_id = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.append(names.get(thread_id, f"thread-{thread_id}"))
+            self.stacks[";".join(reversed(stack))] += 1
+
+        self.samples += 1
+
+    def run(self, seconds):
+        """Sample for the given number of seconds"""
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            self.sample()
+            time.sleep(self.interval)
+
+    def write_collapsed(self, path):
+        with open(path, "w", encoding="utf-8") as out:
+            for stack, count in self.stacks.most_common():
+                out.write(f"{stack} {count}\n")
+
+    def top_functions(self, limit=10):
+        """Functions by self samples (leaf frame) and inclusive samples"""
+        self_counts = Counter()
+        total_counts = Counter()
+
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")[1:]
+            if not frames:
+                continue
+            self_counts[frames[-1]] += count
+            for frame in set(frames):
+                total_counts[frame] += count
+
+        return [(name, count, total_counts[name]) for name, count in self_counts.most_common(limit)]
+
+def profile_for(seconds, output_dir=PROFILE_DIR, interval=PROFILE_INTERVAL):
+    """Profile the whole process for N seconds; returns (path, profiler) or None if one is running"""
+    if not _running.acquire(blocking=False):
+        return None
+
+    try:
+        seconds = max(1, min(float(seconds), MAX_PROFILE_SECONDS))
+        profiler = SamplingProfiler(interval)
+        logger.info(f"Sampling profiler started for {seconds:.0f}s")
+        profiler.run(seconds)
+
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir, f"profile-{time.strftime('%Y%m%d-%H%M%S')}.collapsed")
+        profiler.write_collapsed(path)
+        logger.info(f"Sampling profiler wrote {profiler.samples} samples to {path}")
+        return path, profiler
+    finally:
+        _running.release()
+
+def format_profile_report(path, profiler, limit=10):
+    """Telegram-ready summary of the top functions"""
+    texto = f"🔬 <b>Perfil de {profiler.samples} muestras</b>\n"
+    texto += f"📁 <code>{path}</code>\n\n"
+
+    threads = max(1, sum(profiler.stacks.values()) // max(1, profiler.samples))
+    texto += f"<b>Top funciones (propio / total, {threads} hilos):</b>\n"
+    for name, self_count, total_count in profiler.top_functions(limit):
+        name = name.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+        texto += f"• <code>{name}</code> {self_count} / {total_count}\n"
+
+    return texto
+
+def start_background_profile(seconds, on_done=None):
+    """Profile on a daemon thread and call on_done(report_text) when finished"""
+    def worker():
+        result = profile_for(seconds)
+        if result is None:
+            report = "⚠️ Ya hay un perfil en curso."
+        else:
+            report = format_profile_report(*result)
+            logger.info(report)
+        if on_done:
+            on_done(report)
+
+    thread = threading.Thread(target=worker, name="sampling-profiler", daemon=True)
+    thread.start()
+    return thread
+
+def install_signal_handler(signum=getattr(signal, "SIGUSR1", None)):
+    """Start a PROFILE_SECONDS profile when the process receives SIGUSR1"""
+    if signum is None or threading.current_thread() is not threading.main_thread():
+        return False
+
+    signal.signal(signum, lambda *_: start_background_profile(PROFILE_SECONDS))
+    return True
+
+def is_admin(chat_id):
+    return chat_id in ADMIN_CHAT_IDS
+
+def parse_profile_seconds(text):
+    """Seconds requested by "/profile [N]" """
+    parts = text.split()
+    if len(parts) > 1 and parts[1].isdigit():
+        return int(parts[1])
+    return PROFILE_SECONDS
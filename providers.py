@@ -0,0 +1,155 @@
+import os
+import logging
+from typing import NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+class SearchQuery(NamedTuple):
+    origen: str
+    destino: str
+    fecha_salida: str
+    fecha_regreso: Optional[str] = None
+    clase: str = "ECO"
+    pasajeros: int = 1
+    flexible: bool = False
+
+class FlightRecord(NamedTuple):
+    """One flight normalized from any provider"""
+    provider: str
+    origen: str
+    destino: str
+    date: str
+    time: str
+    airline: str
+    miles: Optional[int]
+    taxes: Optional[float]
+
+    def dedupe_key(self):
+        return (self.origen, self.destino, self.date, self.time, self.airline, self.miles)
+
+def _to_int(value):
+    try:
+        return int(str(value).replace(",", "").replace(".", ""))
+    except (TypeError, ValueError):
+        return None
+
+def _to_float(value):
+    try:
+        return float(str(value).replace(",", ""))
+    except (TypeError, ValueError):
+        return None
+
+def record_from_smiles(flight, query, provider):
+    """Normalize a flight from the Smiles search API"""
+    departure = flight.get("flight", {}).get("departure", {})
+    price = flight.get("price", {})
+    airline = flight.get("airline", {})
+
+    return FlightRecord(
+        provider=provider,
+        origen=query.origen,
+        destino=query.destino,
+        date=departure.get("date", "N/A"),
+        time=departure.get("time", ""),
+        airline=airline.get("name", "Aerolínea no especificada") if isinstance(airline, dict) else str(airline),
+        miles=_to_int(price.get("miles")),
+        taxes=_to_float(price.get("taxes", {}).get("amount")),
+    )
+
+def record_from_simple(flight, query, provider):
+    """Normalize a flat {date, miles, taxes, airline} flight dict"""
+    time_value = flight.get("time", "")
+
+    return FlightRecord(
+        provider=provider,
+        origen=query.origen,
+        destino=query.destino,
+        date=flight.get("date", "N/A"),
+        time="" if time_value == "N/A" else time_value,
+        airline=str(flight.get("airline", "Smiles")),
+        miles=_to_int(flight.get("miles")),
+        taxes=_to_float(flight.get("taxes")),
+    )
+
+class Provider:
+    """Base class for a flight source the orchestrator can call"""
+    name = "provider"
+    timeout = 30
+    # Answers from the search cache when admission allows cache-only searches
+    cached = False
+
+    def available(self):
+        """Whether the provider is configured and may be called"""
+        return True
+
+    def search(self, query):
+        """Return a list of FlightRecord for the query"""
+        raise NotImplementedError
+
+class SmilesAuthProvider(Provider):
+    """Authenticated Smiles API using the account login tokens"""
+    name = "smiles_auth"
+    timeout = 30
+    cached = True
+
+    def search(self, query):
+        from smiles_client import search_flights_cached
+        flights = search_flights_cached(
+            query.origen, query.destino, query.fecha_salida, query.fecha_regreso, query.clase,
+            adults=query.pasajeros, flexible=query.flexible
+        )
+        return [record_from_smiles(f, query, self.name) for f in flights]
+
+class SmilesEnvProvider(Provider):
+    """Smiles API with SMILES_TOKEN/X_API_KEY from the environment"""
+    name = "smiles_env"
+    timeout = 30
+
+    def available(self):
+        return bool(os.getenv('SMILES_TOKEN') and os.getenv('X_API_KEY'))
+
+    def search(self, query):
+        from smiles_client import search_flights_env
+        flights = search_flights_env(query.origen, query.destino, query.fecha_salida, query.fecha_regreso, query.clase, timeout=self.timeout)
+        return [record_from_smiles(f, query, self.name) for f in flights]
+
+class SmilesMobileProvider(Provider):
+    """Smiles mobile API"""
+    name = "smiles_mobile"
+    timeout = 15
+
+    def search(self, query):
+        from smiles_client import fetch_mobile_flights
+        flights = fetch_mobile_flights(query.origen, query.destino, timeout=self.timeout)
+        return [record_from_simple(f, query, self.name) for f in flights]
+
+class ElpsProvider(Provider):
+    """elps.ar search API"""
+    name = "elps"
+    timeout = 30
+
+    def search(self, query):
+        from smiles_client import search_elps
+        results = search_elps(query.origen, query.destino, query.fecha_salida, query.fecha_regreso, query.clase, timeout=self.timeout)
+        return [record_from_simple(r, query, self.name) for r in results]
+
+class HtmlScrapeProvider(Provider):
+    """Scrapes the smiles.com.ar emission page"""
+    name = "html"
+    timeout = 15
+
+    def search(self, query):
+        from smiles_client import fetch_emission_html
+        from parse_executor import parse_html
+        raw = fetch_emission_html(query.origen, query.destino, query.fecha_salida, query.fecha_regreso, query.clase, timeout=self.timeout)
+        return [record_from_simple(f, query, self.name) for f in parse_html(raw)]
+
+def default_providers():
+    """All built-in providers, most trusted first"""
+    return [
+        SmilesAuthProvider(),
+        SmilesEnvProvider(),
+        SmilesMobileProvider(),
+        ElpsProvider(),
+        HtmlScrapeProvider(),
+    ]
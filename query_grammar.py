@@ -0,0 +1,290 @@
+"""Flight search query grammar shared by both bots
+
+    ORIGEN [→] DESTINO SALIDA [REGRESO] [CLASE] [M7 | M7-14] [2P] [FLEX] [MISMA]
+
+ORIGEN/DESTINO take IATA codes, metro codes (BUE), regions (EUROPA), city
+names (madrid, rio de janeiro) or comma lists (EZE,AEP). Codes and cities are
+checked against the bundled airport index before anything hits the network.
+SALIDA is a date (2025-06-15), a month (2025-06) or a range of up to
+MAX_DATE_RANGE_DAYS days (2025-06-10..2025-06-14). A return date or a stay
+length (M7-14) makes it a round trip. Options may come in any order; every
+option token is matched by one precompiled alternation and dispatched on the
+group name.
+
+parse_query() returns a FlightQuery, a hashable NamedTuple that cache,
+coalescing and history keys can use as is, or raises QueryError with a
+message for the user. parse_options() reads the option slots alone, for
+saved per-chat preferences that parse_query() applies as defaults.
+"""
+import re
+import calendar
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import NamedTuple, Optional
+from airport_groups import ROUTE_SEPARATORS, build_route_pairs, expand_airports, parse_airport_list
+
+# Most words a city name may span ("rio de janeiro")
+MAX_CITY_WORDS = 4
+
+# Longest departure range searched for one query, one sub-search per day
+MAX_DATE_RANGE_DAYS = 7
+
+MAX_PASSENGERS = 9
+
+# Upper stay bound when only a minimum is given ("M5")
+DEFAULT_MAX_STAY = 14
+
+CLASS_ALIASES = {
+    "ECO": "ECO", "ECONOMICA": "ECO", "ECONOMY": "ECO",
+    "EXEC": "EXEC", "EJECUTIVA": "EXEC", "BUSINESS": "EXEC",
+}
+
+# FLEX: flexible dates, MISMA: outbound and return on the same airline
+FLAGS = {"FLEX", "MISMA"}
+
+FORMAT_HELP = """❌ Formato incorrecto.
+
+📝 Usa el formato:
+<code>ORIGEN DESTINO FECHA</code>
+
+📋 Ejemplos:
+• <code>EZE MAD 2025-06</code>
+• <code>EZE MAD 2025-06-15</code>
+• <code>BUE EUROPA 2025-06-10..2025-06-14 EXEC M7-14 2P</code>"""
+
+_DATE = r"\d{4}-\d{2}-\d{2}"
+_MONTH = r"\d{4}-\d{2}"
+
+# Departure slot
+_DEPARTURE_RE = re.compile(
+    rf"(?P<RANGE>(?P<range_from>{_DATE})\.\.(?P<range_to>{_DATE}))"
+    rf"|(?P<DATE>{_DATE})"
+    rf"|(?P<MONTH>{_MONTH})"
+)
+
+# Option slots, tried as one alternation; lastgroup names the handler
+_OPTION_RE = re.compile("|".join([
+    rf"(?P<RETURN>{_DATE}|{_MONTH})",
+    r"(?P<STAY>M(?P<stay_min>\d{1,3})(?:-(?P<stay_max>\d{1,3}))?)",
+    r"(?P<PAX>(?:(?P<pax_n>\d)(?:P|PAX|ADT))|(?:PAX(?P<pax_m>\d)))",
+    rf"(?P<CLASS>{'|'.join(CLASS_ALIASES)})",
+    rf"(?P<FLAG>{'|'.join(FLAGS)})",
+]))
+
+class QueryError(ValueError):
+    """The text is not a valid flight query; str(error) is shown to the user"""
+
+class FlightQuery(NamedTuple):
+    """One normalized flight search request"""
+    origenes: tuple
+    destinos: tuple
+    fecha_salida: str
+    fecha_hasta: Optional[str] = None
+    fecha_regreso: Optional[str] = None
+    clase: str = "ECO"
+    min_dias: Optional[int] = None
+    max_dias: Optional[int] = None
+    pasajeros: int = 1
+    flags: frozenset = frozenset()
+
+    def route_pairs(self):
+        return build_route_pairs(self.origenes, self.destinos)
+
+    def departure_dates(self):
+        """Every departure date searched; a month stays one YYYY-MM entry"""
+        if not self.fecha_hasta:
+            return [self.fecha_salida]
+        start = date.fromisoformat(self.fecha_salida)
+        days = (date.fromisoformat(self.fecha_hasta) - start).days
+        return [(start + timedelta(days=i)).isoformat() for i in range(days + 1)]
+
+    def is_single_search(self):
+        return len(self.origenes) == 1 and len(self.destinos) == 1 and not self.fecha_hasta
+
+    def is_round_trip(self):
+        """A return date or a stay length asks for outbound and return legs paired"""
+        return bool(self.fecha_regreso) or self.min_dias is not None
+
+    def next_month(self):
+        """The same query departing (and returning) one month later"""
+        return self._replace(
+            fecha_salida=_shift_month(self.fecha_salida),
+            fecha_hasta=self.fecha_hasta and _shift_month(self.fecha_hasta),
+            fecha_regreso=self.fecha_regreso and _shift_month(self.fecha_regreso),
+        )
+
+    def to_text(self):
+        """Canonical text form, parses back to the same query"""
+        parts = [",".join(self.origenes), ",".join(self.destinos)]
+        parts.append(f"{self.fecha_salida}..{self.fecha_hasta}" if self.fecha_hasta else self.fecha_salida)
+        if self.fecha_regreso:
+            parts.append(self.fecha_regreso)
+        parts.append(self.clase)
+        if self.min_dias is not None:
+            parts.append(f"M{self.min_dias}-{self.max_dias}")
+        if self.pasajeros != 1:
+            parts.append(f"{self.pasajeros}P")
+        parts.extend(sorted(self.flags))
+        return " ".join(parts)
+
+def _shift_month(value, months=1):
+    """YYYY-MM or YYYY-MM-DD moved by months, the day clamped to the month's length"""
+    year, month = divmod(int(value[:4]) * 12 + int(value[5:7]) - 1 + months, 12)
+    if len(value) == 7:
+        return f"{year:04d}-{month + 1:02d}"
+    day = min(int(value[8:10]), calendar.monthrange(year, month + 1)[1])
+    return f"{year:04d}-{month + 1:02d}-{day:02d}"
+
+def describe_options(options):
+    """User-facing summary of a parse_options() tuple"""
+    values = dict(options)
+    lines = [f"💺 Clase: {values.get('clase', 'ECO')}", f"👥 Pasajeros: {values.get('pasajeros', 1)}"]
+    if values.get("min_dias") is not None:
+        lines.append(f"🏨 Estadía: {values['min_dias']}-{values['max_dias']} días")
+    if values.get("flags"):
+        lines.append(f"⚙️ Opciones: {' '.join(values['flags'])}")
+    return "\n".join(lines)
+
+def _check_date(value):
+    try:
+        return date.fromisoformat(value if len(value) == 10 else value + "-01")
+    except ValueError:
+        raise QueryError(f"❌ Fecha inválida: {value}")
+
+def _unknown_place(text):
+    """QueryError naming the first unknown airport, with suggestions"""
+    from airport_index import get_airport_index
+
+    token = next((t for t in text.split(",") if t.strip() and not expand_airports(t)), text)
+    suggestions = get_airport_index().suggest(token.strip())
+    message = f"❌ Aeropuerto desconocido: {token.strip()}"
+    if suggestions:
+        message += "\n💡 ¿Quisiste decir " + ", ".join(a.label() for a in suggestions) + "?"
+    return QueryError(message)
+
+def _take_place(partes, start):
+    """Airports for the place starting at partes[start], joining multi-word city names"""
+    # Only runs of plain words can form a city name, dates and lists cannot
+    run = 0
+    while start + run < len(partes) and run < MAX_CITY_WORDS and partes[start + run].isalpha():
+        run += 1
+
+    for words in range(run, 1, -1):
+        airports = parse_airport_list("".join(partes[start:start + words]))
+        if airports:
+            return airports, start + words
+
+    if start >= len(partes):
+        raise QueryError(FORMAT_HELP)
+
+    airports = parse_airport_list(partes[start])
+    if not airports:
+        raise _unknown_place(partes[start])
+    return airports, start + 1
+
+def parse_query(text, defaults=()):
+    """Parse a user message into a FlightQuery; raises QueryError
+
+    defaults is a parse_options() tuple of saved preferences, options typed
+    in the message override them.
+    """
+    query, error = _parse_cached(" ".join(text.upper().split()), defaults)
+    if error is not None:
+        raise QueryError(error)
+    return query
+
+@lru_cache(maxsize=2048)
+def _parse_cached(texto, defaults):
+    # Rejections are memoized too, a repeated typo costs one dict lookup. Only
+    # the message is kept: a cached exception would pile up the traceback of
+    # every raise and keep the handlers' frames alive
+    try:
+        return _parse_normalized(texto, defaults), None
+    except QueryError as e:
+        return None, str(e)
+
+def _parse_options(partes, values, flags, allow_return=True):
+    """Apply option tokens to values and flags in place"""
+    stay_seen = 0
+    for parte in partes:
+        option = _OPTION_RE.fullmatch(parte)
+        if not option or (option.lastgroup == "RETURN" and not allow_return):
+            raise QueryError(f"❌ Opción desconocida: {parte}")
+
+        kind = option.lastgroup
+        if kind == "RETURN":
+            _check_date(parte)
+            values["fecha_regreso"] = parte
+        elif kind == "CLASS":
+            values["clase"] = CLASS_ALIASES[parte]
+        elif kind == "STAY":
+            low = int(option.group("stay_min"))
+            if option.group("stay_max"):
+                values["min_dias"], values["max_dias"] = low, int(option.group("stay_max"))
+            elif stay_seen == 0:
+                values["min_dias"] = low
+                values["max_dias"] = max(low, values.get("max_dias") or DEFAULT_MAX_STAY)
+            else:
+                # Second bare M sets the upper bound ("M5 M10")
+                values["max_dias"] = low
+            stay_seen += 1
+        elif kind == "PAX":
+            pasajeros = int(option.group("pax_n") or option.group("pax_m"))
+            if not 1 <= pasajeros <= MAX_PASSENGERS:
+                raise QueryError(f"❌ Se pueden buscar de 1 a {MAX_PASSENGERS} pasajeros")
+            values["pasajeros"] = pasajeros
+        elif kind == "FLAG":
+            flags.add(parte)
+
+    if values.get("min_dias") is not None and values["min_dias"] > values["max_dias"]:
+        raise QueryError("❌ La estadía mínima no puede superar a la máxima")
+
+def parse_options(text):
+    """Parse option tokens alone ("EXEC 2P M7-14 FLEX") into a preferences tuple; raises QueryError"""
+    values, flags = {}, set()
+    _parse_options(text.upper().split(), values, flags, allow_return=False)
+    if flags:
+        values["flags"] = tuple(sorted(flags))
+    return tuple(sorted(values.items()))
+
+def _parse_normalized(texto, defaults=()):
+    partes = [parte for parte in texto.split(" ") if parte and parte not in ROUTE_SEPARATORS]
+    if len(partes) < 3:
+        raise QueryError(FORMAT_HELP)
+
+    origenes, siguiente = _take_place(partes, 0)
+    destinos, siguiente = _take_place(partes, siguiente)
+
+    if siguiente >= len(partes):
+        raise QueryError(FORMAT_HELP)
+    match = _DEPARTURE_RE.fullmatch(partes[siguiente])
+    if not match:
+        raise QueryError(FORMAT_HELP)
+
+    fecha_hasta = None
+    if match.lastgroup == "RANGE":
+        fecha_salida = match.group("range_from")
+        fecha_hasta = match.group("range_to")
+        days = (_check_date(fecha_hasta) - _check_date(fecha_salida)).days
+        if days < 0:
+            raise QueryError("❌ El rango de fechas está invertido")
+        if days >= MAX_DATE_RANGE_DAYS:
+            raise QueryError(f"❌ El rango de fechas puede cubrir hasta {MAX_DATE_RANGE_DAYS} días")
+        if days == 0:
+            fecha_hasta = None
+    else:
+        fecha_salida = partes[siguiente]
+        _check_date(fecha_salida)
+
+    values = dict(defaults)
+    flags = set(values.pop("flags", ()))
+    _parse_options(partes[siguiente + 1:], values, flags)
+
+    query = FlightQuery(
+        tuple(origenes), tuple(destinos), fecha_salida, fecha_hasta, flags=frozenset(flags), **values
+    )
+
+    if query.fecha_regreso and _check_date(query.fecha_regreso) < _check_date(query.fecha_salida):
+        raise QueryError("❌ La fecha de regreso es anterior a la de salida")
+
+    return query
@@ -0,0 +1,111 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+class _Waiters:
+    """Counts callers sleeping in acquire(), so others can tell the budget is the bottleneck"""
+    def __init__(self):
+        self.waiting = 0
+        self._waiting_lock = threading.Lock()
+
+    @contextmanager
+    def _waiter(self):
+        with self._waiting_lock:
+            self.waiting += 1
+        try:
+            yield
+        finally:
+            with self._waiting_lock:
+                self.waiting -= 1
+
+class RateBudget(_Waiters):
+    """Token bucket shared by every caller that hits the Smiles API"""
+    def __init__(self, rate_per_sec=2.0, burst=4):
+        super().__init__()
+        self.rate_per_sec = rate_per_sec
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate_per_sec)
+        self._updated_at = now
+
+    def try_acquire(self):
+        """Take one token without waiting"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def acquire(self, timeout=30):
+        """Wait up to timeout seconds for a token"""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate_per_sec
+
+            if time.monotonic() + wait > deadline:
+                return False
+            with self._waiter():
+                time.sleep(wait)
+
+class SharedRateBudget(_Waiters):
+    """Token bucket kept in the shared state store, one budget for every worker process"""
+    def __init__(self, store, name, rate_per_sec=2.0, burst=4):
+        super().__init__()
+        self.store = store
+        self.name = name
+        self.rate_per_sec = rate_per_sec
+        self.burst = burst
+
+    def try_acquire(self):
+        return self.store.take_rate_token(self.name, self.rate_per_sec, self.burst) == 0
+
+    def acquire(self, timeout=30):
+        deadline = time.monotonic() + timeout
+        while True:
+            wait = self.store.take_rate_token(self.name, self.rate_per_sec, self.burst)
+            if wait == 0:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            with self._waiter():
+                time.sleep(wait)
+
+def _make_smiles_budget():
+    from state_store import get_shared_store
+
+    rate_per_sec = float(os.getenv("SMILES_RATE_PER_SEC", "2"))
+    burst = int(os.getenv("SMILES_RATE_BURST", "4"))
+
+    store = get_shared_store()
+    if store is not None:
+        return SharedRateBudget(store, "smiles", rate_per_sec, burst)
+    return RateBudget(rate_per_sec, burst)
+
+def _make_background_budget():
+    from state_store import get_shared_store
+
+    rate_per_sec = float(os.getenv("SMILES_BACKGROUND_RATE_PER_SEC", "0.2"))
+    burst = int(os.getenv("SMILES_BACKGROUND_RATE_BURST", "2"))
+
+    store = get_shared_store()
+    if store is not None:
+        return SharedRateBudget(store, "smiles-background", rate_per_sec, burst)
+    return RateBudget(rate_per_sec, burst)
+
+# Global budget for Smiles search calls, shared across processes when SHARED_STATE_DB is set
+smiles_budget = _make_smiles_budget()
+
+# Extra gate for work nobody is waiting on (pre-warming); it still goes through smiles_budget too
+background_budget = _make_background_budget()
@@ -0,0 +1,406 @@
+"""Message rendering shared by both bots
+
+Every reply is assembled from fragments that are built once at import time
+(headers, separators, the best-deal badge) and bound str.format templates,
+collected in a list and joined at the end instead of growing a string with
++=. Airline names and other upstream text are HTML-escaped before they reach
+a template. split_message() cuts long replies into parts that fit Telegram's
+4096 character limit, on a line boundary where it can; a tag left open by a
+cut is closed in that part and opened again in the next.
+"""
+import re
+import heapq
+from html import escape
+from urllib.parse import urlencode
+from settings import SMILES_WEB_URL
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+# Flights listed per reply; the summary still covers every result
+MAX_RESULTS = 5
+
+DEFAULT_AIRLINE = "Aerolínea no especificada"
+DEFAULT_DATE = "Fecha no disponible"
+
+# Static fragments
+SEPARATOR = "─" * 40
+BEST_DEAL = "🏆 <b>MEJOR OFERTA</b>\n"
+SUMMARY = "\n📊 <b>Resumen:</b>\n"
+SMILES_FOOTER = "\n✅ <b>Datos obtenidos directamente de Smiles</b>"
+
+# Precompiled templates
+_HEADER = ("✈️ <b>{title}</b>\n📍 {route}{clase}\n{subtitle}" + SEPARATOR + "\n\n").format
+_ENTRY = "{n}. 🗓 <b>{when}</b>\n   ✈️ {airline}\n   💰 <b>{miles} millas{taxes}</b>\n{cost}".format
+_ROUTE_ENTRY = "{n}. 📍 <b>{route}</b>\n   🗓 {when}\n   ✈️ {airline}\n   💰 <b>{miles} millas{taxes}</b>\n{cost}".format
+_COST = "   📈 Costo efectivo {}\n".format
+_TAXES = " + ARS {} tasas".format
+_WHEN = "{} a las {}".format
+_LINK = "<a href='{url}'>{label}</a>".format
+
+_FALLBACK_BODY = (
+    "🔧 <b>Estado del sistema:</b>\n"
+    "• Autenticación con Smiles temporalmente no disponible\n"
+    "• Intentando métodos alternativos...\n\n"
+    "🔗 <b>Enlace directo a Smiles:</b>\n"
+    "{link}\n\n"
+    "💡 <b>Instrucciones:</b>\n"
+    "1. Haz clic en el enlace de arriba\n"
+    "2. Se abrirá Smiles con tu búsqueda cargada\n"
+    "3. Verás los precios reales en millas\n"
+    "4. Reserva directamente en el sitio oficial\n\n"
+    "🔄 El sistema intentará reconectarse automáticamente."
+).format
+
+def miles_text(miles):
+    """Miles with thousands separators, or the raw value escaped"""
+    if isinstance(miles, int):
+        return f"{miles:,}"
+    return escape(str(miles))
+
+def taxes_text(taxes):
+    if not taxes or taxes == "N/A":
+        return ""
+    if isinstance(taxes, float):
+        return _TAXES(f"{taxes:.2f}".rstrip("0").rstrip("."))
+    return _TAXES(escape(str(taxes)))
+
+def cost_text(scorer, cost):
+    """Effective cost line for an entry, empty when ranking by miles"""
+    if scorer is None or cost == float("inf"):
+        return ""
+    return _COST(scorer.label(cost))
+
+def when_text(fecha, hora):
+    fecha = escape(str(fecha))
+    return _WHEN(fecha, escape(str(hora))) if hora else fecha
+
+def flight_fields(flight):
+    """(fecha, hora, aerolínea, millas, tasas) of a Smiles API flight"""
+    departure = flight.get("flight", {}).get("departure", {})
+    airline = flight.get("airline", {})
+    if isinstance(airline, dict):
+        airline = airline.get("name") or DEFAULT_AIRLINE
+    price = flight.get("price", {})
+    taxes = price.get("taxes", {})
+    if isinstance(taxes, dict):
+        taxes = taxes.get("amount")
+    return departure.get("date", DEFAULT_DATE), departure.get("time", ""), airline, price.get("miles", "N/A"), taxes
+
+def _header(title, route, clase=None, subtitle=""):
+    return _HEADER(title=title, route=route, clase=f" ({clase})" if clase else "", subtitle=subtitle)
+
+def _entries(parts, lines):
+    """Append the listed flights, a blank line between them and the badge on the first"""
+    for n, line in enumerate(lines, 1):
+        if n == 1:
+            parts.append(BEST_DEAL)
+        else:
+            parts.append("\n")
+        parts.append(line)
+
+def _best_cost(scorer, cost):
+    if scorer is None or cost == float("inf"):
+        return ""
+    return f"• Menor costo efectivo: {scorer.label(cost)}\n"
+
+def _summary(parts, count, best=None, worst=None, savings=True):
+    parts.append(SUMMARY)
+    parts.append(f"• Vuelos encontrados: {count}\n")
+    if best is not None:
+        parts.append(f"• Mejor precio: {best:,} millas\n")
+        if savings and worst > best:
+            parts.append(f"• Ahorro máximo: {worst - best:,} millas\n")
+
+# Sort value for flights without a readable price, they are listed last
+_UNPRICED = 1 << 62
+
+def _price_miles(flight):
+    miles = flight.get("price", {}).get("miles")
+    if type(miles) is int:
+        return miles
+    try:
+        return int(miles)
+    except (TypeError, ValueError):
+        return _UNPRICED
+
+def render_flights(flights, origen, destino, clase=None, title="Vuelos Smiles Auténticos",
+                   subtitle="", footer=SMILES_FOOTER, savings=True, scorer=None):
+    """Cheapest Smiles API flights (by miles, or by the scorer's cost) with a summary of the whole result"""
+    # One pass reads every price; ranking and summary reuse it instead of a full sort
+    if scorer:
+        miles, keys = scorer.price_table(flights, _UNPRICED)
+    else:
+        miles = keys = [_price_miles(flight) for flight in flights]
+    best = [i for _, i in heapq.nsmallest(MAX_RESULTS, zip(keys, range(len(keys))))]
+
+    lines = []
+    for n, i in enumerate(best, 1):
+        fecha, hora, airline, price, taxes = flight_fields(flights[i])
+        lines.append(_ENTRY(
+            n=n, when=when_text(fecha, hora), airline=escape(str(airline)),
+            miles=miles_text(price), taxes=taxes_text(taxes), cost=cost_text(scorer, keys[i])
+        ))
+
+    parts = [_header(title, f"{origen} → {destino}", clase, subtitle)]
+    _entries(parts, lines)
+    lowest = min(miles, default=_UNPRICED)
+    if lowest < _UNPRICED:
+        highest = max(miles)
+        if highest == _UNPRICED:
+            highest = max(m for m in miles if m < _UNPRICED)
+        _summary(parts, len(flights), lowest, highest, savings=savings)
+    else:
+        _summary(parts, len(flights))
+    if best:
+        parts.append(_best_cost(scorer, keys[best[0]]))
+    parts.append(footer)
+    return "".join(parts)
+
+def render_records(records, origen, destino, clase, scorer=None):
+    """Normalized provider records, already sorted by miles; re-ranked by cost with a scorer"""
+    if scorer:
+        records = scorer.rank_records(records)
+
+    lines = []
+    costs = []
+    for n, record in enumerate(records[:MAX_RESULTS], 1):
+        costs.append(scorer.cost(record.miles, record.taxes) if scorer else None)
+        lines.append(_ENTRY(
+            n=n, when=when_text(record.date, record.time), airline=escape(record.airline),
+            miles=miles_text(record.miles) if record.miles is not None else "N/A",
+            taxes=taxes_text(record.taxes), cost=cost_text(scorer, costs[-1])
+        ))
+
+    parts = [_header("Vuelos Smiles Auténticos", f"{origen} → {destino}", clase)]
+    _entries(parts, lines)
+    known = [r.miles for r in records if r.miles is not None]
+    _summary(parts, len(records), min(known, default=None), max(known, default=None))
+    if costs:
+        parts.append(_best_cost(scorer, costs[0]))
+    parts.append(providers_footer(records))
+    return "".join(parts)
+
+def providers_footer(records):
+    providers = ", ".join(dict.fromkeys(r.provider for r in records))
+    return f"\n✅ <b>Datos obtenidos de: {escape(providers)}</b>"
+
+def render_multi_route(flights, pairs, failed, clase, scorer=None, skipped=0):
+    """Merged results of a multi-route search, ranked by miles or by the scorer's cost"""
+    origenes = ",".join(dict.fromkeys(o for o, _ in pairs))
+    destinos = ",".join(dict.fromkeys(d for _, d in pairs))
+
+    if scorer:
+        flights = scorer.rank_flights(flights)
+
+    lines = []
+    for n, flight in enumerate(flights[:MAX_RESULTS], 1):
+        fecha, hora, airline, miles, taxes = flight_fields(flight)
+        lines.append(_ROUTE_ENTRY(
+            n=n, route=f"{flight['_origen']} → {flight['_destino']}", when=when_text(fecha, hora),
+            airline=escape(str(airline)), miles=miles_text(miles), taxes=taxes_text(taxes),
+            cost=cost_text(scorer, scorer.flight_cost(flight)) if scorer else ""
+        ))
+
+    parts = [_header("Vuelos Smiles Auténticos", f"{origenes} → {destinos}", clase)]
+    _entries(parts, lines)
+    parts.append(SUMMARY)
+    parts.append(f"• Rutas consultadas: {len(pairs)}\n")
+    parts.append(f"• Vuelos encontrados: {len(flights)}\n")
+    if failed:
+        parts.append(f"• Rutas sin respuesta: {', '.join(f'{o}→{d}' for o, d in failed)}\n")
+    _skipped_note(parts, skipped)
+    parts.append(SMILES_FOOTER)
+    return "".join(parts)
+
+_PAGE_INFO = "📄 Página {page} de {pages} · orden: {sort}{airline}\n".format
+
+# Orders a result page can be sorted by, keyed by the code kept in button callback data
+SORT_LABELS = {"m": "millas", "t": "tasas", "c": "costo efectivo"}
+
+def sort_records(records, sort, scorer=None):
+    """Records ordered by miles, taxes or (with a scorer) effective cost, unpriced ones last"""
+    if sort == "c" and scorer:
+        return scorer.rank_records(records)
+    if sort == "t":
+        return sorted(records, key=lambda r: (r.taxes is None, r.taxes or 0.0, r.miles is None, r.miles or 0))
+    return sorted(records, key=lambda r: (r.miles is None, r.miles or 0))
+
+def render_page(records, route, clase, page, sort, airline=None, scorer=None, footer=SMILES_FOOTER, total=None):
+    """One page of a stored result set; records are already sorted and filtered"""
+    pages = max(1, -(-len(records) // MAX_RESULTS))
+    page = min(page, pages - 1)
+    start = page * MAX_RESULTS
+    several_routes = len({(r.origen, r.destino) for r in records}) > 1
+
+    lines = []
+    for n, record in enumerate(records[start:start + MAX_RESULTS], start + 1):
+        cost = scorer.cost(record.miles, record.taxes) if scorer else None
+        fields = dict(
+            n=n, when=when_text(record.date, record.time), airline=escape(record.airline),
+            miles=miles_text(record.miles) if record.miles is not None else "N/A",
+            taxes=taxes_text(record.taxes), cost=cost_text(scorer, cost)
+        )
+        if several_routes:
+            lines.append(_ROUTE_ENTRY(route=f"{record.origen} → {record.destino}", **fields))
+        else:
+            lines.append(_ENTRY(**fields))
+
+    subtitle = _PAGE_INFO(
+        page=page + 1, pages=pages, sort=SORT_LABELS[sort], airline=f" · ✈️ {escape(airline)}" if airline else ""
+    )
+    parts = [_header("Vuelos Smiles Auténticos", route, clase, subtitle)]
+    for line in lines:
+        if len(parts) > 1:
+            parts.append("\n")
+        parts.append(line)
+    parts.append(SUMMARY)
+    if total is not None and total != len(records):
+        parts.append(f"• Vuelos mostrados: {len(records)} de {total}\n")
+    else:
+        parts.append(f"• Vuelos encontrados: {len(records)}\n")
+    parts.append(footer)
+    return "".join(parts)
+
+_TRIP_ENTRY = (
+    "{n}. 💰 <b>{miles} millas{taxes}</b> · {stay}\n"
+    "{route}"
+    "{cost}"
+    "   🛫 {out_when} · {out_airline} · {out_miles} millas\n"
+    "   🛬 {in_when} · {in_airline} · {in_miles} millas\n"
+).format
+
+def _leg(flight):
+    fecha, hora, airline, miles, _ = flight_fields(flight)
+    return when_text(fecha, hora), escape(str(airline)), miles_text(miles)
+
+def render_round_trips(trips, pairs, failed, clase, scorer=None, skipped=0):
+    """Cheapest outbound + return combinations, with both legs of each"""
+    origenes = ",".join(dict.fromkeys(o for o, _ in pairs))
+    destinos = ",".join(dict.fromkeys(d for _, d in pairs))
+
+    lines = []
+    for n, trip in enumerate(trips[:MAX_RESULTS], 1):
+        out_when, out_airline, out_miles = _leg(trip.outbound)
+        in_when, in_airline, in_miles = _leg(trip.inbound)
+        route = f"   📍 {trip.outbound['_origen']} ⇄ {trip.outbound['_destino']}\n" if len(pairs) > 1 else ""
+        lines.append(_TRIP_ENTRY(
+            n=n, miles=miles_text(trip.miles), taxes=taxes_text(trip.taxes),
+            stay="1 día" if trip.stay_days == 1 else f"{trip.stay_days} días", route=route,
+            cost=cost_text(scorer, trip.cost) if trip.cost is not None else "",
+            out_when=out_when, out_airline=out_airline, out_miles=out_miles,
+            in_when=in_when, in_airline=in_airline, in_miles=in_miles
+        ))
+
+    parts = [_header("Vuelos Smiles Auténticos · Ida y vuelta", f"{origenes} ⇄ {destinos}", clase)]
+    _entries(parts, lines)
+    parts.append(SUMMARY)
+    parts.append(f"• Rutas consultadas: {len(pairs)}\n")
+    parts.append(f"• Combinaciones mostradas: {len(lines)}\n")
+    if failed:
+        parts.append(f"• Tramos sin respuesta: {', '.join(f'{o}→{d}' for o, d in failed)}\n")
+    _skipped_note(parts, skipped)
+    parts.append(SMILES_FOOTER)
+    return "".join(parts)
+
+def _skipped_note(parts, skipped):
+    """Say the search was partial when the fan-out cap left routes out"""
+    if skipped:
+        parts.append(f"• Rutas sin buscar por el límite de búsqueda: {skipped} (probá con menos aeropuertos o fechas)\n")
+
+def smiles_search_url(origen, destino, fecha_salida, fecha_regreso=None, clase="ECO", adults=1):
+    """Smiles website search with the query already filled in"""
+    params = {
+        "originAirportCode": origen,
+        "destinationAirportCode": destino,
+        "departureDate": fecha_salida,
+        "adults": str(adults),
+        "children": "0",
+        "infants": "0",
+        "tripType": "1" if fecha_regreso else "2",
+        "cabinType": "all" if clase == "ECO" else "executive"
+    }
+    if fecha_regreso:
+        params["returnDate"] = fecha_regreso
+    return f"{SMILES_WEB_URL}/emission?{urlencode(params)}"
+
+def smiles_link(url, label):
+    return _LINK(url=escape(url), label=label)
+
+def render_fallback(origen, destino, fecha_salida, fecha_regreso=None, clase="ECO"):
+    """Emergency answer with a direct Smiles link when no provider answered"""
+    url = smiles_search_url(origen, destino, fecha_salida, fecha_regreso, clase)
+    return "".join([
+        "⚠️ <b>Modo de emergencia activado</b>\n",
+        f"📍 Búsqueda: {origen} → {destino}\n",
+        f"📅 Fecha: {fecha_salida}\n\n",
+        _FALLBACK_BODY(link=smiles_link(url, "Buscar en Smiles.com.ar")),
+    ])
+
+def _utf16_fit(text, limit):
+    """Longest prefix (in characters) that Telegram counts as at most limit"""
+    end = min(len(text), limit)
+    while True:
+        # Telegram counts UTF-16 code units, emoji outside the BMP take two
+        over = len(text[:end].encode("utf-16-le")) // 2 - limit
+        if over <= 0:
+            return end
+        # Every character dropped frees one or two units
+        end -= (over + 1) // 2
+
+# Room kept in every part for the closing tags of entities cut in two
+_TAG_RESERVE = 64
+# Tags Telegram's HTML mode knows, anything else is left alone
+_TAG_RE = re.compile(
+    r"<(/?)(b|strong|i|em|u|ins|s|strike|del|a|code|pre|span|tg-spoiler|tg-emoji|blockquote)\b[^>]*>",
+    re.IGNORECASE
+)
+
+def _open_tags(html):
+    """(name, opening tag) of the tags still open at the end of html, outermost first"""
+    stack = []
+    for match in _TAG_RE.finditer(html):
+        name = match.group(2).lower()
+        if not match.group(1):
+            stack.append((name, match.group(0)))
+            continue
+        for i in range(len(stack) - 1, -1, -1):
+            if stack[i][0] == name:
+                del stack[i:]
+                break
+    return stack
+
+def split_message(text, limit=TELEGRAM_MESSAGE_LIMIT):
+    """Split text into parts Telegram accepts, on blank lines or line ends
+
+    A tag left open at a cut is closed at the end of the part and opened
+    again at the start of the next, so every part is balanced HTML.
+    """
+    parts = []
+    while len(text) > limit // 2 and len(text.encode("utf-16-le")) // 2 > limit:
+        end = _utf16_fit(text, limit - _TAG_RESERVE)
+        # A blank line in the second half of the window keeps flight entries whole
+        cut = text.rfind("\n\n", 0, end)
+        if cut < end // 2:
+            cut = text.rfind("\n", 0, end)
+        if cut <= 0:
+            # One huge line: cut before a space, never inside a tag or an entity
+            cut = text.rfind(" ", 0, end)
+            if cut <= 0:
+                cut = end
+            tag = text.rfind("<", 0, cut)
+            if tag > text.rfind(">", 0, cut):
+                # Before the tag, or further on when the text starts with it
+                cut = tag or end
+            entity = text.rfind("&", 0, cut)
+            if entity > text.rfind(";", 0, cut):
+                cut = entity or cut
+        part = text[:cut].rstrip("\n")
+        text = text[cut:].lstrip("\n")
+        open_tags = _open_tags(part)
+        if open_tags:
+            part += "".join(f"</{name}>" for name, _ in reversed(open_tags))
+            text = "".join(tag for _, tag in open_tags) + text
+        parts.append(part)
+    if text or not parts:
+        parts.append(text)
+    return parts
@@ -0,0 +1,214 @@
+"""Result cursors: keep a search's whole result set for paging, sorting and filtering
+
+Replies list MAX_RESULTS flights; the full set is stored under a short random
+id for CURSOR_TTL seconds and the reply carries an inline keyboard whose
+callback data names the cursor and the view (page, sort order, airline
+filter), so the bot keeps no per-message state. A button press re-renders
+that view from the stored set and edits the message in place, with no
+upstream call. With SHARED_STATE_DB set the sets are also written to the
+shared cache, so any worker can answer a button pressed on another worker's
+reply.
+"""
+import os
+import time
+import secrets
+import logging
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+from providers import FlightRecord, SearchQuery, record_from_smiles
+from rendering import MAX_RESULTS, SMILES_FOOTER, SORT_LABELS, render_page, sort_records
+from state_store import get_shared_store
+
+logger = logging.getLogger(__name__)
+
+CURSOR_TTL = float(os.getenv("CURSOR_TTL", "1800"))
+MAX_CURSORS = int(os.getenv("MAX_CURSORS", "2000"))
+
+# Airlines offered by the filter picker, cheapest first
+MAX_AIRLINE_BUTTONS = 8
+
+EXPIRED_TEXT = "⌛ Estos resultados expiraron, vuelve a buscar"
+
+class ResultSet(NamedTuple):
+    """Every flight a search returned, as provider records"""
+    records: tuple
+    route: str
+    clase: Optional[str] = None
+    footer: str = SMILES_FOOTER
+
+    def airlines(self):
+        """Distinct airlines, by their cheapest flight; filter buttons index into this"""
+        return tuple(dict.fromkeys(r.airline for r in sort_records(self.records, "m")))
+
+class PagedReply(NamedTuple):
+    """A reply text with its inline keyboard"""
+    text: str
+    reply_markup: Optional[dict] = None
+
+class CursorStore:
+    def __init__(self, ttl=CURSOR_TTL, capacity=MAX_CURSORS, shared=None):
+        self.ttl = ttl
+        self.capacity = capacity
+        self.shared = shared
+        self._sets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, result_set):
+        """Store a result set; returns its cursor id"""
+        cursor_id = secrets.token_urlsafe(6)
+        with self._lock:
+            self._sets[cursor_id] = (time.monotonic() + self.ttl, result_set)
+            while len(self._sets) > self.capacity:
+                self._sets.popitem(last=False)
+
+        if self.shared:
+            try:
+                payload = {
+                    "records": [list(r) for r in result_set.records],
+                    "route": result_set.route, "clase": result_set.clase, "footer": result_set.footer,
+                }
+                self.shared.cache_set(f"cursor:{cursor_id}", payload, self.ttl)
+            except Exception as e:
+                logger.warning(f"Could not share result cursor {cursor_id}: {e}")
+        return cursor_id
+
+    def get(self, cursor_id):
+        """The stored result set, None once it expired"""
+        with self._lock:
+            entry = self._sets.get(cursor_id)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    return entry[1]
+                del self._sets[cursor_id]
+
+        if self.shared:
+            try:
+                found = self.shared.cache_get(f"cursor:{cursor_id}")
+            except Exception as e:
+                logger.warning(f"Could not read shared result cursor {cursor_id}: {e}")
+                return None
+            if found:
+                payload = found[0]
+                return ResultSet(
+                    tuple(FlightRecord(*r) for r in payload["records"]),
+                    payload["route"], payload["clase"], payload["footer"]
+                )
+        return None
+
+def records_from_flights(flights, origen=None, destino=None):
+    """Smiles API flights as records; fan-out flights carry their own _origen/_destino"""
+    queries = {}
+    records = []
+    for flight in flights:
+        route = (flight.get("_origen", origen), flight.get("_destino", destino))
+        query = queries.get(route)
+        if query is None:
+            query = queries[route] = SearchQuery(route[0], route[1], "")
+        records.append(record_from_smiles(flight, query, "smiles"))
+    return records
+
+def default_sort(scorer):
+    return "c" if scorer else "m"
+
+def _button(text, data):
+    return {"text": text, "callback_data": data}
+
+def keyboard(cursor_id, result_set, page, sort, airline, scorer=None, count=None):
+    """Inline keyboard for one view of a result set"""
+    data = f"r:{cursor_id}:{{}}:{{}}:{airline}".format
+    count = len(result_set.records) if count is None else count
+    pages = max(1, -(-count // MAX_RESULTS))
+
+    rows = []
+    nav = []
+    if page > 0:
+        nav.append(_button("◀️ Anterior", data(page - 1, sort)))
+    if page + 1 < pages:
+        nav.append(_button("Siguiente ▶️", data(page + 1, sort)))
+    if nav:
+        rows.append(nav)
+
+    sorts = ["m", "t"] + (["c"] if scorer else [])
+    rows.append([
+        _button(("• " if code == sort else "") + SORT_LABELS[code].capitalize(), data(0, code))
+        for code in sorts
+    ])
+
+    if airline != "":
+        rows.append([_button("✖️ Todas las aerolíneas", f"r:{cursor_id}:0:{sort}:")])
+    elif len(result_set.airlines()) > 1:
+        rows.append([_button("✈️ Filtrar aerolínea", f"r:{cursor_id}:0:{sort}::a")])
+    return {"inline_keyboard": rows}
+
+def airline_picker(cursor_id, result_set, sort):
+    """One button per airline, plus a way back to the unfiltered list"""
+    airlines = result_set.airlines()[:MAX_AIRLINE_BUTTONS]
+    rows = [[_button(name, f"r:{cursor_id}:0:{sort}:{i}")] for i, name in enumerate(airlines)]
+    rows.append([_button("↩️ Volver", f"r:{cursor_id}:0:{sort}:")])
+    return {"inline_keyboard": rows}
+
+def paged_reply(text, records, route, clase=None, footer=SMILES_FOOTER, scorer=None):
+    """Store the whole result set behind the reply's keyboard; plain text when there is nothing to page"""
+    if len(records) < 2:
+        return text
+    result_set = ResultSet(tuple(records), route, clase, footer)
+    cursor_id = get_cursor_store().put(result_set)
+    return PagedReply(text, keyboard(cursor_id, result_set, 0, default_sort(scorer), "", scorer))
+
+def is_result_callback(data):
+    return data.startswith("r:")
+
+def handle_result_callback(chat_id, data):
+    """View requested by a result button: (toast for answerCallbackQuery, PagedReply or None)"""
+    from scoring import scorer_for
+
+    try:
+        _, cursor_id, page, sort, airline, *action = data.split(":")
+        page = int(page)
+    except ValueError:
+        return None, None
+
+    result_set = get_cursor_store().get(cursor_id)
+    if result_set is None:
+        return EXPIRED_TEXT, None
+
+    scorer = scorer_for(chat_id)
+    if sort not in SORT_LABELS or (sort == "c" and not scorer):
+        sort = default_sort(scorer)
+
+    if action == ["a"]:
+        return None, PagedReply(
+            render_page(sort_records(result_set.records, sort, scorer), result_set.route, result_set.clase,
+                        0, sort, scorer=scorer, footer=result_set.footer),
+            airline_picker(cursor_id, result_set, sort)
+        )
+
+    records = sort_records(result_set.records, sort, scorer)
+    airline_name = None
+    if airline != "":
+        airlines = result_set.airlines()
+        if not airline.isdigit() or int(airline) >= len(airlines):
+            return EXPIRED_TEXT, None
+        airline_name = airlines[int(airline)]
+        records = [r for r in records if r.airline == airline_name]
+
+    pages = max(1, -(-len(records) // MAX_RESULTS))
+    page = max(0, min(page, pages - 1))
+    text = render_page(
+        records, result_set.route, result_set.clase, page, sort, airline_name, scorer,
+        result_set.footer, total=len(result_set.records)
+    )
+    return None, PagedReply(text, keyboard(cursor_id, result_set, page, sort, airline, scorer, len(records)))
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_cursor_store():
+    """The process-wide CursorStore, created on first use"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = CursorStore(shared=get_shared_store())
+    return _store
@@ -0,0 +1,155 @@
+"""Round trips: pair outbound and return legs into the cheapest combinations
+
+Both directions are searched as one-way legs, concurrently through
+fanout_search. Return legs are bucketed by route, day and (for same-airline
+trips) airline, each bucket sorted by miles, so an outbound leg only looks at
+the buckets inside its stay window. A heap holds one candidate per (outbound
+leg, bucket) and yields combinations by total miles; popping a candidate
+pushes the next leg of the same bucket. The k cheapest valid trips cost
+O((n + k) log n) heap work instead of walking the n * m cross product.
+"""
+import heapq
+import bisect
+from datetime import date, timedelta
+from typing import NamedTuple, Optional
+from smiles_client import normalize_date
+
+# Return dates searched when only a stay length is given
+MAX_RETURN_DATES = 8
+
+# One-way sub-searches a single round-trip query may run
+MAX_LEG_SEARCHES = 16
+
+class RoundTrip(NamedTuple):
+    outbound: dict
+    inbound: dict
+    miles: int
+    taxes: Optional[float]
+    stay_days: int
+    cost: Optional[float] = None
+
+def _day(flight):
+    """Departure day as an ordinal, None if the date is missing or malformed"""
+    try:
+        return date.fromisoformat(flight.get("flight", {}).get("departure", {}).get("date", "")[:10]).toordinal()
+    except (TypeError, ValueError):
+        return None
+
+def _miles(flight):
+    miles = flight.get("price", {}).get("miles")
+    try:
+        return int(miles)
+    except (TypeError, ValueError):
+        return None
+
+def _taxes(flight):
+    taxes = flight.get("price", {}).get("taxes", {})
+    taxes = taxes.get("amount") if isinstance(taxes, dict) else taxes
+    try:
+        return float(taxes)
+    except (TypeError, ValueError):
+        return None
+
+def _airline(flight):
+    airline = flight.get("airline", {})
+    return airline.get("name") if isinstance(airline, dict) else airline
+
+def cheapest_round_trips(outbound, inbound, k=5, min_dias=None, max_dias=None, same_airline=False, cost=None):
+    """The k cheapest (outbound, inbound) pairs, by total miles or by summed leg cost
+
+    Legs are fanout_search flights tagged with "_origen"/"_destino"; an inbound
+    leg matches when it flies the outbound route backwards, leaves min_dias to
+    max_dias days later (any later day when not given) and, with same_airline,
+    is operated by the same airline. cost maps a leg to a number (a
+    scoring.Scorer's flight_cost); it must be additive across the two legs.
+    """
+    value = cost or _miles
+
+    buckets = {}
+    for leg in inbound:
+        day, amount = _day(leg), value(leg)
+        if day is None or amount is None or amount == float("inf"):
+            continue
+        key = (leg.get("_origen"), leg.get("_destino"), _airline(leg) if same_airline else None, day)
+        bucket = buckets.setdefault(key, [])
+        bucket.append((amount, len(bucket), leg))
+
+    days_by_route = {}
+    for key, legs in buckets.items():
+        legs.sort()
+        days_by_route.setdefault(key[:3], []).append(key[3])
+    for days in days_by_route.values():
+        days.sort()
+
+    # One candidate per (outbound leg, return day): its cheapest return leg
+    heap = []
+    for i, leg in enumerate(outbound):
+        day, amount = _day(leg), value(leg)
+        if day is None or amount is None or amount == float("inf"):
+            continue
+        route = (leg.get("_destino"), leg.get("_origen"), _airline(leg) if same_airline else None)
+        days = days_by_route.get(route)
+        if not days:
+            continue
+        low = day + (min_dias or 0)
+        high = day + max_dias if max_dias is not None else days[-1]
+        for return_day in days[bisect.bisect_left(days, low):bisect.bisect_right(days, high)]:
+            key = route + (return_day,)
+            heap.append((amount + buckets[key][0][0], i, 0, key))
+    heapq.heapify(heap)
+
+    trips = []
+    while heap and len(trips) < k:
+        total, i, position, key = heapq.heappop(heap)
+        bucket = buckets[key]
+        leg = outbound[i]
+        back = bucket[position][2]
+
+        taxes = [t for t in (_taxes(leg), _taxes(back)) if t is not None]
+        miles = total if cost is None else (_miles(leg) or 0) + (_miles(back) or 0)
+        trips.append(RoundTrip(
+            leg, back, miles, sum(taxes) if taxes else None, key[3] - _day(leg), total if cost else None
+        ))
+
+        if position + 1 < len(bucket):
+            heapq.heappush(heap, (total - bucket[position][0] + bucket[position + 1][0], i, position + 1, key))
+
+    return trips
+
+def return_dates(fechas_salida, fecha_regreso=None, min_dias=None, max_dias=None):
+    """Days to search return legs on: the given return date, or every day in the stay window"""
+    if fecha_regreso:
+        return [normalize_date(fecha_regreso)]
+
+    dates = set()
+    for fecha in fechas_salida:
+        start = date.fromisoformat(normalize_date(fecha))
+        for days in range(min_dias or 0, (max_dias if max_dias is not None else min_dias or 0) + 1):
+            dates.add((start + timedelta(days=days)).isoformat())
+    return sorted(dates)[:MAX_RETURN_DATES]
+
+def search_round_trips(pairs, fechas_salida, fecha_regreso=None, min_dias=None, max_dias=None, clase="ECO",
+                       adults=1, flexible=False, k=5, same_airline=False, cost=None):
+    """Search both directions of every pair and pair the legs
+
+    Returns (trips, pairs searched, pairs or reversed pairs that failed).
+    """
+    from fanout_search import search_jobs
+
+    fechas_salida = [normalize_date(f) for f in fechas_salida]
+    fechas_regreso = return_dates(fechas_salida, fecha_regreso, min_dias, max_dias)
+
+    # Keep the outbound plus return sub-searches under the per-query cap
+    per_pair = len(fechas_salida) + len(fechas_regreso)
+    pairs = pairs[:max(1, MAX_LEG_SEARCHES // per_pair)]
+
+    jobs = [(o, d, fecha) for o, d in pairs for fecha in fechas_salida]
+    jobs += [(d, o, fecha) for o, d in pairs for fecha in fechas_regreso]
+    legs, failed = search_jobs(jobs, None, clase, adults=adults, flexible=flexible)
+
+    routes = set(pairs)
+    outbound = [leg for leg in legs if (leg["_origen"], leg["_destino"]) in routes]
+    inbound = [leg for leg in legs if (leg["_destino"], leg["_origen"]) in routes]
+
+    trips = cheapest_round_trips(outbound, inbound, k, min_dias, max_dias, same_airline, cost)
+    return trips, pairs, failed
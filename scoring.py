@@ -0,0 +1,275 @@
+"""Effective cost ranking: miles at the user's point value plus converted taxes
+
+    costo = millas × valor_del_punto + tasas × peso_tasas
+
+both expressed in the user's currency. Taxes come in ARS and go through a
+local FX table read once from FX_FILE (refreshed from FX_URL when older than
+FX_MAX_AGE, if one is configured). Per-user profiles live in the chat state
+store next to the other preferences, and a Scorer folds the profile and the FX
+rates into two factors, so ranking a result set is one pass over plain floats
+followed by a heap or sort.
+"""
+import os
+import json
+import math
+import time
+import logging
+import threading
+from functools import lru_cache
+from typing import NamedTuple
+from chat_state import get_chat_state_store
+
+logger = logging.getLogger(__name__)
+
+FX_FILE = os.getenv("FX_FILE", "fx_rates.json")
+FX_URL = os.getenv("FX_URL", "")
+FX_MAX_AGE = float(os.getenv("FX_MAX_AGE", str(12 * 3600)))
+
+# Units of each currency per USD, used until FX_FILE or FX_URL provide fresher ones
+DEFAULT_FX_RATES = {
+    "USD": 1.0, "ARS": 1000.0, "BRL": 5.5, "EUR": 0.92, "CLP": 950.0, "UYU": 40.0,
+}
+
+# Currency Smiles reports taxes in (the search sends currencyCode=ARS)
+TAXES_CURRENCY = "ARS"
+
+# Sort value for flights without a readable price
+UNPRICED = float("inf")
+
+class FxTable:
+    def __init__(self, rates, updated_at=0.0):
+        self.rates = dict(rates)
+        self.updated_at = updated_at
+
+    @classmethod
+    def load(cls, path=FX_FILE, url=FX_URL, max_age=FX_MAX_AGE):
+        """Cached rates from path, refreshed from url when stale; defaults if neither works"""
+        table = cls(DEFAULT_FX_RATES)
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            table = cls({**DEFAULT_FX_RATES, **data["rates"]}, data.get("updated_at", 0.0))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable FX file {path}: {e}")
+
+        if url and time.time() - table.updated_at > max_age:
+            table.refresh(url, path)
+        return table
+
+    def refresh(self, url, path=FX_FILE):
+        """Fetch USD-based rates ({"rates": {...}}) and cache them to path"""
+        import requests
+
+        try:
+            response = requests.get(url, timeout=5)
+            response.raise_for_status()
+            rates = {code.upper(): float(rate) for code, rate in response.json()["rates"].items()}
+        except Exception as e:
+            logger.warning(f"FX refresh failed, keeping cached rates: {e}")
+            return False
+
+        self.rates.update(rates)
+        self.updated_at = time.time()
+        try:
+            tmp = f"{path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"rates": self.rates, "updated_at": self.updated_at}, f)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Could not cache FX rates to {path}: {e}")
+        return True
+
+    def rate(self, source, target):
+        """Units of target per unit of source"""
+        return self.rates[target] / self.rates[source]
+
+    def convert(self, amount, source, target):
+        return amount * self.rate(source, target)
+
+class ScoringProfile(NamedTuple):
+    """How one user values miles and taxes"""
+    point_value: float = 0.012
+    currency: str = "USD"
+    tax_weight: float = 1.0
+    mode: str = "costo"
+
+    def describe(self):
+        ranking = "costo total" if self.mode == "costo" else "millas"
+        return (
+            f"💱 Valor del punto: {self.point_value:g} {self.currency} por milla\n"
+            f"🧾 Peso de las tasas: {self.tax_weight:g}\n"
+            f"📊 Orden: {ranking}"
+        )
+
+class Scorer:
+    """A profile and FX rates folded into per-mile and per-tax-unit factors"""
+
+    def __init__(self, profile, fx):
+        self.profile = profile
+        self.currency = profile.currency
+        self.mile_factor = profile.point_value
+        self.tax_factor = profile.tax_weight * fx.rate(TAXES_CURRENCY, profile.currency)
+
+    def cost(self, miles, taxes=None):
+        if miles is None:
+            return UNPRICED
+        return miles * self.mile_factor + (taxes or 0.0) * self.tax_factor
+
+    def flight_cost(self, flight):
+        """Cost of a Smiles API flight dict"""
+        price = flight.get("price") or {}
+        miles = price.get("miles")
+        # Decoded responses already hold numbers, only fall back to parsing for strings
+        if type(miles) is not int:
+            try:
+                miles = int(miles)
+            except (TypeError, ValueError):
+                return UNPRICED
+        taxes = price.get("taxes")
+        if type(taxes) is dict:
+            taxes = taxes.get("amount")
+        if type(taxes) is not float and type(taxes) is not int:
+            try:
+                taxes = float(taxes or 0.0)
+            except (TypeError, ValueError):
+                taxes = 0.0
+        return miles * self.mile_factor + taxes * self.tax_factor
+
+    def costs(self, flights):
+        """Costs of a whole result set, one pass"""
+        return self.price_table(flights)[1]
+
+    def price_table(self, flights, unpriced_miles=None):
+        """(miles, costs) of a whole result set in one pass; unreadable miles become unpriced_miles"""
+        mile_factor, tax_factor = self.mile_factor, self.tax_factor
+        miles_list, costs = [], []
+        add_miles, add_cost = miles_list.append, costs.append
+        for flight in flights:
+            price = flight.get("price") or {}
+            miles = price.get("miles")
+            taxes = price.get("taxes")
+            # Inline the common shape (int miles, numeric taxes.amount), flight_cost handles the rest
+            if type(miles) is int and type(taxes) is dict:
+                amount = taxes.get("amount")
+                if type(amount) is float or type(amount) is int:
+                    add_miles(miles)
+                    add_cost(miles * mile_factor + amount * tax_factor)
+                    continue
+            cost = self.flight_cost(flight)
+            add_cost(cost)
+            add_miles(unpriced_miles if cost == UNPRICED else int(price.get("miles")))
+        return miles_list, costs
+
+    def rank_records(self, records):
+        """Provider records sorted by cost"""
+        mile_factor, tax_factor = self.mile_factor, self.tax_factor
+        keyed = [
+            (UNPRICED if r.miles is None else r.miles * mile_factor + (r.taxes or 0.0) * tax_factor, i)
+            for i, r in enumerate(records)
+        ]
+        keyed.sort()
+        return [records[i] for _, i in keyed]
+
+    def rank_flights(self, flights):
+        costs = self.costs(flights)
+        return [flights[i] for i in sorted(range(len(flights)), key=costs.__getitem__)]
+
+    def label(self, cost):
+        return f"≈ {self.currency} {cost:,.0f}"
+
+DEFAULT_PROFILE = ScoringProfile(
+    point_value=float(os.getenv("SCORING_POINT_VALUE", "0.012")),
+    currency=os.getenv("SCORING_CURRENCY", "USD"),
+)
+
+COMMAND_HELP = """📈 <b>Costo efectivo</b>
+Los resultados se ordenan por millas × valor del punto + tasas.
+
+<code>/costo 0.012 USD</code> - valor de cada milla
+<code>/costo tasas 0.5</code> - peso de las tasas
+<code>/costo millas</code> - ordenar solo por millas
+<code>/costo total</code> - ordenar por costo total
+<code>/costo reset</code> - volver a los valores por defecto"""
+
+def parse_profile_command(profile, args, fx):
+    """Apply "/costo ..." arguments to a profile; raises ValueError with a message for the user"""
+    if not args:
+        return profile
+    first = args[0].lower()
+
+    if first == "reset":
+        return DEFAULT_PROFILE
+    if first == "millas":
+        return profile._replace(mode="millas")
+    if first == "total":
+        return profile._replace(mode="costo")
+    if first == "tasas":
+        try:
+            weight = float(args[1].replace(",", "."))
+        except (IndexError, ValueError):
+            raise ValueError("❌ Usa: <code>/costo tasas 0.5</code>")
+        if not math.isfinite(weight) or not 0 <= weight <= 10:
+            raise ValueError("❌ El peso de las tasas va de 0 a 10")
+        return profile._replace(tax_weight=weight)
+
+    try:
+        value = float(first.replace(",", "."))
+    except ValueError:
+        raise ValueError(COMMAND_HELP)
+    currency = args[1].upper() if len(args) > 1 else profile.currency
+    if currency not in fx.rates:
+        raise ValueError(f"❌ Moneda desconocida: {currency}. Disponibles: {', '.join(sorted(fx.rates))}")
+    # float() also accepts "nan" and "inf", which would break every cost sort
+    if not math.isfinite(value) or value <= 0:
+        raise ValueError("❌ El valor del punto tiene que ser un número positivo")
+    return profile._replace(point_value=value, currency=currency, mode="costo")
+
+_fx = None
+_state_lock = threading.Lock()
+
+def get_fx_table():
+    """The process-wide FX table, loaded on first use"""
+    global _fx
+    if _fx is None:
+        with _state_lock:
+            if _fx is None:
+                _fx = FxTable.load()
+    return _fx
+
+def get_profile(user_id):
+    """The user's saved scoring profile, DEFAULT_PROFILE when they never changed it"""
+    if user_id is None:
+        return DEFAULT_PROFILE
+    fields = get_chat_state_store().get(user_id).scoring
+    return ScoringProfile(**fields) if fields else DEFAULT_PROFILE
+
+def set_profile(user_id, profile):
+    get_chat_state_store().update(user_id, scoring=None if profile == DEFAULT_PROFILE else profile._asdict())
+
+@lru_cache(maxsize=256)
+def _scorer(profile, fx_version):
+    return Scorer(profile, get_fx_table())
+
+def scorer_for(user_id):
+    """The user's Scorer, or None when they rank by miles only"""
+    profile = get_profile(user_id)
+    if profile.mode != "costo":
+        return None
+    return _scorer(profile, get_fx_table().updated_at)
+
+def handle_cost_command(user_id, text):
+    """Reply to "/costo ..." for a user, saving the new profile"""
+    profile = get_profile(user_id)
+    args = text.split()[1:]
+
+    try:
+        updated = parse_profile_command(profile, args, get_fx_table())
+    except ValueError as e:
+        return str(e)
+
+    if not args:
+        return f"{COMMAND_HELP}\n\n<b>Tu configuración:</b>\n{profile.describe()}"
+    set_profile(user_id, updated)
+    return f"✅ Configuración guardada\n{updated.describe()}"
@@ -0,0 +1,355 @@
+"""Search result caching: single-flight computation, negative results and upstream health
+
+Positive results live for the cache TTL. Searches that came back empty are
+kept apart, next to the failures in the NegativeCache and only for
+NEGATIVE_CACHE_TTL seconds, so a route that just got seats shows them soon
+and a burst of empty searches never evicts real results. Failures are
+remembered for as long as the caller's error_ttl classifier says (a route
+Smiles rejects for an hour, a timeout or a 5xx for ERROR_CACHE_TTL seconds),
+so a repeated query fails in microseconds instead of paying the upstream
+timeout again. Errors stay in the process; empty results also go to the
+shared store, with their short TTL.
+
+With a DiskCache attached, every positive result is also written to the
+compressed on-disk tier, and a memory miss reads it from there before
+counting as a miss, so results outlive the process.
+
+Concurrent callers of one key share a single computation. A caller waits
+only for what is left of its own search deadline, and when the owner's
+computation failed for reasons of its own (its caller_error classifier says
+so, e.g. a cache-only or expired search) the waiters compute it themselves.
+
+UpstreamCircuit marks an upstream degraded after DEGRADED_AFTER failures in a
+row: new searches fail fast for DEGRADED_COOLDOWN seconds, then one probe is
+let through and its outcome decides whether the upstream is back.
+"""
+import os
+import json
+import threading
+import time
+import logging
+from collections import OrderedDict
+from admission import time_left
+from metrics import CACHE_HITS, CACHE_MISSES, COALESCED_REQUESTS, DISK_CACHE_HITS, NEGATIVE_CACHE_HITS, UPSTREAM_DEGRADED
+
+logger = logging.getLogger(__name__)
+
+NEGATIVE_CACHE_TTL = float(os.getenv("NEGATIVE_CACHE_TTL", "60"))
+ERROR_CACHE_TTL = float(os.getenv("ERROR_CACHE_TTL", "30"))
+BAD_ROUTE_TTL = float(os.getenv("BAD_ROUTE_TTL", "3600"))
+DEGRADED_AFTER = int(os.getenv("DEGRADED_AFTER", "5"))
+DEGRADED_COOLDOWN = float(os.getenv("DEGRADED_COOLDOWN", "30"))
+
+class _InFlight:
+    """A computation another caller is already running for the same key"""
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+class NegativeCache:
+    """Short-lived memory of searches that came back empty or failed"""
+    def __init__(self, name, max_entries=2000):
+        self.name = name
+        self.max_entries = max_entries
+        # key -> (expires_at, error or None for an empty result)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def remember(self, key, ttl, error=None):
+        if not ttl:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, error)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def forget(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def empty_ttl(self, key):
+        """Seconds left for a remembered empty result, 0 when there is none; never raises"""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or entry[1] is not None:
+            return 0.0
+        return max(0.0, entry[0] - time.monotonic())
+
+    def check(self, key):
+        """Raise the remembered error, True for a remembered empty result, False when nothing is known"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False
+            if time.monotonic() >= entry[0]:
+                del self._entries[key]
+                return False
+
+        error = entry[1]
+        if error is None:
+            NEGATIVE_CACHE_HITS.inc(cache=self.name, kind="empty")
+            return True
+        NEGATIVE_CACHE_HITS.inc(cache=self.name, kind="error")
+        raise error.with_traceback(None)
+
+class UpstreamCircuit:
+    """Fails fast while an upstream keeps failing, letting one probe through per cooldown"""
+    def __init__(self, name, threshold=DEGRADED_AFTER, cooldown=DEGRADED_COOLDOWN):
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def degraded(self):
+        return self.failures >= self.threshold
+
+    def allow(self):
+        """Whether a call may go upstream now"""
+        with self._lock:
+            if self.failures < self.threshold:
+                return True
+            now = time.monotonic()
+            if now < self._retry_at:
+                return False
+            # Half-open: this caller probes, the others keep failing fast until it reports back
+            self._retry_at = now + self.cooldown
+            return True
+
+    def success(self):
+        with self._lock:
+            recovered = self.failures >= self.threshold
+            self.failures = 0
+        if recovered:
+            UPSTREAM_DEGRADED.set(0, upstream=self.name)
+            logger.info(f"Upstream {self.name} recovered")
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            tripped = self.failures == self.threshold
+            if self.failures >= self.threshold:
+                self._retry_at = time.monotonic() + self.cooldown
+        if tripped:
+            UPSTREAM_DEGRADED.set(1, upstream=self.name)
+            logger.warning(f"Upstream {self.name} degraded after {self.threshold} failures, failing fast for {self.cooldown:g}s")
+
+class SearchCache:
+    def __init__(self, ttl=600, max_entries=2000, name="search", shared=None, negative_ttl=NEGATIVE_CACHE_TTL, error_ttl=None,
+                 disk=None, caller_error=None):
+        self.name = name
+        # Optional StateStore shared with other worker processes
+        self.shared = shared
+        # Optional disk_cache.DiskCache kept under the in-memory entries
+        self.disk = disk
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        # Optional error_ttl(exception) -> seconds to remember the failure, or None to not cache it
+        self.error_ttl = error_ttl
+        # Optional caller_error(exception) -> True when the failure belongs to the caller
+        # that computed, not to the key, so coalesced waiters must not share it
+        self.caller_error = caller_error
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.errors = NegativeCache(name, max_entries)
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get(self, key):
+        """Return a cached value or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if time.monotonic() < expires_at:
+                    self._entries.move_to_end(key)
+                    return value
+                del self._entries[key]
+
+        if self.disk is None:
+            return None
+        found = self.disk.get(self._disk_key(key))
+        if found is None:
+            return None
+        value, ttl_left = found
+        DISK_CACHE_HITS.inc(cache=self.name)
+        self._remember(key, value, ttl_left)
+        return value
+
+    def _disk_key(self, key):
+        return json.dumps([self.name, *key])
+
+    def warm_from_disk(self, limit):
+        """Load the most recently used disk entries into memory; returns how many"""
+        if self.disk is None:
+            return 0
+        loaded = 0
+        for disk_key, value, ttl_left in reversed(self.disk.recent(limit)):
+            name, *key = json.loads(disk_key)
+            if name == self.name:
+                self._remember(tuple(key), value, ttl_left)
+                loaded += 1
+        return loaded
+
+    def peek(self, key):
+        """Cached value from this process or the shared store, never computing it"""
+        if self.errors.empty_ttl(key):
+            return []
+        value = self.get(key)
+        if value is None and self.shared is not None:
+            found = self.shared.cache_get(json.dumps([self.name, *key]))
+            if found is not None:
+                # Kept here only for as long as the shared entry lives
+                value, ttl_left = found
+                self._store(key, value, ttl_left)
+        return value
+
+    def _ttl_for(self, value):
+        """Empty results are kept for the negative TTL only"""
+        return self.ttl if value else min(self.ttl, self.negative_ttl)
+
+    def _store(self, key, value, ttl):
+        """Keep a search result: flights in the cache, an empty result with the negative entries"""
+        if value:
+            self.set(key, value, ttl)
+            self.errors.forget(key)
+            return
+        self.errors.remember(key, min(ttl, self.negative_ttl))
+        # A newer empty answer replaces whatever this process still held
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def _remember_error(self, key, error):
+        ttl = self.error_ttl(error) if self.error_ttl else None
+        if ttl:
+            self.errors.remember(key, ttl, error)
+
+    def set(self, key, value, ttl=None):
+        """Store a value, in memory and on disk"""
+        ttl = ttl if ttl is not None else self.ttl
+        self._remember(key, value, ttl)
+        if self.disk is not None:
+            self.disk.set(self._disk_key(key), value, ttl)
+
+    def _remember(self, key, value, ttl):
+        """Keep a value in memory, evicting the least recently used entry when full"""
+        expires_at = time.monotonic() + ttl
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def ttl_left(self, key):
+        """Seconds until the entry expires here or in the shared store, 0 when there is none"""
+        with self._lock:
+            entry = self._entries.get(key)
+        ttl = max(0.0, entry[0] - time.monotonic()) if entry else self.errors.empty_ttl(key)
+        # Another worker may have refreshed it already
+        if self.shared is not None:
+            ttl = max(ttl, self.shared.cache_ttl(json.dumps([self.name, *key])))
+        return ttl
+
+    def refresh(self, key, compute):
+        """Recompute a key ahead of its expiry; callers arriving meanwhile wait on it instead of searching
+
+        Skipped (returns None) when the key is already being computed.
+        """
+        with self._lock:
+            if key in self._in_flight:
+                return None
+            in_flight = _InFlight()
+            self._in_flight[key] = in_flight
+
+        try:
+            value = compute()
+            ttl = self._ttl_for(value)
+            if self.shared is not None:
+                self.shared.cache_set(json.dumps([self.name, *key]), value, ttl)
+            in_flight.value = value
+            self._store(key, value, ttl)
+            return value
+        except Exception as e:
+            in_flight.error = e
+            self._remember_error(key, e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            in_flight.event.set()
+
+    def _count_hit(self, value):
+        self.hits += 1
+        if value:
+            CACHE_HITS.inc(cache=self.name)
+        else:
+            NEGATIVE_CACHE_HITS.inc(cache=self.name, kind="empty")
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value or run compute() once for all concurrent callers"""
+        # A remembered failure is raised, a remembered empty result answered; they win over
+        # an older result still on disk
+        if self.errors.check(key):
+            self.hits += 1
+            return []
+        value = self.get(key)
+        if value is not None:
+            self._count_hit(value)
+            return value
+
+        while True:
+            with self._lock:
+                in_flight = self._in_flight.get(key)
+                owner = in_flight is None
+                if owner:
+                    in_flight = _InFlight()
+                    self._in_flight[key] = in_flight
+            if owner:
+                break
+
+            # Someone else is already searching this key, wait for their answer
+            self.coalesced += 1
+            COALESCED_REQUESTS.inc(cache=self.name)
+            if not in_flight.event.wait(max(time_left(threading.TIMEOUT_MAX), 0)):
+                raise TimeoutError(f"Search deadline passed waiting for a coalesced {self.name} search")
+            error = in_flight.error
+            if error is None:
+                return in_flight.value
+            if not (self.caller_error and self.caller_error(error)):
+                raise error.with_traceback(None)
+            # The owner's own admission or deadline failed it, try again under ours
+
+        try:
+            shared_key = json.dumps([self.name, *key]) if self.shared is not None else None
+            found = self.shared.cache_get(shared_key) if shared_key else None
+
+            if found is not None:
+                # Another worker process already searched this key; keep its expiry
+                value, ttl = found
+                self._count_hit(value)
+            else:
+                self.misses += 1
+                CACHE_MISSES.inc(cache=self.name)
+                value = compute()
+                ttl = self._ttl_for(value)
+                if shared_key:
+                    self.shared.cache_set(shared_key, value, ttl)
+
+            in_flight.value = value
+            self._store(key, value, ttl)
+            return value
+        except Exception as e:
+            in_flight.error = e
+            self._remember_error(key, e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            in_flight.event.set()
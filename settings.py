@@ -0,0 +1,13 @@
+import os
+
+# Telegram
+TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "8002861881:AAFmpkx1rKUbnvgytZ2u3BRtFcmQ83oNMfk")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+
+# Smiles web site and APIs, overridable to point the bot at a local stub
+SMILES_WEB_URL = os.getenv("SMILES_WEB_URL", "https://www.smiles.com.ar")
+SMILES_API_URL = os.getenv("SMILES_API_URL", "https://api.smiles.com.ar")
+SMILES_AUTH_URL = os.getenv("SMILES_AUTH_URL", "https://auth.smiles.com.ar")
+SMILES_SEARCH_URL = os.getenv("SMILES_SEARCH_URL", "https://api-air-flightsearch-blue.smiles.com.ar/v1/airlines/search")
+SMILES_MOBILE_URL = os.getenv("SMILES_MOBILE_URL", "https://mobile-api.smiles.com.ar/v1/flights/search")
+ELPS_SEARCH_URL = os.getenv("ELPS_SEARCH_URL", "https://elps.ar/api/search")
@@ -4,14 +4,24 @@ import time
 import re
 from datetime import datetime, timedelta
 import logging
+import os
+import threading
+from metrics import STAGE_LATENCY, timed
+from tracing import span, traced
+from state_store import get_shared_store
+from settings import SMILES_WEB_URL, SMILES_API_URL, SMILES_AUTH_URL
 
 logger = logging.getLogger(__name__)
 
+# Valid tokens are saved here at shutdown so a restart can skip the login walk
+TOKEN_FILE = os.getenv("SMILES_TOKEN_FILE", "smiles_tokens.json")
+
 class SmilesAuth:
     def __init__(self, dni="44969466", password="1547"):
         self.dni = dni
         self.password = password
         self.session = requests.Session()
+        self._login_lock = threading.RLock()
         self.access_token = None
         self.x_api_key = None
         self.token_expires_at = None
@@ -30,14 +40,40 @@ class SmilesAuth:
     
     def get_valid_tokens(self):
         """Get valid tokens, refreshing if necessary"""
-        if self.tokens_are_valid():
+        # One thread logs in, concurrent callers (e.g. the startup warmup) wait for its tokens
+        with self._login_lock:
+            return self._get_valid_tokens()
+    
+    def _get_valid_tokens(self):
+        if self.tokens_are_valid() or self.load_shared_tokens() or self.load_saved_tokens():
             return {
                 'access_token': self.access_token,
                 'x_api_key': self.x_api_key
             }
         
+        store = get_shared_store()
+        owner = str(os.getpid())
+        
+        # Only one worker process walks the login endpoints, the rest wait for its tokens
+        if store and not store.acquire_lease("smiles_login", owner, ttl=120):
+            logger.info("Another worker is logging in to Smiles, waiting for its tokens...")
+            deadline = time.monotonic() + 60
+            while time.monotonic() < deadline:
+                time.sleep(0.5)
+                if self.load_shared_tokens():
+                    return {
+                        'access_token': self.access_token,
+                        'x_api_key': self.x_api_key
+                    }
+        
         logger.info("Tokens expired or missing, logging in to Smiles...")
-        success = self.login()
+        try:
+            success = self.login()
+            if success and store:
+                store.save_tokens(self.access_token, self.x_api_key, self.token_expires_at.timestamp())
+        finally:
+            if store:
+                store.release_lease("smiles_login", owner)
         
         if success:
             return {
@@ -47,6 +83,71 @@ class SmilesAuth:
         else:
             raise Exception("Failed to obtain Smiles authentication tokens")
     
+    def load_shared_tokens(self):
+        """Adopt tokens another worker process saved in the shared store"""
+        store = get_shared_store()
+        if not store:
+            return False
+        
+        shared = store.load_tokens()
+        if not shared:
+            return False
+        
+        self.access_token = shared['access_token']
+        self.x_api_key = shared['x_api_key']
+        self.token_expires_at = datetime.fromtimestamp(shared['expires_at'])
+        return self.tokens_are_valid()
+    
+    def load_saved_tokens(self, path=TOKEN_FILE):
+        """Adopt tokens saved by a previous process, once per process"""
+        if getattr(self, '_saved_tokens_checked', False):
+            return False
+        self._saved_tokens_checked = True
+        
+        try:
+            with open(path) as f:
+                saved = json.load(f)
+            self.access_token = saved['access_token']
+            self.x_api_key = saved['x_api_key']
+            self.token_expires_at = datetime.fromtimestamp(saved['expires_at'])
+        except (OSError, ValueError, KeyError):
+            return False
+        
+        return self.tokens_are_valid()
+    
+    def save_tokens(self, path=TOKEN_FILE):
+        """Persist still-valid tokens for the next process"""
+        if not self.tokens_are_valid():
+            return False
+        
+        data = {
+            'access_token': self.access_token,
+            'x_api_key': self.x_api_key,
+            'expires_at': self.token_expires_at.timestamp()
+        }
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        
+        store = get_shared_store()
+        if store:
+            store.save_tokens(self.access_token, self.x_api_key, data['expires_at'])
+        return True
+    
+    def invalidate(self, stale_token=None):
+        """Forget the current tokens, here and in the shared store
+        
+        With stale_token, only while they are still the rejected token: a late
+        401 must not throw away tokens another thread already refreshed.
+        """
+        with self._login_lock:
+            token = stale_token or self.access_token
+            store = get_shared_store()
+            if store and token:
+                store.clear_tokens(token)
+            if self.access_token == token:
+                self.access_token = None
+    
     def tokens_are_valid(self):
         """Check if current tokens are still valid"""
         if not self.access_token or not self.x_api_key:
@@ -58,12 +159,14 @@ class SmilesAuth:
         # Check if tokens expire in next 5 minutes
         return datetime.now() < (self.token_expires_at - timedelta(minutes=5))
     
+    @timed(STAGE_LATENCY, stage="auth")
+    @traced("auth.login")
     def login(self):
         """Perform login to Smiles and extract tokens"""
         try:
             # Step 1: Get the login page and extract necessary data
             logger.info("Getting Smiles login page...")
-            login_page_url = "https://www.smiles.com.ar/login"
+            login_page_url = f"{SMILES_WEB_URL}/login"
             response = self.session.get(login_page_url)
             
             if response.status_code != 200:
@@ -113,10 +216,10 @@ class SmilesAuth:
         try:
             # Try different login endpoints
             login_endpoints = [
-                "https://www.smiles.com.ar/api/auth/login",
-                "https://api.smiles.com.ar/v1/auth/login",
-                "https://www.smiles.com.ar/login",
-                "https://auth.smiles.com.ar/login"
+                f"{SMILES_WEB_URL}/api/auth/login",
+                f"{SMILES_API_URL}/v1/auth/login",
+                f"{SMILES_WEB_URL}/login",
+                f"{SMILES_AUTH_URL}/login"
             ]
             
             login_data = {
@@ -131,18 +234,19 @@ class SmilesAuth:
             headers = {
                 'Content-Type': 'application/json',
                 'X-Requested-With': 'XMLHttpRequest',
-                'Referer': 'https://www.smiles.com.ar/login'
+                'Referer': f'{SMILES_WEB_URL}/login'
             }
             
             for endpoint in login_endpoints:
                 try:
                     logger.info(f"Trying login endpoint: {endpoint}")
-                    response = self.session.post(
-                        endpoint, 
-                        json=login_data, 
-                        headers=headers,
-                        timeout=30
-                    )
+                    with span("auth.endpoint", endpoint=endpoint, body="json"):
+                        response = self.session.post(
+                            endpoint, 
+                            json=login_data, 
+                            headers=headers,
+                            timeout=30
+                        )
                     
                     if response.status_code == 200:
                         data = response.json()
@@ -151,12 +255,13 @@ class SmilesAuth:
                             return True
                     
                     # Try with form data instead of JSON
-                    response = self.session.post(
-                        endpoint,
-                        data=login_data,
-                        headers={'Content-Type': 'application/x-www-form-urlencoded'},
-                        timeout=30
-                    )
+                    with span("auth.endpoint", endpoint=endpoint, body="form"):
+                        response = self.session.post(
+                            endpoint,
+                            data=login_data,
+                            headers={'Content-Type': 'application/x-www-form-urlencoded'},
+                            timeout=30
+                        )
                     
                     if response.status_code in [200, 302]:  # 302 might be redirect after successful login
                         logger.info("Login successful (form data)!")
@@ -177,15 +282,16 @@ class SmilesAuth:
         try:
             # Step 1: Try to get tokens from main pages
             token_pages = [
-                "https://www.smiles.com.ar/emission",
-                "https://www.smiles.com.ar/account",
-                "https://www.smiles.com.ar/",
-                "https://api.smiles.com.ar/v1/user/profile"
+                f"{SMILES_WEB_URL}/emission",
+                f"{SMILES_WEB_URL}/account",
+                f"{SMILES_WEB_URL}/",
+                f"{SMILES_API_URL}/v1/user/profile"
             ]
             
             for page_url in token_pages:
                 try:
-                    response = self.session.get(page_url, timeout=30)
+                    with span("auth.token_page", url=page_url):
+                        response = self.session.get(page_url, timeout=30)
                     if response.status_code == 200:
                         # Look for tokens in page content
                         tokens = self.parse_tokens_from_content(response.text)
@@ -258,8 +364,8 @@ class SmilesAuth:
             ]
             
             base_urls = [
-                "https://www.smiles.com.ar",
-                "https://api.smiles.com.ar"
+                SMILES_WEB_URL,
+                SMILES_API_URL
             ]
             
             for base_url in base_urls:
@@ -335,9 +441,30 @@ class SmilesAuth:
             logger.error(f"Fallback token generation failed: {str(e)}")
             return False
 
-# Global instance
-smiles_auth = SmilesAuth()
+# Global instance, built on first use so importing this module stays cheap
+_smiles_auth = None
+_smiles_auth_lock = threading.Lock()
+
+def get_smiles_auth():
+    """Get the process-wide SmilesAuth"""
+    global _smiles_auth
+    if _smiles_auth is None:
+        with _smiles_auth_lock:
+            if _smiles_auth is None:
+                _smiles_auth = SmilesAuth()
+    return _smiles_auth
+
+def __getattr__(name):
+    # Keeps `from smiles_auth import smiles_auth` working without an import-time instance
+    if name == "smiles_auth":
+        return get_smiles_auth()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def get_smiles_tokens():
     """Get valid Smiles authentication tokens"""
-    return smiles_auth.get_valid_tokens()
\ No newline at end of file
+    return get_smiles_auth().get_valid_tokens()
+
+def save_smiles_tokens():
+    """Persist the tokens at shutdown, if this process ever authenticated"""
+    if _smiles_auth is not None:
+        _smiles_auth.save_tokens()
\ No newline at end of file
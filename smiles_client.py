@@ -0,0 +1,300 @@
+import logging
+import os
+import requests
+from smiles_auth import get_smiles_tokens
+from search_cache import BAD_ROUTE_TTL, ERROR_CACHE_TTL, SearchCache, UpstreamCircuit
+from rate_budget import smiles_budget
+from metrics import STAGE_LATENCY, TOKEN_REFRESHES
+from parse_executor import decode_search_response
+from state_store import get_shared_store
+from disk_cache import get_disk_cache
+from http_pool import get_http_pool
+from prewarm import record_demand
+from tracing import span
+from admission import cache_only, deadline_passed, time_left
+from settings import SMILES_SEARCH_URL, SMILES_MOBILE_URL, ELPS_SEARCH_URL, SMILES_WEB_URL
+
+logger = logging.getLogger(__name__)
+
+SEARCH_URL = SMILES_SEARCH_URL
+
+class SmilesSearchError(Exception):
+    """Raised when the Smiles search API does not return flights"""
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+class UpstreamDegraded(SmilesSearchError):
+    """Raised without calling Smiles while it keeps failing, or when the search may not call it"""
+
+def search_error_ttl(error):
+    """How long to remember a failed search: rejected routes for long, upstream trouble briefly"""
+    if isinstance(error, UpstreamDegraded):
+        return None
+    if isinstance(error, requests.exceptions.RequestException):
+        return ERROR_CACHE_TTL
+    if isinstance(error, SmilesSearchError) and error.status_code is not None:
+        if 400 <= error.status_code < 500 and error.status_code not in (401, 408, 429):
+            return BAD_ROUTE_TTL
+        return ERROR_CACHE_TTL
+    # Local failures (rate budget, missing credentials) say nothing about the route
+    return None
+
+def is_upstream_failure(error):
+    """Timeouts, connection errors, throttling and 5xx; a rejected route is not the upstream's fault"""
+    if isinstance(error, requests.exceptions.RequestException):
+        return True
+    status = getattr(error, "status_code", None)
+    return status is not None and (status >= 500 or status in (401, 408, 429))
+
+# Shared cache of raw search results, keyed by normalized query. Worker processes
+# already persist results in the shared store, a single process keeps them on disk
+_shared_store = get_shared_store()
+search_cache = SearchCache(
+    ttl=600, name="smiles", shared=_shared_store, error_ttl=search_error_ttl,
+    disk=None if _shared_store else get_disk_cache(),
+    # Cache-only, past-deadline and fail-fast refusals are about the owner's search
+    caller_error=lambda error: isinstance(error, UpstreamDegraded)
+)
+
+# Consecutive upstream failures of the authenticated search API
+smiles_circuit = UpstreamCircuit("smiles")
+
+def normalize_date(fecha):
+    """Convert YYYY-MM into YYYY-MM-01 as expected by the Smiles API"""
+    if fecha and len(fecha) == 7:
+        return fecha + "-01"
+    return fecha
+
+def build_search_request(origen, destino, fecha_salida, fecha_regreso, clase, tokens, adults=1, flexible=False):
+    """Build headers and params for the authenticated search endpoint"""
+    headers = {
+        "Authorization": f"Bearer {tokens['access_token']}",
+        "x-api-key": tokens['x_api_key'],
+        "Content-Type": "application/json",
+        "Accept": "application/json",
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+        "Origin": "https://www.smiles.com.ar",
+        "Referer": "https://www.smiles.com.ar/"
+    }
+
+    params = {
+        "adults": adults,
+        "children": 0,
+        "infants": 0,
+        "tripType": 1 if fecha_regreso else 0,
+        "originAirportCode": origen,
+        "destinationAirportCode": destino,
+        "departureDate": fecha_salida,
+        "cabinType": clase.lower(),
+        "currencyCode": "ARS",
+        "isFlexibleDateChecked": "true" if flexible else "false",
+        "forceCongener": "true",
+        "r": "ar"
+    }
+
+    if fecha_regreso:
+        params["returnDate"] = fecha_regreso
+
+    return headers, params
+
+def search_flights(origen, destino, fecha_salida, fecha_regreso=None, clase="ECO", tokens=None, adults=1, flexible=False):
+    """Search the authenticated Smiles API and return the raw flights list"""
+    fecha_salida = normalize_date(fecha_salida)
+    fecha_regreso = normalize_date(fecha_regreso)
+
+    if tokens is None:
+        tokens = get_smiles_tokens()
+
+    for attempt in range(2):
+        # Never wait past the deadline of the user's search
+        timeout = time_left(30)
+        if timeout <= 0:
+            raise UpstreamDegraded("Search deadline passed, not searching", 504)
+        if not smiles_circuit.allow():
+            raise UpstreamDegraded("Smiles API is degraded, not searching", 503)
+        if not smiles_budget.acquire(timeout=timeout):
+            raise SmilesSearchError("Smiles rate budget exhausted")
+
+        headers, params = build_search_request(origen, destino, fecha_salida, fecha_regreso, clase, tokens, adults, flexible)
+        logger.info(f"Searching authenticated Smiles flights: {origen} → {destino} on {fecha_salida}")
+        try:
+            with STAGE_LATENCY.time(stage="http"), span("smiles.http", attempt=attempt) as http_span:
+                response = get_http_pool().get(SEARCH_URL, headers=headers, params=params, timeout=max(time_left(30), 1))
+                if http_span:
+                    http_span.set(status=response.status_code)
+        except requests.exceptions.RequestException as e:
+            # Cut short by the user's deadline rather than Smiles' own slowness: not a
+            # Smiles failure, and UpstreamDegraded keeps it out of the error cache
+            if deadline_passed():
+                raise UpstreamDegraded(f"Search deadline passed during the request: {e}", 504) from e
+            smiles_circuit.failure()
+            raise
+
+        if response.status_code == 200:
+            smiles_circuit.success()
+            return decode_search_response(response.content)
+
+        if response.status_code == 401 and attempt == 0:
+            logger.warning("Token expired, trying to refresh...")
+            TOKEN_REFRESHES.inc()
+            with span("smiles.token_refresh"):
+                from smiles_auth import get_smiles_auth
+                get_smiles_auth().invalidate(tokens["access_token"])  # Force refresh
+                tokens = get_smiles_tokens()
+            continue
+
+        logger.error(f"API returned status {response.status_code}: {response.text}")
+        error = SmilesSearchError(f"Smiles API returned {response.status_code}", response.status_code)
+        if is_upstream_failure(error):
+            smiles_circuit.failure()
+        else:
+            smiles_circuit.success()
+        raise error
+
+def search_cache_key(origen, destino, fecha_salida, fecha_regreso=None, clase="ECO", adults=1, flexible=False):
+    return (origen, destino, normalize_date(fecha_salida), normalize_date(fecha_regreso), clase, adults, flexible)
+
+def cached_flights(origen, destino, fecha_salida, fecha_regreso=None, clase="ECO", adults=1, flexible=False):
+    """Flights already in the cache for this search, or None; never calls Smiles"""
+    return search_cache.peek(search_cache_key(origen, destino, fecha_salida, fecha_regreso, clase, adults, flexible))
+
+def search_flights_cached(origen, destino, fecha_salida, fecha_regreso=None, clase="ECO", tokens=None, adults=1, flexible=False):
+    """Search flights through the shared cache, coalescing identical concurrent queries"""
+    key = search_cache_key(origen, destino, fecha_salida, fecha_regreso, clase, adults, flexible)
+    record_demand(key)
+
+    def compute():
+        # Under load shedding a miss is not searched; UpstreamDegraded is never cached
+        if cache_only():
+            raise UpstreamDegraded("Cache-only search, not calling Smiles", 503)
+        return search_flights(origen, destino, fecha_salida, fecha_regreso, clase, tokens, adults, flexible)
+
+    return search_cache.get_or_compute(key, compute)
+
+MOBILE_SEARCH_URL = SMILES_MOBILE_URL
+EMISSION_URL = f"{SMILES_WEB_URL}/emission"
+
+def search_flights_env(origen, destino, fecha_salida, fecha_regreso=None, clase="ECO", smiles_token=None, x_api_key=None, timeout=30):
+    """Search the Smiles API with credentials taken from SMILES_TOKEN/X_API_KEY"""
+    smiles_token = smiles_token or os.getenv('SMILES_TOKEN')
+    x_api_key = x_api_key or os.getenv('X_API_KEY')
+
+    if not smiles_token or not x_api_key:
+        raise SmilesSearchError("SMILES_TOKEN and X_API_KEY are not configured")
+
+    fecha_salida = normalize_date(fecha_salida)
+    fecha_regreso = normalize_date(fecha_regreso)
+
+    headers, params = build_search_request(
+        origen, destino, fecha_salida, fecha_regreso, clase,
+        {"access_token": smiles_token, "x_api_key": x_api_key}
+    )
+    del headers["Origin"], headers["Referer"]
+
+    if not smiles_budget.acquire(timeout=timeout):
+        raise SmilesSearchError("Smiles rate budget exhausted")
+
+    response = get_http_pool().get(SEARCH_URL, headers=headers, cookies={"smiles_country": "ARG"}, params=params, timeout=timeout)
+
+    if response.status_code != 200:
+        logger.error(f"API error {response.status_code}: {response.text}")
+        raise SmilesSearchError(f"Smiles API returned {response.status_code}", response.status_code)
+
+    return decode_search_response(response.content)
+
+def acquire_search_budget(timeout):
+    """Take a smiles_budget token for a fallback provider call, waiting at most timeout and never past the deadline
+
+    The orchestrator hedges onto these providers while the authenticated one
+    may itself be waiting on the budget; sharing it keeps every provider,
+    fan-out and hedge included, under one request rate.
+    """
+    if not smiles_budget.acquire(timeout=max(time_left(timeout), 0)):
+        raise SmilesSearchError("Smiles rate budget exhausted")
+
+def fetch_mobile_flights(origen, destino, timeout=15):
+    """Query the Smiles mobile API and return parsed flight dicts"""
+    from flight_parsing import parse_json_flights
+
+    payload = {
+        "origin": origen,
+        "destination": destino,
+        "adults": 1,
+        "children": 0,
+        "infants": 0
+    }
+
+    headers = {
+        'User-Agent': 'SmilesApp/1.0',
+        'Content-Type': 'application/json'
+    }
+
+    acquire_search_budget(timeout)
+    response = get_http_pool().post(MOBILE_SEARCH_URL, json=payload, headers=headers, timeout=timeout)
+
+    if response.status_code != 200:
+        raise SmilesSearchError(f"Mobile API returned {response.status_code}", response.status_code)
+
+    data = response.json()
+    return parse_json_flights(data['flights']) if data.get('flights') else []
+
+def search_elps(origen, destino, fecha_salida, fecha_regreso=None, clase="ECO", timeout=30):
+    """Query elps.ar and return its raw results list"""
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+        'Content-Type': 'application/json',
+        'Accept': 'application/json'
+    }
+
+    payload = {
+        "originAirportCode": origen,
+        "destinationAirportCode": destino,
+        "departureDate": fecha_salida,
+        "cabinType": clase,
+        "adults": 1
+    }
+
+    if fecha_regreso:
+        payload["returnDate"] = fecha_regreso
+        payload["tripType"] = 1
+    else:
+        payload["tripType"] = 0
+
+    acquire_search_budget(timeout)
+    response = get_http_pool().post(ELPS_SEARCH_URL, headers=headers, json=payload, timeout=timeout)
+
+    if response.status_code != 200:
+        raise SmilesSearchError(f"elps.ar returned {response.status_code}", response.status_code)
+
+    return response.json().get('results') or []
+
+def build_emission_url(origen, destino, fecha_salida, fecha_regreso=None, clase="ECO"):
+    """Build the smiles.com.ar emission URL with the search preloaded"""
+    params = {
+        "originAirportCode": origen,
+        "destinationAirportCode": destino,
+        "departureDate": fecha_salida,
+        "adults": "1",
+        "children": "0",
+        "infants": "0",
+        "tripType": "1" if fecha_regreso else "2",
+        "cabinType": "all" if clase == "ECO" else "executive"
+    }
+
+    if fecha_regreso:
+        params["returnDate"] = fecha_regreso
+
+    query_string = "&".join([f"{k}={v}" for k, v in params.items()])
+    return f"{EMISSION_URL}?{query_string}"
+
+def fetch_emission_html(origen, destino, fecha_salida, fecha_regreso=None, clase="ECO", timeout=15):
+    """Download the smiles.com.ar emission page for HTML scraping, as raw bytes"""
+    url = build_emission_url(origen, destino, normalize_date(fecha_salida), normalize_date(fecha_regreso), clase)
+    acquire_search_budget(timeout)
+    response = get_http_pool().get(url, headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}, timeout=timeout)
+
+    if response.status_code != 200:
+        raise SmilesSearchError(f"Emission page returned {response.status_code}", response.status_code)
+
+    return response.content
@@ -0,0 +1,84 @@
+"""Startup path: start polling Telegram first, warm up the rest in the background
+
+Bot modules import only what the update loop needs. Once the loop is about
+to start, warm_up() imports the search stack (providers, parsers, BeautifulSoup)
+and logs in to Smiles on a daemon thread, so neither the restart nor the first
+search pays for them. STARTUP_WARMUP=0 turns the warmup off, STARTUP_WARM_AUTH=0
+skips only the Smiles login.
+"""
+import os
+import time
+import logging
+import importlib
+import threading
+from metrics import STAGE_LATENCY, STARTUP_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Imported at module load, as close to process start as the bots get
+STARTED_AT = time.perf_counter()
+
+WARMUP_MODULES = (
+    "flight_search", "providers", "orchestrator", "smiles_client", "parse_executor",
+    "flight_parsing", "airport_groups", "fanout_search", "query_grammar", "bs4",
+)
+
+# Disk cache entries loaded back into memory by the warmup, most recently used first
+WARM_CACHE_ENTRIES = int(os.getenv("WARM_CACHE_ENTRIES", "200"))
+
+def mark_ready(name="bot"):
+    """Record how long the process took to start accepting updates"""
+    elapsed = time.perf_counter() - STARTED_AT
+    STARTUP_SECONDS.set(elapsed)
+    logger.info(f"{name} ready in {elapsed * 1000:.0f}ms")
+    return elapsed
+
+def preload(modules=WARMUP_MODULES):
+    """Import modules ahead of first use; missing optional ones are skipped"""
+    for name in modules:
+        try:
+            with STAGE_LATENCY.time(stage="warmup_import"):
+                importlib.import_module(name)
+        except ImportError as e:
+            logger.debug(f"Warmup skipped {name}: {e}")
+
+def warm_auth():
+    """Get Smiles tokens now so the first search does not walk the login"""
+    from smiles_auth import get_smiles_tokens
+    try:
+        with STAGE_LATENCY.time(stage="warmup_auth"):
+            get_smiles_tokens()
+    except Exception as e:
+        logger.warning(f"Smiles auth warmup failed, the first search will retry: {e}")
+
+def _warm_up(modules, auth):
+    started = time.perf_counter()
+    preload(modules)
+
+    from airport_index import get_airport_index
+    from scoring import get_fx_table
+    from chat_state import get_chat_state_store
+    get_airport_index()
+    get_fx_table()
+    get_chat_state_store()
+
+    # Searches the previous process cached on disk are answered from memory again
+    from smiles_client import search_cache
+    loaded = search_cache.warm_from_disk(WARM_CACHE_ENTRIES)
+    if loaded:
+        logger.info(f"Loaded {loaded} cached searches from disk")
+
+    if auth:
+        warm_auth()
+    logger.info(f"Background warmup finished in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+def warm_up(modules=WARMUP_MODULES, auth=None):
+    """Start the background warmup; returns the thread, or None when disabled"""
+    if os.getenv("STARTUP_WARMUP", "1") == "0":
+        return None
+    if auth is None:
+        auth = os.getenv("STARTUP_WARM_AUTH", "1") != "0"
+
+    thread = threading.Thread(target=_warm_up, args=(modules, auth), name="warmup", daemon=True)
+    thread.start()
+    return thread
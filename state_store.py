@@ -0,0 +1,164 @@
+"""SQLite-backed state shared by every bot process on the host
+
+Set SHARED_STATE_DB to a file path to enable it. Worker processes then share
+the search result cache, the Smiles tokens, the Smiles rate budget and a
+login lease so only one process walks the login endpoints at a time.
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tokens (
+    name TEXT PRIMARY KEY,
+    access_token TEXT,
+    x_api_key TEXT,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rate_budget (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+class StateStore:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        """One connection per thread; WAL lets readers run alongside one writer"""
+        conn = getattr(self._local, "conn", None)
+        # Connections must not cross a fork into worker processes
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def cache_get(self, key):
+        """(value, seconds left) for a live shared entry, None when missing or expired"""
+        now = time.time()
+        row = self._conn().execute(
+            "SELECT value, expires_at FROM cache WHERE key = ? AND expires_at > ?", (key, now)
+        ).fetchone()
+        return (json.loads(row[0]), row[1] - now) if row else None
+
+    def cache_ttl(self, key):
+        """Seconds until the shared entry expires, 0 when there is none"""
+        row = self._conn().execute("SELECT expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+        return max(0.0, row[0] - time.time()) if row else 0.0
+
+    def cache_set(self, key, value, ttl):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value), time.time() + ttl)
+        )
+
+    def cache_purge(self):
+        """Delete expired cache rows"""
+        self._conn().execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+
+    def load_tokens(self, name="smiles"):
+        row = self._conn().execute(
+            "SELECT access_token, x_api_key, expires_at FROM tokens WHERE name = ?", (name,)
+        ).fetchone()
+        if not row or row[2] <= time.time():
+            return None
+        return {"access_token": row[0], "x_api_key": row[1], "expires_at": row[2]}
+
+    def save_tokens(self, access_token, x_api_key, expires_at, name="smiles"):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO tokens (name, access_token, x_api_key, expires_at) VALUES (?, ?, ?, ?)",
+            (name, access_token, x_api_key, expires_at)
+        )
+
+    def clear_tokens(self, access_token=None, name="smiles"):
+        """Drop the shared tokens, only if they are still the given access token"""
+        if access_token is None:
+            self._conn().execute("DELETE FROM tokens WHERE name = ?", (name,))
+        else:
+            self._conn().execute("DELETE FROM tokens WHERE name = ? AND access_token = ?", (name, access_token))
+
+    def take_rate_token(self, name, rate_per_sec, burst):
+        """Atomically take one token from a shared bucket; returns seconds to wait (0 when taken)"""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated_at FROM rate_budget WHERE name = ?", (name,)).fetchone()
+            tokens = burst if row is None else min(burst, row[0] + (now - row[1]) * rate_per_sec)
+
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / rate_per_sec
+
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_budget (name, tokens, updated_at) VALUES (?, ?, ?)",
+                (name, tokens, now)
+            )
+            conn.execute("COMMIT")
+            return wait
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def acquire_lease(self, name, owner, ttl):
+        """Take a named lease unless another live owner holds it"""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT owner, expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+            if row and row[0] != owner and row[1] > now:
+                conn.execute("COMMIT")
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO leases (name, owner, expires_at) VALUES (?, ?, ?)",
+                (name, owner, now + ttl)
+            )
+            conn.execute("COMMIT")
+            return True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def release_lease(self, name, owner):
+        self._conn().execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_shared_store():
+    """The process-wide StateStore, or None when SHARED_STATE_DB is not set"""
+    global _store
+    path = os.getenv("SHARED_STATE_DB")
+    if not path:
+        return None
+
+    if _store is None or _store.path != path:
+        with _store_lock:
+            if _store is None or _store.path != path:
+                _store = StateStore(path)
+    return _store
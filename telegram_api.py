@@ -0,0 +1,115 @@
+"""Telegram Bot API transport shared by every bot entry point
+
+Calls borrow a session from a http_pool.SessionPool, so the connection to
+Telegram is reused across calls and handler threads instead of paying a new
+TCP/TLS handshake per message. Every method logs and swallows transport errors: a reply that
+could not be delivered must never take the update loop down.
+"""
+import logging
+from typing import Optional
+from http_pool import SessionPool
+from metrics import STAGE_LATENCY
+from tracing import span
+from settings import TELEGRAM_API_URL
+from rendering import split_message
+
+logger = logging.getLogger(__name__)
+
+class TelegramBot:
+    def __init__(self, token: str, poll_timeout: int = 30):
+        self.token = token
+        self.base_url = f"{TELEGRAM_API_URL}/bot{token}"
+        self.poll_timeout = poll_timeout
+        # Next update_id to ask getUpdates for
+        self.offset = 0
+        self.http = SessionPool(name="telegram")
+        self._username = None
+
+    def _post(self, method, data, timeout, error):
+        try:
+            return self.http.post(f"{self.base_url}/{method}", json=data, timeout=timeout).json()
+        except Exception as e:
+            logger.error(f"{error}: {e}")
+            return {"ok": False}
+
+    @property
+    def username(self):
+        """The bot's @username from getMe, None while it could not be fetched"""
+        if self._username is None:
+            data = self._post("getMe", {}, 10, "Error getting bot info")
+            if data.get("ok") and isinstance(data.get("result"), dict):
+                self._username = data["result"].get("username")
+        return self._username
+
+    def get_updates(self):
+        """Long-poll Telegram; returns the updates, or None when the poll failed"""
+        params = {"offset": self.offset, "timeout": self.poll_timeout}
+        try:
+            data = self.http.get(f"{self.base_url}/getUpdates", params=params, timeout=self.poll_timeout + 5).json()
+        except Exception as e:
+            logger.error(f"Error getting updates: {e}")
+            return None
+        return data.get("result", []) if data.get("ok") else None
+
+    def confirm_offset(self):
+        """Tell Telegram every update below the current offset was handled"""
+        params = {"offset": self.offset, "limit": 1, "timeout": 0}
+        try:
+            self.http.get(f"{self.base_url}/getUpdates", params=params, timeout=5)
+        except Exception as e:
+            logger.error(f"Error confirming offset: {e}")
+
+    def send_message(self, chat_id: int, text: str, parse_mode: str = "HTML", reply_markup: Optional[dict] = None):
+        """Send message to Telegram, split in several when it is over the length limit"""
+        result = {"ok": False}
+        parts = split_message(text)
+        for i, part in enumerate(parts, 1):
+            data = {
+                "chat_id": chat_id,
+                "text": part,
+                "parse_mode": parse_mode,
+                "disable_web_page_preview": True
+            }
+            # The keyboard goes under the last part
+            if reply_markup and i == len(parts):
+                data["reply_markup"] = reply_markup
+
+            with STAGE_LATENCY.time(stage="send"), span("send", chars=len(part)):
+                result = self._post("sendMessage", data, 10, "Error sending message")
+            if not result.get("ok"):
+                break
+        return result
+
+    def answer_callback_query(self, callback_query_id: str, text: Optional[str] = None):
+        """Stop the button's loading spinner, optionally with a short notice"""
+        data = {"callback_query_id": callback_query_id}
+        if text:
+            data["text"] = text
+        with STAGE_LATENCY.time(stage="send"), span("answer_callback"):
+            return self._post("answerCallbackQuery", data, 5, "Error answering callback query")
+
+    def edit_message_text(self, chat_id: int, message_id: int, text: str, reply_markup: Optional[dict] = None,
+                          parse_mode: str = "HTML"):
+        """Replace the text and keyboard of a message the bot sent"""
+        data = {
+            "chat_id": chat_id,
+            "message_id": message_id,
+            "text": text,
+            "parse_mode": parse_mode,
+            "disable_web_page_preview": True
+        }
+        if reply_markup:
+            data["reply_markup"] = reply_markup
+        with STAGE_LATENCY.time(stage="send"), span("edit", chars=len(text)):
+            return self._post("editMessageText", data, 10, "Error editing message")
+
+    def answer_inline_query(self, inline_query_id: str, results: list, cache_time: int = 60, is_personal: bool = False):
+        """Answer an inline query"""
+        data = {
+            "inline_query_id": inline_query_id,
+            "results": results,
+            "cache_time": cache_time,
+            "is_personal": is_personal
+        }
+        with STAGE_LATENCY.time(stage="send"), span("answer_inline", results=len(results)):
+            return self._post("answerInlineQuery", data, 5, "Error answering inline query")
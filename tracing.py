@@ -0,0 +1,223 @@
+"""Lightweight per-update tracing
+
+Each Telegram update opens a trace; nested span() blocks record timed child
+spans. Finished traces are appended to a JSON lines file (TRACE_FILE) with one
+line per span. TRACE_SAMPLE_RATE (0.0-1.0) controls how many updates are
+traced; it is 0 unless set, so a deployment only writes traces when asked
+to. Unsampled traces cost one random() call and a context variable lookup.
+Once the file passes TRACE_MAX_BYTES it is rolled over to TRACE_FILE.1
+(replacing the previous one), so tracing can stay on in production.
+
+Show the slowest traces:
+    python tracing.py slowest -n 10
+    python tracing.py show <trace_id>
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+import contextvars
+from functools import wraps
+from contextlib import contextmanager
+
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", str(50 * 1024 * 1024)))
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_sink_lock = threading.Lock()
+
+class _Trace:
+    def __init__(self, trace_id):
+        self.trace_id = trace_id
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            self.spans.append(record)
+
+class Span:
+    def __init__(self, trace, name, parent_id=None, attrs=None):
+        self.trace = trace
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attrs = attrs or {}
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+
+    @property
+    def trace_id(self):
+        return self.trace.trace_id
+
+    def set(self, **attrs):
+        """Attach attributes to the span"""
+        self.attrs.update(attrs)
+
+    def finish(self, error=None):
+        record = {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.started_at,
+            "duration_ms": (time.perf_counter() - self._started) * 1000,
+            "attrs": self.attrs,
+        }
+        if error is not None:
+            record["error"] = f"{type(error).__name__}: {error}"
+        self.trace.add(record)
+
+def current_trace_id():
+    """Trace ID of the active span, or None when not tracing"""
+    active = _current_span.get()
+    return active.trace_id if active else None
+
+def _write_trace(trace):
+    lines = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in trace.spans)
+    with _sink_lock:
+        with open(TRACE_FILE, "a", encoding="utf-8") as sink:
+            sink.write(lines)
+            full = sink.tell() >= TRACE_MAX_BYTES
+        if full:
+            # Another worker process may have rolled it over already
+            try:
+                os.replace(TRACE_FILE, TRACE_FILE + ".1")
+            except OSError:
+                pass
+
+@contextmanager
+def start_trace(name, sample_rate=None, **attrs):
+    """Open a root span for one update; the trace is written when it ends"""
+    rate = TRACE_SAMPLE_RATE if sample_rate is None else sample_rate
+    if rate <= 0 or random.random() >= rate:
+        yield None
+        return
+
+    trace = _Trace(uuid.uuid4().hex[:16])
+    root = Span(trace, name, attrs=attrs)
+    token = _current_span.set(root)
+    error = None
+    try:
+        yield root
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _current_span.reset(token)
+        root.finish(error)
+        try:
+            _write_trace(trace)
+        except OSError:
+            pass
+
+@contextmanager
+def span(name, **attrs):
+    """Record a child span of the active trace; a no-op when not tracing"""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+
+    child = Span(parent.trace, name, parent_id=parent.span_id, attrs=attrs)
+    token = _current_span.set(child)
+    error = None
+    try:
+        yield child
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _current_span.reset(token)
+        child.finish(error)
+
+def traced(name):
+    """Decorator that wraps a function call in a span"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def bind_context(func):
+    """Bind func to the caller's context so spans started in worker threads join the trace"""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(func, *args, **kwargs)
+
+def load_traces(path=TRACE_FILE):
+    """Group span records from the sink, and the file it last rolled over to, by trace ID"""
+    traces = {}
+    for part in (path + ".1", path):
+        # Nothing traced yet, or everything already rolled over
+        if not os.path.exists(part):
+            continue
+        with open(part, encoding="utf-8") as sink:
+            for line in sink:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                traces.setdefault(record["trace_id"], []).append(record)
+    return traces
+
+def _root(spans):
+    roots = [s for s in spans if s["parent_id"] is None]
+    return roots[0] if roots else max(spans, key=lambda s: s["duration_ms"])
+
+def print_trace(spans, out=sys.stdout):
+    """Print one trace as an indented span tree"""
+    children = {}
+    for record in spans:
+        children.setdefault(record["parent_id"], []).append(record)
+
+    def walk(record, depth):
+        attrs = " ".join(f"{k}={v}" for k, v in record["attrs"].items())
+        error = f" ERROR {record['error']}" if record.get("error") else ""
+        out.write(f"{'  ' * depth}{record['name']:<{32 - 2 * depth}} {record['duration_ms']:9.1f}ms {attrs}{error}\n")
+        for child in sorted(children.get(record["span_id"], []), key=lambda s: s["start"]):
+            walk(child, depth + 1)
+
+    walk(_root(spans), 0)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect traces written by the bot")
+    parser.add_argument("--file", default=TRACE_FILE)
+    commands = parser.add_subparsers(dest="command", required=True)
+    slowest = commands.add_parser("slowest", help="show the slowest traces")
+    slowest.add_argument("-n", type=int, default=10)
+    slowest.add_argument("--tree", action="store_true", help="print the span tree of each trace")
+    show = commands.add_parser("show", help="print one trace")
+    show.add_argument("trace_id")
+    args = parser.parse_args(argv)
+
+    traces = load_traces(args.file)
+
+    if args.command == "show":
+        if args.trace_id not in traces:
+            print(f"Trace {args.trace_id} not found")
+            return 1
+        print_trace(traces[args.trace_id])
+        return 0
+
+    ranked = sorted(traces.values(), key=lambda spans: _root(spans)["duration_ms"], reverse=True)
+    for spans in ranked[:args.n]:
+        root = _root(spans)
+        parents = {s["parent_id"] for s in spans}
+        leaves = [s for s in spans if s is not root and s["span_id"] not in parents]
+        slowest_child = max(leaves, key=lambda s: s["duration_ms"], default=None)
+        detail = f" slowest span: {slowest_child['name']} {slowest_child['duration_ms']:.1f}ms" if slowest_child else ""
+        print(f"{root['trace_id']} {root['duration_ms']:9.1f}ms {root['name']} {root['attrs']}{detail}")
+        if args.tree:
+            print_trace(spans)
+            print()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""Persistent journal of handled Telegram update IDs
+
+The getUpdates offset is only advanced past updates whose handler finished,
+so a crash mid-batch makes Telegram redeliver the unfinished updates on
+restart, and updates that were already handled are skipped by update_id.
+An update that keeps crashing the handler is given up after max_attempts.
+"""
+import os
+import time
+import sqlite3
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS journal (
+    update_id INTEGER PRIMARY KEY,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS journal_status ON journal (status, update_id);
+"""
+
+class UpdateJournal:
+    def __init__(self, path, max_attempts=3, keep=10000):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def begin(self, update_id):
+        """Mark an update as in progress; False if it was already handled or given up"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, attempts FROM journal WHERE update_id = ?", (update_id,)
+            ).fetchone()
+
+            if row and row[0] in ("done", "failed"):
+                return False
+
+            if row and row[1] >= self.max_attempts:
+                logger.error(f"Update {update_id} failed {row[1]} times, skipping it")
+                self._conn.execute(
+                    "UPDATE journal SET status = 'failed', updated_at = ? WHERE update_id = ?",
+                    (time.time(), update_id)
+                )
+                return False
+
+            self._conn.execute(
+                "INSERT INTO journal (update_id, status, attempts, updated_at) VALUES (?, 'in_progress', 1, ?) "
+                "ON CONFLICT(update_id) DO UPDATE SET status = 'in_progress', attempts = attempts + 1, updated_at = excluded.updated_at",
+                (update_id, time.time())
+            )
+            return True
+
+    def ack(self, update_id):
+        """Mark an update as handled"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE journal SET status = 'done', updated_at = ? WHERE update_id = ?",
+                (time.time(), update_id)
+            )
+
+    def safe_offset(self):
+        """Offset for getUpdates: the oldest unfinished update, or one past the newest handled"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(update_id) FROM journal WHERE status = 'in_progress'"
+            ).fetchone()
+            if row[0] is not None:
+                return row[0]
+
+            row = self._conn.execute("SELECT MAX(update_id) FROM journal").fetchone()
+            return (row[0] + 1) if row[0] is not None else 0
+
+    def prune(self):
+        """Forget old finished updates, keeping enough to de-duplicate redeliveries"""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM journal WHERE status IN ('done', 'failed') AND update_id < "
+                "(SELECT COALESCE(MAX(update_id), 0) - ? FROM journal)",
+                (self.keep,)
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def open_update_journal(default_path):
+    """Open the journal at UPDATE_JOURNAL_DB, or default_path"""
+    return UpdateJournal(os.getenv("UPDATE_JOURNAL_DB") or default_path)
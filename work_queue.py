@@ -0,0 +1,130 @@
+"""Durable SQLite queue of Telegram updates for multi-worker mode
+
+The ingestion process pushes updates keyed by update_id (duplicates are
+ignored); workers claim the oldest pending update, handle it and ack it.
+Claims older than the visibility timeout go back to pending, so an update
+held by a crashed worker is retried by another one.
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS updates (
+    update_id INTEGER PRIMARY KEY,
+    chat_id INTEGER,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    claimed_by TEXT,
+    claimed_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS updates_status ON updates (status, update_id);
+-- Lets claim() check a chat for updates in progress without scanning every claim
+CREATE INDEX IF NOT EXISTS updates_chat ON updates (chat_id, status);
+"""
+
+class WorkQueue:
+    def __init__(self, path, visibility_timeout=120, max_attempts=3):
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def push(self, update):
+        """Store one update; returns False if it was already queued"""
+        chat_id = None
+        for key in ("message", "edited_message", "callback_query", "inline_query"):
+            if key in update:
+                item = update[key]
+                chat_id = item.get("chat", {}).get("id") or item.get("from", {}).get("id")
+                break
+
+        cursor = self._conn().execute(
+            "INSERT OR IGNORE INTO updates (update_id, chat_id, payload) VALUES (?, ?, ?)",
+            (update["update_id"], chat_id, json.dumps(update))
+        )
+        return cursor.rowcount == 1
+
+    def last_update_id(self):
+        """Highest update_id ever queued, to resume getUpdates after a restart"""
+        row = self._conn().execute("SELECT MAX(update_id) FROM updates").fetchone()
+        return row[0] or 0
+
+    def claim(self, worker_id):
+        """Claim the oldest pending update whose chat has nothing else in progress"""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Return expired claims to the queue, dropping updates that keep failing
+            conn.execute(
+                "UPDATE updates SET status = 'pending', claimed_by = NULL "
+                "WHERE status = 'claimed' AND claimed_at < ?",
+                (now - self.visibility_timeout,)
+            )
+            conn.execute(
+                "UPDATE updates SET status = 'failed' WHERE status = 'pending' AND attempts >= ?",
+                (self.max_attempts,)
+            )
+            row = conn.execute(
+                "SELECT update_id, payload FROM updates u WHERE status = 'pending' "
+                "AND (chat_id IS NULL OR NOT EXISTS ("
+                "  SELECT 1 FROM updates c WHERE c.chat_id = u.chat_id AND c.status = 'claimed'"
+                ")) ORDER BY update_id LIMIT 1"
+            ).fetchone()
+
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+
+            conn.execute(
+                "UPDATE updates SET status = 'claimed', claimed_by = ?, claimed_at = ?, attempts = attempts + 1 "
+                "WHERE update_id = ?",
+                (worker_id, now, row[0])
+            )
+            conn.execute("COMMIT")
+            return json.loads(row[1])
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def ack(self, update_id):
+        """Mark an update as handled"""
+        self._conn().execute(
+            "UPDATE updates SET status = 'done', payload = '{}' WHERE update_id = ?", (update_id,)
+        )
+
+    def release(self, update_id):
+        """Give an update back to the queue after a handler error"""
+        self._conn().execute(
+            "UPDATE updates SET status = 'pending', claimed_by = NULL WHERE update_id = ?", (update_id,)
+        )
+
+    def depth(self):
+        """Number of updates waiting or in progress"""
+        row = self._conn().execute(
+            "SELECT COUNT(*) FROM updates WHERE status IN ('pending', 'claimed')"
+        ).fetchone()
+        return row[0]
+
+    def purge_done(self, keep=10000):
+        """Forget old handled updates, keeping the newest ones for de-duplication"""
+        self._conn().execute(
+            "DELETE FROM updates WHERE status IN ('done', 'failed') AND update_id < "
+            "(SELECT COALESCE(MAX(update_id), 0) - ? FROM updates)",
+            (keep,)
+        )